@@ -0,0 +1,161 @@
+"""
+scope_analyzer.py 第三遍（作用域 / 调用检查）的性能基准
+==========================================================
+验证 ScopeAnalyzer 的耗时与 CST 节点数成线性关系：
+
+  1. 合成用例：嵌套调用链 g(g(g(...)))、并列语句，规模逐级翻倍，
+     看每个节点的平均耗时是否保持不变（旧实现在每层 postfix_expression 上
+     str() 整棵子树，嵌套调用链上是平方级）
+  2. 语料：按 validate_galaxy_V2.py 的流程解析语料里的文件，
+     对每个文件单独计时第三遍，报告 µs/节点 的分布和耗时-节点数的相关系数
+
+语法解析（Earley）比第三遍慢几个数量级，只在计时之前做一次，不计入结果。
+
+用法: python bench_scope_analyzer.py [脚本目录] [--limit N] [--max-size 字节]
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import time
+
+from lark import Tree
+
+import validate_galaxy_V2 as validator
+from galaxycc.corpus import Corpus          # validate_galaxy_V2 已把 galaxycc 加进 sys.path
+from scope_analyzer import ScopeAnalyzer
+
+# ── 路径配置 ──────────────────────────────────────────────────────────────────
+HERE         = os.path.dirname(os.path.abspath(__file__))
+GRAMMAR_FILE = os.path.join(HERE, "ANSI C95_V2.lark")
+SCRIPTS_DIR  = os.path.join(HERE, "galaxy_scripts")
+# ─────────────────────────────────────────────────────────────────────────────
+
+REPEAT = 10
+
+
+def count_nodes(tree) -> int:
+    """CST 节点数（Tree + Token）"""
+    count = 0
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if isinstance(node, Tree):
+            stack.extend(node.children)
+    return count
+
+
+def time_third_pass(tree, global_table, repeat: int = REPEAT) -> float:
+    """第三遍的最短耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        ScopeAnalyzer(global_table).visit(tree)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def pearson(xs, ys) -> float:
+    mx, my = statistics.fmean(xs), statistics.fmean(ys)
+    sxy = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+    sxx = sum((x - mx) ** 2 for x in xs)
+    syy = sum((y - my) ** 2 for y in ys)
+    return sxy / (sxx * syy) ** 0.5 if sxx and syy else 1.0
+
+
+# ── 合成用例 ──────────────────────────────────────────────────────────────────
+
+def nested_calls(depth: int) -> str:
+    expr = "1"
+    for _ in range(depth):
+        expr = f"g({expr})"
+    return f"int g(int a) {{ return a; }}\nvoid f() {{\n    int x;\n    x = {expr};\n}}\n"
+
+
+def flat_statements(count: int) -> str:
+    body = "\n".join(f"    x = g(x + {i});" for i in range(count))
+    return f"int g(int a) {{ return a; }}\nvoid f() {{\n    int x;\n{body}\n}}\n"
+
+
+def bench_synthetic(parser):
+    print("合成用例（规模翻倍，µs/节点 应基本不变）")
+    print(f"  {'用例':<12} {'规模':>5} {'节点':>7} {'耗时 ms':>9} {'µs/节点':>8}")
+    for name, make, sizes in (("嵌套调用链", nested_calls, (8, 16, 32, 64)),
+                              ("并列语句", flat_statements, (50, 100, 200, 400))):
+        for n in sizes:
+            tree = parser.parse(make(n))
+            table, _ = validator.build_global_symbol_table([("<bench>", tree)])
+            nodes = count_nodes(tree)
+            elapsed = time_third_pass(tree, table)
+            print(f"  {name:<12} {n:>5} {nodes:>7} {elapsed * 1e3:>9.2f} "
+                  f"{elapsed * 1e6 / nodes:>8.2f}")
+    print()
+
+
+# ── 语料 ──────────────────────────────────────────────────────────────────────
+
+def bench_corpus(parser, type_names: set, scripts_dir: str, limit: int, max_size: int):
+    scripts = [p for p in validator.collect_scripts(scripts_dir)
+               if os.path.getsize(p) <= max_size]
+    scripts.sort(key=os.path.getsize)
+    if limit and len(scripts) > limit:
+        step = len(scripts) / limit             # 按大小均匀取样
+        scripts = [scripts[int(i * step)] for i in range(limit)]
+
+    corpus = Corpus()
+    sources, _ = corpus.load_all(
+        glob.glob(os.path.join(scripts_dir, "**", "*.galaxy"), recursive=True))
+    type_names.update(validator.collect_all_type_names(sources))
+    print(f"语料：解析 {len(scripts)} 个文件（不计时）...")
+    trees = []
+    for path in scripts:
+        tree, err, _ = validator.parse_file(parser, path, corpus.load(path).text)
+        if tree is not None:
+            trees.append((path, tree))
+    global_table, _ = validator.build_global_symbol_table(trees)
+
+    rows = []
+    for path, tree in trees:
+        nodes = count_nodes(tree)
+        rows.append((nodes, time_third_pass(tree, global_table), path))
+    if not rows:
+        print("没有可用的语法树")
+        return
+    rows.sort()
+
+    print(f"  {'文件':<32} {'节点':>8} {'耗时 ms':>9} {'µs/节点':>8}")
+    for nodes, elapsed, path in rows:
+        print(f"  {os.path.basename(path)[:32]:<32} {nodes:>8} {elapsed * 1e3:>9.2f} "
+              f"{elapsed * 1e6 / nodes:>8.2f}")
+
+    per_node = [e * 1e6 / n for n, e, _ in rows]
+    total_nodes = sum(n for n, _, _ in rows)
+    total_time = sum(e for _, e, _ in rows)
+    print(f"\n  {len(rows)} 个文件，{total_nodes} 个节点，第三遍共 {total_time * 1e3:.1f} ms")
+    print(f"  µs/节点：中位数 {statistics.median(per_node):.2f}，"
+          f"最小 {min(per_node):.2f}，最大 {max(per_node):.2f}")
+    if len(rows) > 2:
+        print(f"  耗时与节点数的相关系数 r = "
+              f"{pearson([n for n, _, _ in rows], [e for _, e, _ in rows]):.4f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="scope_analyzer 第三遍性能基准")
+    ap.add_argument("scripts_dir", nargs="?", default=SCRIPTS_DIR)
+    ap.add_argument("--limit", type=int, default=40, help="语料最多取多少个文件（0 不限）")
+    ap.add_argument("--max-size", type=int, default=40000,
+                    help="跳过大于此字节数的文件（Earley 解析太慢）")
+    ap.add_argument("--skip-corpus", action="store_true")
+    args = ap.parse_args()
+
+    type_names = set()                          # 语料的类型名由 bench_corpus 填入
+    parser = validator.load_grammar(GRAMMAR_FILE, type_names)
+    bench_synthetic(parser)
+    if not args.skip_corpus:
+        bench_corpus(parser, type_names, args.scripts_dir, args.limit, args.max_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+GalaxyCC 性能对比
+==================
+1. 符号表：SymbolTable（每层 {} 一个 Scope，lookup 逐层向外查）
+      vs  FlatSymbolTable（名字 → 绑定栈，离开作用域按日志撤销）
+2. 类型规则：can_assign / resolve_binary_op 的规则链 vs 预编译的规则表
+
+符号表的做法：
+  1. 从语料里挑出嵌套最深的函数定义（多是编辑器生成的触发器函数），逐个单独解析
+  2. 用记录代理跑一遍语义分析，录下分析期间对符号表的全部调用
+  3. 在两种符号表上反复回放同一份调用序列计时，并逐条核对返回值一致
+
+用法：
+  python bench.py [语料目录] [函数个数]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from galaxycc import GalaxyFrontend, COMMON_NATIVES
+from galaxycc.semantic.analyzer import GalaxyAnalyzer
+from galaxycc.semantic.symbol import SymbolTable, FlatSymbolTable
+from galaxycc.semantic import type as gtypes
+
+GRAMMAR_PATH = Path(__file__).parent / 'galaxy.lark'
+CORPUS_DIR   = Path(__file__).parent.parent / 'galaxy_scripts'
+MAX_FUNC_LEN = 8000       # Earley 解析太长的函数很慢，跳过
+REPEAT       = 200
+
+
+# ════════════════════════════════════════════════════════════════════════════
+# 从语料里挑函数
+# ════════════════════════════════════════════════════════════════════════════
+
+def iter_functions(text: str):
+    """
+    粗扫一个文件的顶层函数定义，产出 (最大嵌套深度, 函数源码)。
+    只跳过注释和字符串，不做真正的解析。
+    """
+    i, n = 0, len(text)
+    depth = max_depth = 0
+    head = 0              # 当前顶层声明的起点
+    while i < n:
+        c = text[i]
+        if c == '/' and text.startswith('//', i):
+            j = text.find('\n', i)
+            i = n if j < 0 else j
+            continue
+        if c == '"':
+            i += 1
+            while i < n and text[i] != '"':
+                i += 2 if text[i] == '\\' else 1
+        elif c == '{':
+            depth += 1
+            max_depth = max(max_depth, depth)
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                src = text[head:i + 1].strip()
+                if '(' in src.split('{', 1)[0]:
+                    yield max_depth, src
+                head = i + 1
+                max_depth = 0
+        elif c == ';' and depth == 0:
+            head = i + 1
+        i += 1
+
+
+def pick_deep_functions(corpus_dir: Path, count: int):
+    found = []
+    for path in sorted(corpus_dir.rglob('*.galaxy')):
+        text = path.read_text(encoding='utf-8', errors='replace')
+        for depth, src in iter_functions(text):
+            if len(src) <= MAX_FUNC_LEN:
+                found.append((depth, path.name, src))
+    found.sort(key=lambda f: -f[0])
+    return found[:count]
+
+
+# ════════════════════════════════════════════════════════════════════════════
+# 录制 / 回放符号表调用
+# ════════════════════════════════════════════════════════════════════════════
+
+class _Recorder:
+    """包一层符号表，记录每次调用 (方法名, 参数)"""
+
+    def __init__(self, table, trace: list):
+        self._table = table
+        self._trace = trace
+
+    def __getattr__(self, name):
+        attr = getattr(self._table, name)
+        if not callable(attr):
+            return attr
+        def call(*args):
+            self._trace.append((name, args))
+            return attr(*args)
+        return call
+
+
+def record_trace(frontend: GalaxyFrontend, src: str) -> list:
+    ast = frontend.transform_only(src)
+    analyzer = GalaxyAnalyzer(native_builtins=frontend._native_loader.get_builtins())
+    trace = []
+    analyzer.table = _Recorder(analyzer.table, trace)
+    analyzer.analyze(ast)
+    return trace
+
+
+def fresh_table(cls):
+    """与分析器初始状态相同：内置类型 + native 已定义（共用同一批 Symbol）"""
+    table = cls()
+    for sym in _SEED_SYMBOLS:
+        table.define(sym)
+    return table
+
+
+def replay(table, trace: list) -> list:
+    return [getattr(table, name)(*args) for name, args in trace]
+
+
+def time_replay(cls, traces: list, repeat: int) -> float:
+    tables = [fresh_table(cls) for _ in range(repeat)]
+    t0 = time.perf_counter()
+    for table in tables:
+        for trace in traces:
+            for name, args in trace:
+                getattr(table, name)(*args)
+    return time.perf_counter() - t0
+
+
+# ════════════════════════════════════════════════════════════════════════════
+
+_SEED_SYMBOLS = []
+
+
+def bench_symbol_table(corpus_dir: Path = CORPUS_DIR, count: int = 30, repeat: int = REPEAT):
+    frontend = GalaxyFrontend(grammar_file=GRAMMAR_PATH)
+    frontend.load_natives_from_dict(COMMON_NATIVES)
+    seed = GalaxyAnalyzer(native_builtins=frontend._native_loader.get_builtins())
+    _SEED_SYMBOLS[:] = seed.table.current_scope.symbols()
+
+    funcs = pick_deep_functions(corpus_dir, count)
+    print(f"选取 {len(funcs)} 个函数，最大嵌套深度 "
+          f"{funcs[0][0] if funcs else 0} ~ {funcs[-1][0] if funcs else 0}")
+
+    traces = []
+    for depth, fname, src in funcs:
+        try:
+            traces.append(record_trace(frontend, src))
+        except Exception as e:
+            print(f"  跳过 {fname}（深度 {depth}）：{type(e).__name__}")
+
+    # 两种实现逐条核对
+    for trace in traces:
+        a = replay(fresh_table(SymbolTable), trace)
+        b = replay(fresh_table(FlatSymbolTable), trace)
+        assert a == b, "FlatSymbolTable 与 SymbolTable 结果不一致"
+
+    ops = sum(len(t) for t in traces)
+    lookups = sum(1 for t in traces for name, _ in t if name.startswith('lookup'))
+    print(f"调用序列：{ops} 次操作（lookup {lookups} 次），回放 {repeat} 遍")
+
+    t_nested = time_replay(SymbolTable, traces, repeat)
+    t_flat   = time_replay(FlatSymbolTable, traces, repeat)
+    print(f"  SymbolTable     : {t_nested:.3f}s")
+    print(f"  FlatSymbolTable : {t_flat:.3f}s   ({t_nested / t_flat:.2f}x)")
+    return t_nested, t_flat
+
+
+# ════════════════════════════════════════════════════════════════════════════
+# 类型规则表
+# ════════════════════════════════════════════════════════════════════════════
+
+def bench_type_rules(repeat: int = 20):
+    """所有标量类型对 × 所有运算符：先穷举核对，再计时"""
+    mismatches = gtypes.verify_tables()
+    assert not mismatches, f"规则表与规则链不一致：{mismatches[:5]}"
+
+    scalars = gtypes._SCALAR_TYPES
+    pairs = [(a, b) for a in scalars for b in scalars]
+    print(f"类型规则：{len(scalars)} 个标量类型，{len(pairs)} 对 × "
+          f"{len(gtypes.BINARY_OPS)} 个运算符，核对一致")
+
+    def run(assign, binop):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for a, b in pairs:
+                assign(a, b)
+                for op in gtypes.BINARY_OPS:
+                    binop(op, a, b)
+        return time.perf_counter() - t0
+
+    t_rules = run(gtypes._can_assign_rules, gtypes._resolve_binary_op_rules)
+    t_table = run(gtypes.can_assign, gtypes.resolve_binary_op)
+    print(f"  规则链 : {t_rules:.3f}s")
+    print(f"  规则表 : {t_table:.3f}s   ({t_rules / t_table:.2f}x)")
+    return t_rules, t_table
+
+
+if __name__ == '__main__':
+    bench_type_rules()
+    corpus = Path(sys.argv[1]) if len(sys.argv) > 1 else CORPUS_DIR
+    count  = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    bench_symbol_table(corpus, count)
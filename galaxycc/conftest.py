@@ -0,0 +1,16 @@
+"""pytest 公共夹具：语法构建较慢，整个测试会话共用一个前端"""
+
+from pathlib import Path
+
+import pytest
+
+from galaxycc.pipeline import GalaxyFrontend
+
+GRAMMAR = Path(__file__).with_name('galaxy.lark')
+
+
+@pytest.fixture(scope='session')
+def frontend() -> GalaxyFrontend:
+    f = GalaxyFrontend(grammar_file=GRAMMAR)
+    f.load_natives_common()
+    return f
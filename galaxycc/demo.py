@@ -20,6 +20,8 @@ import os
 sys.path.insert(0, str(Path(__file__).parent))
 
 from galaxycc import GalaxyFrontend, COMMON_NATIVES
+from galaxycc.batch import BatchRunner
+from galaxycc.includes import IncludeIndex
 
 
 # ════════════════════════════════════════════════════════════════════════════
@@ -131,13 +133,21 @@ def demo_without_grammar():
 # 示例 2：批量分析 .galaxy 文件
 # ════════════════════════════════════════════════════════════════════════════
 
-def demo_batch(scripts_dir: str, grammar_path: str):
+def demo_batch(scripts_dir: str, grammar_path: str, fail_fast: bool = False,
+               max_diagnostics: int = None, stop_on_failure: bool = False,
+               dedup_includes: bool = True, order_includes: bool = True,
+               dedup_content: bool = True):
     """
     批量分析目录下所有 .galaxy 文件，汇总错误报告。
 
     Args:
         scripts_dir: 包含 .galaxy 文件的目录
         grammar_path: .lark grammar 文件路径
+        fail_fast / max_diagnostics: 每个文件的诊断上限（只想知道是否干净时用）
+        stop_on_failure: 遇到第一个有错误的文件即停止
+        dedup_includes: include 库里的诊断整批只报一次，附受影响文件数
+        order_includes: 按 include 拓扑序自底向上分析，每个库只解析一次
+        dedup_content: 内容相同的文件（各 mod 变体里的同一份脚本）只分析一次
     """
     print("=" * 60)
     print("示例 2：批量分析")
@@ -145,13 +155,12 @@ def demo_batch(scripts_dir: str, grammar_path: str):
 
     base = r"D:\galaxyscript\SC2GameData-master\SC2GameData-master\mods"
     # base = r"D:\galaxyscript\cascviewer_galaxy_scripts\mods"
-    search_dirs = []
-    for root, dirs, files in os.walk(base):
-        if os.path.basename(root) == "base.sc2data":
-            search_dirs.append(root)
-    
+    # 所有 base.sc2data 目录遍历一次建成索引，include 查找不区分大小写
+    index = IncludeIndex.discover(base)
+
     #frontend = GalaxyFrontend(grammar_file=grammar_path, search_dirs=[r"D:\galaxyscript\SC2GameData-master\SC2GameData-master\mods\core.sc2mod\base.sc2data"])
-    frontend = GalaxyFrontend(grammar_file=grammar_path, search_dirs=search_dirs)
+    frontend = GalaxyFrontend(grammar_file=grammar_path, search_dirs=index.search_dirs,
+                              share_include_asts=order_includes, include_index=index)
     # frontend.load_natives_common()
     
     # 优先从真实文件加载，找不到再 fallback
@@ -168,32 +177,38 @@ def demo_batch(scripts_dir: str, grammar_path: str):
     # scripts = list(Path(scripts_dir).rglob("*.galaxy"))[600:989]
     print(f"找到 {len(scripts)} 个 .galaxy 文件\n")
 
-    total_errors   = 0
-    total_warnings = 0
-    failed_files   = []
-
-    for script in scripts:
-        result = frontend.process_file(script)
-        errors   = len(result.diags.errors)
-        warnings = len(result.diags.warnings)
-        total_errors   += errors
-        total_warnings += warnings
-
-        if errors > 0:
-            failed_files.append((script, result.diags))
-            print(f"✗ {script.name}: {errors} error(s), {warnings} warning(s)")
-            for d in result.diags.errors:
-                print(f"  [{script.name}] {d}")
-        elif warnings > 0:
-            print(f"△ {script.name}: {warnings} warning(s)")
-            for d in result.diags.warnings:
-                print(f"  [{script.name}] {d}")
+    def show(r):
+        name = r.path.name
+        if r.duplicate_of is not None:
+            name += f" (= {r.duplicate_of.name})"
+        if r.errors > 0:
+            print(f"✗ {name}: {r.errors} error(s), {r.warnings} warning(s)")
+            for d in r.diags.errors:
+                print(f"  [{name}] {d}")
+        elif r.warnings > 0:
+            print(f"△ {name}: {r.warnings} warning(s)")
+            for d in r.diags.warnings:
+                print(f"  [{name}] {d}")
         else:
-            print(f"✓ {script.name}")
+            print(f"✓ {name}")
+
+    runner = BatchRunner(frontend, fail_fast=fail_fast, max_diagnostics=max_diagnostics,
+                         stop_on_failure=stop_on_failure, on_result=show,
+                         dedup_includes=dedup_includes, order_includes=order_includes,
+                         dedup_content=dedup_content)
+    report = runner.run(scripts)
+
+    if report.shared:
+        print(f"\n{'─' * 60}\ninclude 文件中的诊断（每条只列一次）：")
+        for d in report.shared:
+            print(f"  [{d.file}] {d}  ← {d.includers} 个文件")
+
+    if report.duplicates:
+        print(f"\n{'─' * 60}\n内容重复的文件：")
+        print(report.duplicate_report())
 
     print(f"\n{'─' * 60}")
-    print(f"总计: {total_errors} 错误, {total_warnings} 警告")
-    print(f"失败文件: {len(failed_files)} / {len(scripts)}")
+    print(report.summary())
 
     # if failed_files:
     #     print("\n详细错误：")
@@ -5,13 +5,33 @@ GalaxyCC - Galaxy Script 编译器前端
   galaxycc/
     __init__.py          本文件：公共 API
     error.py             诊断信息系统
+    batch.py             批量分析引擎（fail-fast / 诊断上限）
+    corpus.py            源文件读取：每个文件只读一次，编码检测、行 / 字节偏移表、内容哈希
+    prescan.py           声明预扫描：词法级收集 struct / typedef 名和 include（供 LALR 解析）；
+                         按顶层声明分块（供增量解析）
+    includes.py          include 依赖图：拓扑序、环、找不到的文件（python -m galaxycc.includes）；
+                         search_dirs 目录索引（大小写不敏感）
+    workspace.py         分层工作区：mod / campaign 依赖分层、include 遮盖、逐层只分析一次
+    daemon.py            常驻分析进程：Unix socket 上的 JSON-RPC，前端缓存常驻
+                         （python -m galaxycc.daemon serve / call）
+    lsp.py               Language Server（stdio）：诊断、hover、跳转定义、补全；
+                         按顶层声明增量解析（python -m galaxycc.lsp serve / probe）
+    report.py            机器可读输出（JSONL / SARIF 流式写出、诊断码汇总；
+                         python -m galaxycc.report）
+    logindex.py          验证日志的 SQLite 索引与查询、两次运行对比
+                         （python -m galaxycc.logindex）
     tree/
       transformer.py     CST → AST 转换器 & AST 节点定义
     semantic/
       type.py            类型系统
       symbol.py          符号表
       analyzer.py        语义分析器
+      callgraph.py       调用图 & 可达性查询
+      parallel.py        函数体并行分析（fork 进程池）
       natives.py         Native 函数加载器
+      nativedb.py        Native 签名数据库（编译好的二进制，免去每次正则解析）
+    opt/
+      fold.py            常量折叠 & 死分支消除（可选优化 pass）
 
 快速使用示例：
 
@@ -29,7 +49,9 @@ GalaxyCC - Galaxy Script 编译器前端
 """
 
 from .pipeline import GalaxyFrontend, FrontendResult
-from .error import DiagnosticBag, SemanticError
+from .error import DiagnosticBag, DiagCategory, DIAG_CODES, SemanticError, DiagnosticLimitReached
+from .batch import BatchRunner, BatchReport, FileReport, is_corpus_clean
+from .corpus import Corpus, SourceFile
 from .semantic.type import (
     VOID, INT, FIXED, BOOL, STRING, TEXT,
     GType, BasicType, HandleType, ArrayType, FunctionType, StructType,
@@ -38,7 +60,9 @@ from .semantic.natives import COMMON_NATIVES
 
 __all__ = [
     'GalaxyFrontend', 'FrontendResult',
-    'DiagnosticBag', 'SemanticError',
+    'DiagnosticBag', 'DiagCategory', 'DIAG_CODES', 'SemanticError', 'DiagnosticLimitReached',
+    'BatchRunner', 'BatchReport', 'FileReport', 'is_corpus_clean',
+    'Corpus', 'SourceFile',
     'VOID', 'INT', 'FIXED', 'BOOL', 'STRING', 'TEXT',
     'GType', 'BasicType', 'HandleType', 'ArrayType', 'FunctionType', 'StructType',
     'COMMON_NATIVES',
@@ -0,0 +1,362 @@
+"""
+批量分析引擎
+============
+对一批 .galaxy 文件逐个跑 GalaxyFrontend.process_file，汇总每个文件的诊断。
+
+分诊（triage）场景只关心"语料是否干净"，可以：
+  fail_fast=True         每个文件记下第一条错误就停
+  max_diagnostics=N      每个文件最多记 N 条诊断
+  stop_on_failure=True   遇到第一个有错误的文件就结束整批
+
+诊断可以边跑边写到 report.py 的 JsonlWriter / SarifWriter（writers=[...]），
+配合 keep_diags=False，整批运行只在内存里保留每个文件的计数。
+
+很多文件 include 同一个库时，库里的诊断会随每个入口文件重复出现。
+dedup_includes=True 时这类诊断（file 不是入口文件本身的）跨整批去重：
+每条只保留一份，记下受影响的入口文件数（SemanticDiag.includers），
+汇总在 BatchReport.shared，整批结束后再写给 writers。
+
+order_includes=True 时先建整批的 include 图（includes.py），按拓扑序自底向上：
+被 include 的库先各解析一次放进前端的共享 AST 缓存，入口文件也按依赖顺序分析
+（需要前端开启 share_include_asts）。图放在 BatchReport.include_graph。
+
+mod / 战役的各个变体里有大量逐字节相同的文件（balancemulti、
+balancemultilanmethodcleanedup、balancemultislowwarpprism ……）。
+dedup_content=True 时先给每个文件算内容键——自身内容哈希加上 include 闭包里
+各文件的内容哈希（同样的文本在不同搜索路径下可能 include 到不同的库）——
+每组相同的键只分析第一个文件，结果（诊断改记到各自的路径下）分发给组里其余文件。
+重复组和省下的时间在 BatchReport.duplicates / time_saved。
+
+用法：
+    runner = BatchRunner(frontend, fail_fast=True)
+    report = runner.run(Path('scripts').rglob('*.galaxy'))
+    print(report.summary())
+
+    # 只回答"是否全部干净"
+    ok = is_corpus_clean(frontend, paths)
+"""
+
+from __future__ import annotations
+import time
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Optional
+
+from .corpus import Corpus
+from .error import DiagnosticBag, ErrorSeverity, SemanticDiag
+from .pipeline import GalaxyFrontend
+from .report import fill_byte_offsets
+
+if TYPE_CHECKING:
+    from .includes import IncludeGraph
+
+
+# ─── 结果对象 ──────────────────────────────────────────────────────────────────
+
+@dataclass
+class FileReport:
+    """单个文件的分析结果"""
+    path:      Path
+    errors:    int = 0
+    warnings:  int = 0
+    truncated: bool = False
+    elapsed:   float = 0.0       # 秒
+    diags:     Optional[DiagnosticBag] = None   # keep_diags=False 时不保留
+    # dedup_includes=True 时：errors / warnings / diags 只含本文件自己的诊断，
+    # 经 include 引入的（去重前）计数在这里
+    shared_errors:   int = 0
+    shared_warnings: int = 0
+    reused_bodies:   int = 0     # 已在别处检查过、这次没有重查的 include 函数体
+    duplicate_of:    Optional[Path] = None   # dedup_content：内容相同、结果取自这个文件
+
+    @property
+    def clean(self) -> bool:
+        return self.errors == 0 and self.shared_errors == 0
+
+
+@dataclass
+class BatchReport:
+    """整批的汇总"""
+    files:         list[FileReport] = field(default_factory=list)
+    planned:       int = 0           # 计划分析的文件数
+    stopped_early: bool = False      # stop_on_failure 触发，剩余文件未分析
+    elapsed:       float = 0.0
+    shared:        list[SemanticDiag] = field(default_factory=list)   # 去重后的 include 诊断
+    include_graph: Optional[IncludeGraph] = None     # order_includes=True 时整批的 include 图
+    duplicates:    dict[Path, list[Path]] = field(default_factory=dict)  # 代表文件 → 内容相同的其余文件
+    time_saved:    float = 0.0       # dedup_content 省下的分析时间（按代表文件的耗时估计）
+
+    @property
+    def total_errors(self) -> int:
+        return (sum(f.errors for f in self.files)
+                + sum(1 for d in self.shared if d.severity == ErrorSeverity.ERROR))
+
+    @property
+    def total_warnings(self) -> int:
+        return (sum(f.warnings for f in self.files)
+                + sum(1 for d in self.shared if d.severity == ErrorSeverity.WARNING))
+
+    @property
+    def failed(self) -> list[FileReport]:
+        return [f for f in self.files if not f.clean]
+
+    @property
+    def clean(self) -> bool:
+        """分析过的文件全部没有错误（stopped_early 时必然为 False）"""
+        return not self.failed
+
+    def summary(self) -> str:
+        text = (f"总计: {self.total_errors} 错误, {self.total_warnings} 警告\n"
+                f"失败文件: {len(self.failed)} / {len(self.files)}"
+                f"（耗时 {self.elapsed:.1f}s）")
+        truncated = sum(1 for f in self.files if f.truncated)
+        if truncated:
+            text += f"\n{truncated} 个文件达到诊断上限，只报告了部分诊断"
+        if self.stopped_early:
+            text += f"\n遇到有错误的文件即停止，{self.planned - len(self.files)} 个文件未分析"
+        if self.shared:
+            raw = sum(d.includers for d in self.shared)
+            text += (f"\ninclude 文件中的诊断 {len(self.shared)} 条"
+                     f"（去重前 {raw} 条，已计入总计）")
+        if self.include_graph is not None:
+            text += f"\ninclude 图: {self.include_graph.summary()}"
+        if self.duplicates:
+            dups = sum(len(v) for v in self.duplicates.values())
+            text += (f"\n内容重复的文件 {dups} 个（{len(self.duplicates)} 组），"
+                     f"只分析一次，约省 {self.time_saved:.1f}s")
+        return text
+
+    def duplicate_report(self) -> str:
+        """列出所有重复组：代表文件及与它内容相同的文件"""
+        lines = []
+        for first, others in sorted(self.duplicates.items(), key=lambda kv: -len(kv[1])):
+            lines.append(f"{first}  （另有 {len(others)} 个相同）")
+            lines.extend(f"  = {p}" for p in others)
+        return "\n".join(lines)
+
+
+# ─── include 诊断去重 ─────────────────────────────────────────────────────────
+
+class IncludeDeduper:
+    """
+    跨文件去重 include 引入的诊断。
+
+    同一条诊断的判定：所在文件、诊断码、行列、消息文本都相同。
+    所在文件比的是 include 解析出的路径（SemanticDiag.file）按 Corpus.key 归一后的结果：
+    同一个库的不同写法（TriggerLibs/NativeLib、triggerlibs/nativelib）算一个文件，
+    同一写法在不同搜索路径下解析到的不同文件各算各的。
+    第一次出现的那条留作代表，之后每遇到一次只把它的 includers 加一。
+    """
+
+    def __init__(self):
+        self._issues: dict[tuple, SemanticDiag] = {}
+        self._keys: dict[str, str] = {}         # SemanticDiag.file → Corpus.key
+
+    def _key(self, file: str) -> str:
+        key = self._keys.get(file)
+        if key is None:
+            key = self._keys[file] = Corpus.key(file)
+        return key
+
+    def split(self, path: str, diags) -> tuple[list[SemanticDiag], list[SemanticDiag]]:
+        """
+        把 path 的诊断分成 (本文件自己的, 经 include 引入的)。
+        经 include 引入的那些已登记去重，返回的是原始条目（用于计数）。
+        """
+        own, included = [], []
+        path = self._key(path)
+        for d in diags:
+            file = self._key(d.file) if d.file else path
+            if file == path:
+                own.append(d)
+                continue
+            included.append(d)
+            key = (file, d.code, d.line, d.column, d.message)
+            first = self._issues.get(key)
+            if first is None:
+                first = self._issues[key] = d
+            first.includers += 1
+        return own, included
+
+    def issues(self) -> list[SemanticDiag]:
+        """去重后的诊断，按文件、位置排序"""
+        return sorted(self._issues.values(), key=lambda d: (d.file, d.line, d.column))
+
+    def __len__(self):
+        return len(self._issues)
+
+
+# ─── 批量引擎 ─────────────────────────────────────────────────────────────────
+
+class BatchRunner:
+    """
+    批量分析引擎。
+
+    Args:
+        frontend: 已加载好 native 定义的 GalaxyFrontend
+        fail_fast / max_diagnostics: 每个文件的诊断上限，原样传给分析器
+        stop_on_failure: 第一个有错误的文件分析完后停止整批
+        on_result: 每个文件分析完成后的回调 on_result(FileReport)，用于实时输出
+        writers: 诊断输出器列表（有 write_file(path, diags) 方法，如 JsonlWriter），
+                 每个文件分析完立即写出
+        keep_diags: FileReport 是否保留完整诊断；只要计数 + 流式输出时设为 False
+        dedup_includes: 跨整批去重 include 文件里的诊断（见模块说明）
+        order_includes: 按 include 拓扑序自底向上分析，库文件预先解析一次（见模块说明）
+        dedup_content: 内容（含 include 闭包）相同的文件只分析一次（见模块说明）
+        analyzer_options: 其他传给 process_file 的分析选项（如 prune_unreachable）
+    """
+
+    def __init__(self, frontend: GalaxyFrontend, fail_fast: bool = False,
+                 max_diagnostics: int = None, stop_on_failure: bool = False,
+                 on_result: Optional[Callable[[FileReport], None]] = None,
+                 writers: Iterable = (), keep_diags: bool = True,
+                 dedup_includes: bool = False, order_includes: bool = False,
+                 dedup_content: bool = False, **analyzer_options):
+        self.frontend = frontend
+        self.stop_on_failure = stop_on_failure
+        self.on_result = on_result
+        self.writers = list(writers)
+        self.keep_diags = keep_diags
+        self.dedup = IncludeDeduper() if dedup_includes else None
+        self.order_includes = order_includes
+        self.dedup_content = dedup_content
+        self.analyzer_options = dict(analyzer_options)
+        if fail_fast:
+            self.analyzer_options['fail_fast'] = True
+        if max_diagnostics:
+            self.analyzer_options['max_diagnostics'] = max_diagnostics
+
+    def run_file(self, path: str | Path) -> FileReport:
+        path = Path(path)
+        return self._report(path, *self._analyze(path))
+
+    def _analyze(self, path: Path) -> tuple[DiagnosticBag, float, int]:
+        """分析一个文件，返回 (诊断, 耗时, reused_bodies)"""
+        t0 = time.perf_counter()
+        result = self.frontend.process_file(path, **self.analyzer_options)
+        return result.diags, time.perf_counter() - t0, result.reused_bodies
+
+    def _report(self, path: Path, diags: DiagnosticBag, elapsed: float,
+                reused_bodies: int = 0) -> FileReport:
+        """一个文件的诊断 → FileReport（include 去重、写出、计数）"""
+        report = FileReport(path=path, truncated=diags.truncated, elapsed=elapsed,
+                            reused_bodies=reused_bodies)
+        if self.writers:
+            fill_byte_offsets(diags, self.frontend.corpus, path)
+
+        if self.dedup is not None:
+            own, included = self.dedup.split(str(path), diags)
+            bag = DiagnosticBag()
+            bag.file, bag.truncated = diags.file, diags.truncated
+            bag.extend(own)
+            diags = bag
+            for d in included:
+                if d.severity == ErrorSeverity.ERROR:
+                    report.shared_errors += 1
+                else:
+                    report.shared_warnings += 1
+
+        for writer in self.writers:
+            writer.write_file(path, diags)
+        report.errors, report.warnings = diags.error_count, diags.warning_count
+        if self.keep_diags:
+            report.diags = diags
+        return report
+
+    def _content_keys(self, paths: list, report: BatchReport) -> dict[Path, tuple]:
+        """每个文件的内容键：(自身内容哈希, include 闭包各文件内容哈希)；读不了的文件没有键"""
+        graph = report.include_graph or self.frontend.include_graph(paths)
+        corpus = self.frontend.corpus
+        keys = {}
+        for path in paths:
+            src = corpus.get(path)
+            if src is None:
+                continue
+            closure = sorted(corpus.get(graph.names[k]).digest
+                             for k in graph.closure(corpus.key(path)) if k not in graph.unreadable)
+            keys[Path(path)] = (src.digest, tuple(closure))
+        return keys
+
+    @staticmethod
+    def _relabel(diags: DiagnosticBag, src: Path, dst: Path) -> DiagnosticBag:
+        """把 src 自己的诊断改记到 dst 下（include 里的诊断原样保留）"""
+        src, dst = str(src), str(dst)
+        bag = DiagnosticBag()
+        bag.file, bag.truncated = dst, diags.truncated
+        bag.extend(replace(d, file=dst) if d.file == src else d for d in diags)
+        return bag
+
+    def _order(self, paths: list, report: BatchReport) -> list:
+        """按 include 拓扑序重排入口文件，并把被 include 的库各预解析一次"""
+        graph = report.include_graph = self.frontend.include_graph(paths)
+        key = self.frontend.corpus.key
+        rank = {k: i for i, k in enumerate(k for comp in graph.components() for k in comp)}
+        included = {c for children in graph.edges.values() for c in children}
+        for k in sorted(included, key=rank.__getitem__):
+            self.frontend.preparse_include(graph.names[k])
+        return sorted(paths, key=lambda p: rank.get(key(p), len(rank)))
+
+    def run(self, paths: Iterable[str | Path]) -> BatchReport:
+        paths = list(paths)
+        report = BatchReport(planned=len(paths))
+        if self.dedup is not None:
+            self.dedup = IncludeDeduper()          # 每次 run 单独去重
+        t0 = time.perf_counter()
+        if self.order_includes:
+            paths = self._order(paths, report)
+
+        first_of: dict[tuple, Path] = {}      # 内容键 → 代表文件
+        dup_keys: set[tuple] = set()          # 有重复的内容键（只保留这些代表的完整诊断）
+        keys = {}
+        if self.dedup_content:
+            keys = self._content_keys(paths, report)
+            for path in paths:
+                k = keys.get(Path(path))
+                if k is None:
+                    continue
+                if k in first_of:
+                    dup_keys.add(k)
+                    report.duplicates.setdefault(first_of[k], []).append(Path(path))
+                else:
+                    first_of[k] = Path(path)
+        results: dict[tuple, tuple] = {}      # 内容键 → (诊断, 耗时, reused_bodies)
+
+        for path in paths:
+            path = Path(path)
+            k = keys.get(path)
+            done = results.get(k) if k is not None else None
+            if done is not None:
+                diags, elapsed, reused = done
+                file_report = self._report(path, self._relabel(diags, first_of[k], path),
+                                           0.0, reused)
+                file_report.duplicate_of = first_of[k]
+                report.time_saved += elapsed
+            elif k in dup_keys:
+                results[k] = self._analyze(path)
+                file_report = self._report(path, *results[k])
+            else:
+                file_report = self.run_file(path)
+            report.files.append(file_report)
+            if self.on_result is not None:
+                self.on_result(file_report)
+            if self.stop_on_failure and not file_report.clean:
+                report.stopped_early = len(report.files) < len(paths)
+                break
+
+        if self.dedup is not None:
+            report.shared = self.dedup.issues()
+            by_file: dict[str, list[SemanticDiag]] = {}
+            for d in report.shared:
+                by_file.setdefault(d.file, []).append(d)
+            for writer in self.writers:
+                for file, diags in by_file.items():
+                    writer.write_file(file, diags)
+        report.elapsed = time.perf_counter() - t0
+        return report
+
+
+def is_corpus_clean(frontend: GalaxyFrontend, paths: Iterable[str | Path],
+                    **analyzer_options) -> bool:
+    """语料是否全部没有错误：每个文件第一条错误即停，第一个脏文件即停"""
+    runner = BatchRunner(frontend, fail_fast=True, stop_on_failure=True, **analyzer_options)
+    return runner.run(paths).clean
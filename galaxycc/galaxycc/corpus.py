@@ -0,0 +1,246 @@
+"""
+语料读取与共享缓冲
+==================
+一次运行里同一个文件会被多处用到：收集类型名、语法解析、include 加载、内容哈希。
+Corpus 保证每个文件只读一次（整块读入），之后各处拿到的是同一个 SourceFile：
+
+  data          原始字节
+  text          解码后的文本（换行统一为 \\n，与文本模式 open() 读到的一致）
+  encoding      检测到的编码：有 BOM 按 BOM，否则依次尝试 UTF-8 / GB18030，
+                都失败时按 UTF-8 替换非法字节（与原先 errors='replace' 相同）
+  digest        内容哈希（blake2b，按需计算一次）
+  line_offsets / byte_line_offsets
+                每行行首在 text / data 中的偏移，line_col() / byte_offset() 据此换算
+
+用法：
+    corpus = Corpus()
+    src = corpus.load('maps/MyMap.galaxy')       # 第二次 load 同一路径不再读盘
+    tree = parser.parse(src.text)
+    line, col = src.line_col(token.start_pos)
+
+    frontend = GalaxyFrontend(grammar_file=..., corpus=corpus)   # include 也走同一个缓存
+"""
+
+from __future__ import annotations
+import codecs
+import hashlib
+import os
+import re
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+# 按 BOM 判断的编码，长的 BOM 放前面
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+# 没有 BOM 时依次尝试的编码（严格解码）
+FALLBACK_ENCODINGS = ('utf-8', 'gb18030')
+
+_NEWLINE_BYTES = re.compile(rb'\r\n|\r|\n')
+_NEWLINE = re.compile(r'\r\n|\r|\n')
+
+
+def decode(data: bytes, encodings=FALLBACK_ENCODINGS) -> tuple[str, str, int]:
+    """字节 → (文本, 编码名, BOM 字节数)，文本中的换行统一为 \\n"""
+    for bom, enc in _BOMS:
+        if data.startswith(bom):
+            text, bom_len = data[len(bom):].decode(enc, errors='replace'), len(bom)
+            break
+    else:
+        bom_len = 0
+        for enc in encodings:
+            try:
+                text = data.decode(enc)
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            enc = 'utf-8'
+            text = data.decode(enc, errors='replace')
+    if '\r' in text:
+        text = _NEWLINE.sub('\n', text)
+    return text, enc, bom_len
+
+
+class SourceFile:
+    """
+    一个已读入的源文件。字节、文本只在构造时生成一次，
+    行偏移表和哈希在第一次用到时计算。
+    """
+
+    __slots__ = ('path', 'data', 'text', 'encoding', 'bom', 'mtime_ns',
+                 '_digest', '_lines', '_byte_lines')
+
+    def __init__(self, path: str | Path, data: bytes, mtime_ns: int = 0,
+                 encodings=FALLBACK_ENCODINGS):
+        self.path = Path(path)
+        self.data = data
+        self.text, self.encoding, self.bom = decode(data, encodings)
+        self.mtime_ns = mtime_ns
+        self._digest: Optional[str] = None
+        self._lines: Optional[array] = None
+        self._byte_lines: Optional[array] = None
+
+    @classmethod
+    def from_text(cls, path: str | Path, text: str) -> 'SourceFile':
+        """由内存中的文本构造（编辑器缓冲区、测试），按 UTF-8 编码"""
+        return cls(path, text.encode('utf-8'))
+
+    def __repr__(self):
+        return f"SourceFile({str(self.path)!r}, {len(self.data)} bytes, {self.encoding})"
+
+    # ── 哈希 ───────────────────────────────────────────────────────────
+
+    @property
+    def digest(self) -> str:
+        """原始字节的 blake2b 摘要（十六进制）"""
+        if self._digest is None:
+            self._digest = hashlib.blake2b(self.data, digest_size=16).hexdigest()
+        return self._digest
+
+    # ── 行偏移表 ───────────────────────────────────────────────────────
+
+    @property
+    def line_offsets(self) -> array:
+        """每行行首在 text 中的字符偏移（第 1 行是 0）"""
+        if self._lines is None:
+            text = self.text
+            lines = array('I', [0])
+            pos = text.find('\n')
+            while pos >= 0:
+                lines.append(pos + 1)
+                pos = text.find('\n', pos + 1)
+            self._lines = lines
+        return self._lines
+
+    @property
+    def byte_line_offsets(self) -> array:
+        """每行行首在 data 中的字节偏移（含 BOM；\\r\\n、\\r、\\n 都算一次换行）"""
+        if self._byte_lines is None:
+            lines = array('I', [self.bom])
+            if self.encoding.startswith('utf-16'):
+                # 换行不是单字节，逐行编码累加
+                raw = self.data[self.bom:].decode(self.encoding, errors='replace')
+                pos = self.bom
+                for line in raw.splitlines(keepends=True)[:len(self.line_offsets) - 1]:
+                    pos += len(line.encode(self.encoding))
+                    lines.append(pos)
+            else:
+                lines.extend(m.end() for m in _NEWLINE_BYTES.finditer(self.data, self.bom))
+            self._byte_lines = lines
+        return self._byte_lines
+
+    @property
+    def line_count(self) -> int:
+        return len(self.line_offsets)
+
+    def line_col(self, offset: int) -> tuple[int, int]:
+        """text 中的字符偏移 → (行, 列)，都从 1 开始（与 Lark token 一致）"""
+        lines = self.line_offsets
+        i = bisect_right(lines, offset) - 1
+        return i + 1, offset - lines[i] + 1
+
+    def byte_offset(self, offset: int) -> int:
+        """text 中的字符偏移 → data 中的字节偏移"""
+        line, col = self.line_col(offset)
+        start = self.line_offsets[line - 1]
+        return (self.byte_line_offsets[line - 1]
+                + len(self.text[start:offset].encode(self.encoding, errors='replace')))
+
+    def line_text(self, line: int) -> str:
+        """第 line 行的文本（不含换行，从 1 开始）"""
+        lines = self.line_offsets
+        start = lines[line - 1]
+        end = lines[line] - 1 if line < len(lines) else len(self.text)
+        return self.text[start:end]
+
+
+class Corpus:
+    """
+    路径 → SourceFile 的缓存。每个文件只在第一次 load 时读盘，
+    之后类型名扫描、解析、include 加载、哈希共用同一份缓冲。
+
+    路径按 os.path.normcase(abspath) 归一，同一文件的不同写法命中同一条。
+    reads / bytes_read 记录实际读盘次数和字节数，用于确认 I/O 只发生一次。
+    """
+
+    def __init__(self, encodings=FALLBACK_ENCODINGS):
+        self.encodings = tuple(encodings)
+        self._files: dict[str, SourceFile] = {}
+        self.reads = 0
+        self.bytes_read = 0
+
+    @staticmethod
+    def key(path: str | Path) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def load(self, path: str | Path) -> SourceFile:
+        """读入（或从缓存取出）一个文件；文件不存在或读失败抛 OSError"""
+        key = self.key(path)
+        src = self._files.get(key)
+        if src is None:
+            src = self._files[key] = self._read(path)
+        return src
+
+    def load_all(self, paths: Iterable[str | Path]) -> tuple[list[SourceFile], dict[str, OSError]]:
+        """
+        批量读入，返回 (成功的 SourceFile 列表, { 路径: 读失败的异常 })。
+        读失败的文件不进缓存，由调用方决定如何报告。
+        """
+        sources, errors = [], {}
+        for path in paths:
+            try:
+                sources.append(self.load(path))
+            except OSError as e:
+                errors[str(path)] = e
+        return sources, errors
+
+    def get(self, path: str | Path) -> Optional[SourceFile]:
+        """只查缓存，不读盘"""
+        return self._files.get(self.key(path))
+
+    def put(self, src: SourceFile) -> SourceFile:
+        """放入一个已有的 SourceFile（如编辑器里未保存的缓冲区），覆盖同路径的旧内容"""
+        self._files[self.key(src.path)] = src
+        return src
+
+    def forget(self, path: str | Path) -> bool:
+        """丢弃缓存，下次 load 重新读盘"""
+        return self._files.pop(self.key(path), None) is not None
+
+    def stale(self) -> list[SourceFile]:
+        """
+        磁盘上已改动（mtime 变了）或已删除的缓存文件。
+        put() 放进来的缓冲区（mtime_ns 为 0）不算。长驻进程每次请求前检查一遍
+        """
+        result = []
+        for src in self._files.values():
+            if not src.mtime_ns:
+                continue
+            try:
+                if os.stat(src.path).st_mtime_ns != src.mtime_ns:
+                    result.append(src)
+            except OSError:
+                result.append(src)
+        return result
+
+    def _read(self, path: str | Path) -> SourceFile:
+        with open(path, 'rb', buffering=0) as f:
+            st = os.fstat(f.fileno())
+            data = f.read()         # 无缓冲的 FileIO 按 fstat 大小整块读入，不经过逐块拷贝
+        self.reads += 1
+        self.bytes_read += len(data)
+        return SourceFile(path, data, st.st_mtime_ns, self.encodings)
+
+    def __contains__(self, path) -> bool:
+        return self.key(path) in self._files
+
+    def __len__(self):
+        return len(self._files)
+
+    def __iter__(self) -> Iterator[SourceFile]:
+        return iter(self._files.values())
@@ -0,0 +1,410 @@
+"""
+常驻分析进程
+============
+每次命令行跑 demo.py / 验证脚本都要重新 import、构建语法、加载 native、解析库文件，
+真正分析目标文件之前就已经花掉大部分时间。这里起一个常驻进程，
+把热的 GalaxyFrontend（语法、native 作用域、共享的库 AST、目录索引）留在内存里，
+经 Unix socket 上的 JSON-RPC 2.0 提供服务。
+
+协议：每行一个 JSON 请求 / 响应（换行分隔），一个连接上可以连续发多个请求；
+多个连接并发处理（每个连接一个线程）。分析本身在同一个前端上串行执行
+（前端的缓存不是线程安全的，而且有 GIL），ping / stats 等轻量请求不受影响。
+
+方法：
+  analyze      {path | text, name?, options?}  → 诊断、计数、耗时
+  diagnostics  {path | text, name?, options?}  → 只有诊断列表
+  parse        {path | text, name?}            → 是否通过语法分析、顶层声明数、include
+  symbols      {path | text, name?, all?}      → 全局符号（默认只列本文件声明的）
+  invalidate   {path?, rescan?}                → 丢弃文件缓存；rescan 重建目录索引
+  stats / ping                                 → 进程状态、缓存大小
+  shutdown                                     → 退出
+
+每次分析前检查缓存里的文件在磁盘上是否改过（GalaxyFrontend.refresh），改过的重读。
+
+命令行：
+    python -m galaxycc.daemon serve --grammar galaxy.lark --natives natives.galaxy \\
+        --discover mods [--socket /tmp/galaxycc.sock]
+    python -m galaxycc.daemon call analyze --path maps/MyMap.galaxy
+
+代码里：
+    with DaemonClient() as client:
+        result = client.call('analyze', path='maps/MyMap.galaxy')
+"""
+
+from __future__ import annotations
+import argparse
+import inspect
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .pipeline import GalaxyFrontend
+
+# JSON-RPC 2.0 错误码
+PARSE_ERROR      = -32700
+INVALID_REQUEST  = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS   = -32602
+INTERNAL_ERROR   = -32603
+
+# 客户端可以逐次指定的分析选项（jobs 会 fork，不能在服务线程里用）
+ANALYZE_OPTIONS = ('prune_unreachable', 'fail_fast', 'max_diagnostics', 'flat_scopes', 'optimize')
+
+
+def default_socket_path() -> str:
+    base = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(base, f"galaxycc-{os.getuid()}.sock")
+
+
+class RpcError(Exception):
+    """带 JSON-RPC 错误码的异常；服务端抛出后原样回给客户端，客户端收到后也抛这个"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+# ─── 服务端 ───────────────────────────────────────────────────────────────────
+
+class AnalysisService:
+    """
+    方法实现，与传输无关（测试时可以直接调用 handle）。
+
+    frontend 应已加载好 native；建议 share_include_asts=True，
+    这样库文件在整个进程生命周期里只解析一次。
+    """
+
+    def __init__(self, frontend: GalaxyFrontend):
+        self.frontend = frontend
+        self.lock = threading.Lock()          # 前端上的操作串行执行
+        self.started = time.time()
+        self.requests = 0
+        self.shutdown_requested = threading.Event()
+
+    def handle(self, request) -> Optional[dict]:
+        """
+        处理一个解码后的请求，返回响应对象（通知，即没有 id 的请求，返回 None）。
+        不是带 method 的对象（包括批量请求的数组）一律回 -32600
+        """
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            req_id = request.get('id') if isinstance(request, dict) else None
+            return {'jsonrpc': '2.0', 'id': req_id,
+                    'error': {'code': INVALID_REQUEST,
+                              'message': "请求必须是带 method 的对象（不支持批量请求）"}}
+        req_id = request.get('id')
+        try:
+            method = getattr(self, 'rpc_' + request['method'], None)
+            if method is None:
+                raise RpcError(METHOD_NOT_FOUND, f"未知方法: {request['method']}")
+            params = request.get('params') or {}
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "params 必须是对象")
+            try:
+                inspect.signature(method).bind(**params)
+            except TypeError as e:
+                # 只有参数对不上签名才算客户端的错；方法内部的 TypeError 是前端的 bug
+                raise RpcError(INVALID_PARAMS, f"参数不匹配: {e}")
+            self.requests += 1
+            result = method(**params)
+        except RpcError as e:
+            response = {'error': {'code': e.code, 'message': str(e)}}
+        except Exception as e:
+            response = {'error': {'code': INTERNAL_ERROR, 'message': f"{type(e).__name__}: {e}"}}
+        else:
+            response = {'result': result}
+        if req_id is None:
+            return None
+        return {'jsonrpc': '2.0', 'id': req_id, **response}
+
+    # ── 取源码 ─────────────────────────────────────────────────────────
+
+    def _source(self, path: str = None, text: str = None, name: str = None) -> tuple[str, str]:
+        """(源码, 诊断里用的文件名)；path 和 text 给一个"""
+        if text is not None:
+            return text, name or path or '<input>'
+        if path is None:
+            raise RpcError(INVALID_PARAMS, "需要 path 或 text")
+        try:
+            return self.frontend.corpus.load(path).text, name or path
+        except OSError as e:
+            raise RpcError(INVALID_PARAMS, f"读取失败: {path}: {e}")
+
+    def _analyze(self, path, text, name, options):
+        options = dict(options or {})
+        unknown = set(options) - set(ANALYZE_OPTIONS)
+        if unknown:
+            raise RpcError(INVALID_PARAMS, f"不支持的分析选项: {', '.join(sorted(unknown))}")
+        with self.lock:
+            self.frontend.refresh()
+            source, name = self._source(path, text, name)
+            t0 = time.perf_counter()
+            result = self.frontend.process_string(source, source_name=name, **options)
+            elapsed = time.perf_counter() - t0
+        return result, name, elapsed
+
+    # ── 方法 ───────────────────────────────────────────────────────────
+
+    def rpc_analyze(self, path: str = None, text: str = None, name: str = None,
+                    options: dict = None) -> dict:
+        result, name, elapsed = self._analyze(path, text, name, options)
+        diags = result.diags
+        return {
+            'file':        name,
+            'success':     result.success,
+            'errors':      diags.error_count,
+            'warnings':    diags.warning_count,
+            'truncated':   diags.truncated,
+            'elapsed_ms':  round(elapsed * 1000, 2),
+            'diagnostics': [d.to_dict() for d in diags.iter_sorted()],
+        }
+
+    def rpc_diagnostics(self, path: str = None, text: str = None, name: str = None,
+                        options: dict = None) -> dict:
+        result, name, _ = self._analyze(path, text, name, options)
+        return {'file': name, 'diagnostics': [d.to_dict() for d in result.diags.iter_sorted()]}
+
+    def rpc_parse(self, path: str = None, text: str = None, name: str = None) -> dict:
+        from lark import exceptions as lark_exc
+        from .tree.transformer import IncludeDirective
+        with self.lock:
+            self.frontend.refresh()
+            source, name = self._source(path, text, name)
+            t0 = time.perf_counter()
+            try:
+                ast = self.frontend.transform_only(source)
+            except lark_exc.LarkError as e:
+                return {'file': name, 'ok': False, 'error': str(e),
+                        'elapsed_ms': round((time.perf_counter() - t0) * 1000, 2)}
+            elapsed = time.perf_counter() - t0
+        return {
+            'file':       name,
+            'ok':         True,
+            'decls':      len(ast.decls),
+            'includes':   [d.path for d in ast.decls if isinstance(d, IncludeDirective)],
+            'elapsed_ms': round(elapsed * 1000, 2),
+        }
+
+    def rpc_symbols(self, path: str = None, text: str = None, name: str = None,
+                    all: bool = False) -> dict:
+        result, name, _ = self._analyze(path, text, name, None)
+        if result.symbol_table is None:
+            return {'file': name, 'symbols': [],
+                    'diagnostics': [d.to_dict() for d in result.diags.iter_sorted()]}
+        symbols = []
+        for sym in result.symbol_table.globals():
+            if not all and sym.file != name:
+                continue
+            node = sym.node
+            symbols.append({
+                'name':   sym.name,
+                'kind':   sym.kind.name.lower(),
+                'type':   str(sym.gtype),
+                'file':   sym.file,
+                'line':   getattr(node, 'line', -1),
+                'column': getattr(node, 'col', -1),
+                'native': sym.is_native,
+                'const':  sym.is_const,
+            })
+        return {'file': name, 'symbols': symbols}
+
+    def rpc_invalidate(self, path: str = None, rescan: bool = False) -> dict:
+        with self.lock:
+            if path is not None:
+                dropped = [path] if self.frontend.forget_file(path) else []
+            else:
+                dropped = self.frontend.refresh()
+            if rescan:
+                self.frontend.include_index.refresh()
+        return {'dropped': dropped, 'rescanned': rescan}
+
+    def rpc_stats(self) -> dict:
+        frontend = self.frontend
+        return {
+            'pid':          os.getpid(),
+            'uptime_s':     round(time.time() - self.started, 1),
+            'requests':     self.requests,
+            'files':        len(frontend.corpus),
+            'bytes_read':   frontend.corpus.bytes_read,
+            'include_asts': frontend.cached_include_asts,
+        }
+
+    rpc_ping = rpc_stats
+
+    def rpc_shutdown(self) -> dict:
+        self.shutdown_requested.set()
+        return {'ok': True}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        service: AnalysisService = self.server.service
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {'jsonrpc': '2.0', 'id': None,
+                            'error': {'code': PARSE_ERROR, 'message': f"JSON 解析失败: {e}"}}
+            else:
+                response = service.handle(request)
+            if response is not None:
+                self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.wfile.flush()
+            if service.shutdown_requested.is_set():
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket 上的 JSON-RPC 服务，每个连接一个线程"""
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: AnalysisService):
+        if os.path.exists(socket_path):
+            if _alive(socket_path):
+                raise OSError(f"已有服务在 {socket_path} 上运行")
+            os.unlink(socket_path)                 # 上次异常退出留下的 socket 文件
+        self.socket_path = socket_path
+        self.service = service
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+
+def _alive(socket_path: str) -> bool:
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+
+# ─── 客户端 ───────────────────────────────────────────────────────────────────
+
+class DaemonClient:
+    """
+    一个连接上顺序发请求的客户端。
+
+        with DaemonClient('/tmp/galaxycc.sock') as client:
+            client.call('analyze', path='a.galaxy')
+    """
+
+    def __init__(self, socket_path: str = None, timeout: float = None):
+        self.socket_path = socket_path or default_socket_path()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(self.socket_path)
+        self._file = self._sock.makefile('rwb')
+        self._next_id = 0
+
+    def call(self, method: str, **params):
+        """发一个请求并等结果；服务端报错时抛 RpcError"""
+        self._next_id += 1
+        request = {'jsonrpc': '2.0', 'id': self._next_id, 'method': method, 'params': params}
+        self._file.write(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("服务端关闭了连接")
+        response = json.loads(line)
+        if 'error' in response:
+            raise RpcError(response['error']['code'], response['error']['message'])
+        return response['result']
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ─── 命令行 ───────────────────────────────────────────────────────────────────
+
+def build_frontend(args) -> GalaxyFrontend:
+    from .includes import IncludeIndex
+    dirs = list(args.search_dirs)
+    if args.discover:
+        dirs += IncludeIndex.discover(args.discover).search_dirs
+    frontend = GalaxyFrontend(grammar_file=args.grammar, search_dirs=dirs,
+                              share_include_asts=True)
+    if args.natives:
+        count = frontend.load_natives_from_file(args.natives, args.natives_db)
+        print(f"加载了 {count} 个 native 函数", file=sys.stderr)
+    else:
+        frontend.load_natives_common()
+    for path in args.preload:
+        frontend.preparse_include(path)
+    return frontend
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='python -m galaxycc.daemon', description='常驻分析进程')
+    ap.add_argument('--socket', default=None, help=f'socket 路径（默认 {default_socket_path()}）')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+
+    serve = sub.add_parser('serve', help='启动服务')
+    serve.add_argument('--grammar', required=True)
+    serve.add_argument('--natives', help='natives.galaxy（不给时用内置的常用 native）')
+    serve.add_argument('--natives-db', help='native 签名数据库（见 nativedb.py）')
+    serve.add_argument('-I', dest='search_dirs', action='append', default=[])
+    serve.add_argument('--discover', metavar='BASE', help='把 BASE 下所有 base.sc2data 加入搜索目录')
+    serve.add_argument('--preload', action='append', default=[],
+                       help='启动时预先解析的库文件（如 natives.galaxy），可多次给出')
+
+    call = sub.add_parser('call', help='发一个请求，打印 JSON 结果')
+    call.add_argument('method')
+    call.add_argument('--path')
+    call.add_argument('--text')
+    call.add_argument('--params', help='其余参数（JSON 对象）')
+
+    args = ap.parse_args(argv)
+    socket_path = args.socket or default_socket_path()
+
+    if args.cmd == 'serve':
+        service = AnalysisService(build_frontend(args))
+        with DaemonServer(socket_path, service) as server:
+            print(f"监听 {socket_path}", file=sys.stderr)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        return
+
+    params = json.loads(args.params) if args.params else {}
+    if args.path is not None:
+        params['path'] = os.path.abspath(args.path)
+    if args.text is not None:
+        params['text'] = args.text
+    try:
+        with DaemonClient(socket_path) as client:
+            result = client.call(args.method, **params)
+    except RpcError as e:
+        print(f"[{e.code}] {e}", file=sys.stderr)
+        sys.exit(1)
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,10 @@ Galaxy Script 语义错误体系
 尽量多检测错误）。
 """
 
+from __future__ import annotations
 from dataclasses import dataclass, field
 from enum import Enum, auto
+from typing import Iterator, TextIO
 
 
 class ErrorSeverity(Enum):
@@ -14,23 +16,142 @@ class ErrorSeverity(Enum):
     ERROR   = auto()
 
 
+class DiagCategory(Enum):
+    """诊断分类（按来源阶段粗分，用于汇总 / 过滤）"""
+    SYNTAX   = auto()    # 词法 / 语法错误
+    INCLUDE  = auto()    # include 加载问题
+    SEMANTIC = auto()    # 声明、类型、控制流等语义检查
+    INTERNAL = auto()    # 前端自身故障（AST 转换失败、分析器崩溃）
+    IO       = auto()    # 文件读写
+
+
+# ── 诊断码 ──────────────────────────────────────────────────────────────────
+# 稳定编号，供机器汇总 / 过滤使用：已发布的编号不改含义、不复用，新增只往后追加。
+# GSxxyy：xx 为分组 —— 00 文件  01 语法  02 include  03 声明  04 名字
+#                      05 类型  06 控制流  09 前端内部
+
+DIAG_CODES: dict[str, tuple[DiagCategory, str]] = {
+    'GS0001': (DiagCategory.IO,       '文件不存在'),
+
+    'GS0101': (DiagCategory.SYNTAX,   '词法错误：意外字符'),
+    'GS0102': (DiagCategory.SYNTAX,   '语法错误：意外 token'),
+    'GS0103': (DiagCategory.SYNTAX,   '语法分析失败'),
+
+    'GS0201': (DiagCategory.INCLUDE,  '找不到 include 文件'),
+
+    'GS0301': (DiagCategory.SEMANTIC, '类型重复定义'),
+    'GS0302': (DiagCategory.SEMANTIC, '结构体成员重复定义'),
+    'GS0303': (DiagCategory.SEMANTIC, '名字已被定义为非函数'),
+    'GS0304': (DiagCategory.SEMANTIC, '函数重声明与原声明类型不一致'),
+    'GS0305': (DiagCategory.SEMANTIC, '函数重复定义'),
+    'GS0306': (DiagCategory.SEMANTIC, '全局变量重复定义'),
+    'GS0307': (DiagCategory.SEMANTIC, '形参重复定义'),
+    'GS0308': (DiagCategory.SEMANTIC, '变量声明为 void 类型'),
+    'GS0309': (DiagCategory.SEMANTIC, '局部变量重复定义'),
+    'GS0310': (DiagCategory.SEMANTIC, '函数定义在符号表中不是函数类型'),
+
+    'GS0401': (DiagCategory.SEMANTIC, '未声明的标识符'),
+    'GS0402': (DiagCategory.SEMANTIC, '修改 const 变量'),
+
+    'GS0501': (DiagCategory.SEMANTIC, '初始值类型不匹配'),
+    'GS0502': (DiagCategory.SEMANTIC, '条件表达式无法转换为 bool'),
+    'GS0503': (DiagCategory.SEMANTIC, '返回值类型不匹配'),
+    'GS0504': (DiagCategory.SEMANTIC, '二元运算符不支持该操作数类型'),
+    'GS0505': (DiagCategory.SEMANTIC, '一元运算符不支持该操作数类型'),
+    'GS0506': (DiagCategory.SEMANTIC, '三元运算符分支类型不兼容'),
+    'GS0507': (DiagCategory.SEMANTIC, '赋值左侧不是左值'),
+    'GS0508': (DiagCategory.SEMANTIC, '赋值类型不匹配'),
+    'GS0509': (DiagCategory.SEMANTIC, '复合赋值类型不匹配'),
+    'GS0510': (DiagCategory.SEMANTIC, '调用的不是函数'),
+    'GS0511': (DiagCategory.SEMANTIC, '函数调用参数数量错误'),
+    'GS0512': (DiagCategory.SEMANTIC, '函数调用参数类型不匹配'),
+    'GS0513': (DiagCategory.SEMANTIC, '数组下标不是 int'),
+    'GS0514': (DiagCategory.SEMANTIC, '对非数组使用下标'),
+    'GS0515': (DiagCategory.SEMANTIC, '对非 struct 访问成员'),
+    'GS0516': (DiagCategory.SEMANTIC, 'struct 尚未完整定义'),
+    'GS0517': (DiagCategory.SEMANTIC, 'struct 没有该成员'),
+    'GS0518': (DiagCategory.SEMANTIC, '强制类型转换可能不安全'),
+    'GS0519': (DiagCategory.SEMANTIC, '数组大小无法静态求值'),
+
+    'GS0601': (DiagCategory.SEMANTIC, 'return 出现在函数外'),
+    'GS0602': (DiagCategory.SEMANTIC, 'break 出现在循环外'),
+    'GS0603': (DiagCategory.SEMANTIC, 'continue 出现在循环外'),
+    'GS0604': (DiagCategory.SEMANTIC, 'void 函数返回了值'),
+    'GS0605': (DiagCategory.SEMANTIC, '缺少返回值'),
+
+    'GS0901': (DiagCategory.INTERNAL, 'AST 转换失败'),
+    'GS0902': (DiagCategory.INTERNAL, 'AST 根节点类型错误'),
+    'GS0903': (DiagCategory.INTERNAL, '语义分析内部错误'),
+    'GS0904': (DiagCategory.INTERNAL, '语义分析崩溃'),
+}
+
+
 @dataclass
 class SemanticDiag:
-    """一条诊断信息"""
+    """
+    一条诊断信息。
+
+    message 可以是带 {} 占位符的模板，实参放在 args 里，第一次读取 message
+    时才格式化（类型名等只在真正输出时才转成字符串）；格式化后释放 args。
+
+    code 是 DIAG_CODES 里的稳定编号；file 是诊断所在文件：主文件名，或 include 解析到的
+    文件路径（解析不到时退回 include 里写的路径）；include 是 include 里写的原样路径
+    （如 TriggerLibs/NativeLib，不带扩展名、依赖搜索目录），主文件里的诊断为空；
+    offset 是源码中的字符偏移（Lark 的 start_pos，0 起）；byte_offset 是原文件里
+    （按文件本身的编码，GB18030 / UTF-8 / 带 BOM）的字节偏移，要有 corpus 里的原文才能换算，
+    由 report.fill_byte_offsets 填写（批量引擎写出前自动填），未填为 -1。
+    includers 只在批量去重（batch.IncludeDeduper）后的 include 诊断上有值。
+    """
     severity: ErrorSeverity
-    message:  str
+    template: str
     line:     int = -1
     column:   int = -1
     hint:     str = ''       # 可选修复提示
+    args:     tuple = ()     # 模板实参；为空时 template 就是最终文本
+    category: DiagCategory = DiagCategory.SEMANTIC
+    code:     str = ''
+    file:     str = ''
+    offset:   int = -1
+    byte_offset: int = -1
+    include:  str = ''
+    includers: int = 0       # 有多少个被分析文件经 include 引入了这条诊断
+
+    @property
+    def message(self) -> str:
+        if self.args:
+            self.template = self.template.format(*self.args)
+            self.args = ()
+        return self.template
+
+    @property
+    def sort_key(self) -> tuple[int, int]:
+        return self.line, self.column
 
     def __str__(self):
         loc = f"{self.line}:{self.column}" if self.line > 0 else '?:?'
-        tag = self.severity.name
+        tag = f"{self.severity.name} {self.code}" if self.code else self.severity.name
         base = f"[{tag}] {loc}  {self.message}"
         if self.hint:
             base += f"\n  hint: {self.hint}"
         return base
 
+    def to_dict(self) -> dict:
+        """机器可读形式（JSONL 输出用）"""
+        return {
+            'code':     self.code,
+            'severity': self.severity.name.lower(),
+            'category': self.category.name.lower(),
+            'file':     self.file,
+            'include':  self.include,
+            'line':     self.line,
+            'column':   self.column,
+            'char_offset': self.offset,
+            'byte_offset': self.byte_offset,
+            'message':  self.message,
+            'hint':     self.hint,
+            'includers': self.includers,
+        }
+
 
 class SemanticError(Exception):
     """单次立即抛出（仅在 fail-fast 模式使用）"""
@@ -40,42 +161,132 @@ class SemanticError(Exception):
         self.column = column
 
 
+class DiagnosticLimitReached(SemanticError):
+    """诊断数达到上限（fail_fast / max_diagnostics），由分析器捕获后提前结束"""
+    def __init__(self, count: int):
+        super().__init__(f"诊断数达到上限（{count} 条），分析提前结束")
+        self.count = count
+
+
 class DiagnosticBag:
     """
     诊断信息收集袋。
     语义分析器将错误/警告加入此袋，
     分析结束后统一输出，而不是每遇一个错误立即中断。
+
+    加入时按严重级别、分类各放一个桶并维护计数，has_errors / count / errors
+    等查询都是 O(1)，不再每次遍历全部诊断。errors / warnings 返回内部列表，只读。
+
+    分诊场景只关心"有没有错"时可以设上限：
+      fail_fast=True       记下第一条错误后即抛 DiagnosticLimitReached
+      max_diagnostics=N    记满 N 条诊断（错误 + 警告）后抛 DiagnosticLimitReached
+    超限的那条诊断仍会记入；之后 truncated 为 True。
+
+    file / include 是之后记入的诊断所属的文件（见 SemanticDiag），由分析器在切换文件
+    （处理 include）时更新。
     """
-    def __init__(self):
+    def __init__(self, fail_fast: bool = False, max_diagnostics: int = None):
         self._diags: list[SemanticDiag] = []
+        self._by_severity: dict[ErrorSeverity, list[SemanticDiag]] = {
+            sev: [] for sev in ErrorSeverity}
+        self._by_category: dict[DiagCategory, list[SemanticDiag]] = {}
+        self._in_order = True          # 是否按 (行, 列) 递增加入，是则输出时免排序
+        self.fail_fast = fail_fast
+        self.max_diagnostics = max_diagnostics if max_diagnostics and max_diagnostics > 0 else None
+        self.truncated = False
+        self.file = ''
+        self.include = ''
 
     # ── 添加诊断 ────────────────────────────────────────────────────────────
 
-    def error(self, message: str, node=None, hint: str = ''):
-        line, column = _loc(node)
-        self._diags.append(SemanticDiag(ErrorSeverity.ERROR, message, line, column, hint))
+    def error(self, message: str, node=None, hint: str = '', args: tuple = (),
+              category: DiagCategory = None, code: str = ''):
+        """
+        记一条错误。message 里有 {} 占位符时，实参放 args，输出时才格式化：
+            diag.error("无法将 '{}' 赋值给 '{}'", node, args=(rtype, ltype), code='GS0508')
+        给了 code 时分类取 DIAG_CODES 里登记的分类。
+        """
+        self._record(ErrorSeverity.ERROR, message, node, hint, args, category, code)
+
+    def warning(self, message: str, node=None, hint: str = '', args: tuple = (),
+                category: DiagCategory = None, code: str = ''):
+        self._record(ErrorSeverity.WARNING, message, node, hint, args, category, code)
+
+    def _record(self, severity, message, node, hint, args, category, code):
+        if category is None:
+            category = DIAG_CODES[code][0] if code else DiagCategory.SEMANTIC
+        line, column, offset = _loc(node)
+        self.add(SemanticDiag(severity, message, line, column, hint, args, category,
+                              code, self.file, offset, include=self.include))
+
+    def add(self, diag: SemanticDiag):
+        """记入一条现成的诊断（合并其他袋子时用），同样受上限约束"""
+        if self._diags and self._in_order and diag.sort_key < self._diags[-1].sort_key:
+            self._in_order = False
+        self._diags.append(diag)
+        self._by_severity[diag.severity].append(diag)
+        bucket = self._by_category.get(diag.category)
+        if bucket is None:
+            bucket = self._by_category[diag.category] = []
+        bucket.append(diag)
+        if (self.fail_fast and diag.severity == ErrorSeverity.ERROR
+                or self.max_diagnostics is not None and len(self._diags) >= self.max_diagnostics):
+            self.truncated = True
+            raise DiagnosticLimitReached(len(self._diags))
 
-    def warning(self, message: str, node=None, hint: str = ''):
-        line, column = _loc(node)
-        self._diags.append(SemanticDiag(ErrorSeverity.WARNING, message, line, column, hint))
+    def extend(self, diags):
+        """依次记入另一组诊断（如另一个 DiagnosticBag）"""
+        for d in diags:
+            self.add(d)
+
+    @property
+    def limited(self) -> bool:
+        """是否设置了上限"""
+        return self.fail_fast or self.max_diagnostics is not None
+
+    def spawn(self) -> 'DiagnosticBag':
+        """同样上限设置的空袋子（并行 worker 用）"""
+        bag = DiagnosticBag(self.fail_fast, self.max_diagnostics)
+        bag.file, bag.include = self.file, self.include
+        return bag
 
     # ── 查询 ────────────────────────────────────────────────────────────────
 
     @property
     def has_errors(self) -> bool:
-        return any(d.severity == ErrorSeverity.ERROR for d in self._diags)
+        return bool(self._by_severity[ErrorSeverity.ERROR])
 
     @property
     def count(self) -> int:
         return len(self._diags)
 
     @property
-    def errors(self):
-        return [d for d in self._diags if d.severity == ErrorSeverity.ERROR]
+    def error_count(self) -> int:
+        return len(self._by_severity[ErrorSeverity.ERROR])
 
     @property
-    def warnings(self):
-        return [d for d in self._diags if d.severity == ErrorSeverity.WARNING]
+    def warning_count(self) -> int:
+        return len(self._by_severity[ErrorSeverity.WARNING])
+
+    @property
+    def errors(self) -> list[SemanticDiag]:
+        return self._by_severity[ErrorSeverity.ERROR]
+
+    @property
+    def warnings(self) -> list[SemanticDiag]:
+        return self._by_severity[ErrorSeverity.WARNING]
+
+    def code_counts(self) -> dict[str, int]:
+        counts: dict[str, int] = {}
+        for d in self._diags:
+            counts[d.code] = counts.get(d.code, 0) + 1
+        return counts
+
+    def by_category(self, category: DiagCategory) -> list[SemanticDiag]:
+        return self._by_category.get(category, [])
+
+    def category_counts(self) -> dict[DiagCategory, int]:
+        return {cat: len(bucket) for cat, bucket in self._by_category.items()}
 
     def __iter__(self):
         return iter(self._diags)
@@ -85,29 +296,60 @@ class DiagnosticBag:
 
     # ── 输出 ────────────────────────────────────────────────────────────────
 
-    def report(self) -> str:
+    def iter_sorted(self) -> Iterator[SemanticDiag]:
+        """按 (行, 列) 顺序产出诊断；加入时已有序则不排序（排序稳定，同位置保持加入顺序）"""
+        if self._in_order:
+            return iter(self._diags)
+        return iter(sorted(self._diags, key=SemanticDiag.sort_key.fget))
+
+    def iter_report(self) -> Iterator[str]:
+        """逐行产出报告文本，每条诊断在产出时才格式化"""
         if not self._diags:
-            return "No diagnostics."
-        lines = [str(d) for d in sorted(self._diags, key=lambda d: (d.line, d.column))]
-        summary = (f"\n{'─'*60}\n"
-                   f"{len(self.errors)} error(s), {len(self.warnings)} warning(s)")
-        return '\n'.join(lines) + summary
+            yield "No diagnostics."
+            return
+        for d in self.iter_sorted():
+            yield str(d)
+        summary = (f"{'─'*60}\n"
+                   f"{self.error_count} error(s), {self.warning_count} warning(s)")
+        if self.truncated:
+            summary += "（已达诊断上限，分析提前结束）"
+        yield summary
+
+    def write_report(self, stream: TextIO):
+        """把报告逐行写入 stream（大批量诊断时不在内存里拼出整份报告）"""
+        for line in self.iter_report():
+            stream.write(line)
+            stream.write('\n')
+
+    def report(self) -> str:
+        return '\n'.join(self.iter_report())
 
     def raise_if_errors(self):
         if self.has_errors:
-            raise SemanticError(f"{len(self.errors)} semantic error(s) found.\n" +
+            raise SemanticError(f"{self.error_count} semantic error(s) found.\n" +
                                 '\n'.join(str(d) for d in self.errors))
 
 
-def _loc(node) -> tuple[int, int]:
-    """从 Lark Tree/Token 节点提取行列信息"""
+def _loc(node) -> tuple[int, int, int]:
+    """
+    提取 (行, 列, 字符偏移)，取不到的为 -1。支持：
+      AST 节点（line / col / offset）、Lark Token（line / column / start_pos）、
+      Lark 解析异常（line / column / pos_in_stream）、带 meta 的 Lark Tree
+    """
     if node is None:
-        return -1, -1
-    # Lark Token
+        return -1, -1, -1
+    # AST 节点
+    if hasattr(node, 'col'):
+        return node.line, node.col, getattr(node, 'offset', -1)
+    # Lark Token / 解析异常
     if hasattr(node, 'line') and hasattr(node, 'column'):
-        return getattr(node, 'line', -1), getattr(node, 'column', -1)
+        offset = getattr(node, 'start_pos', None)
+        if offset is None:
+            offset = getattr(node, 'pos_in_stream', None)
+        return node.line, node.column, -1 if offset is None else offset
     # Lark Tree with meta
     if hasattr(node, 'meta'):
         meta = node.meta
-        return getattr(meta, 'line', -1), getattr(meta, 'column', -1)
-    return -1, -1
+        return (getattr(meta, 'line', -1), getattr(meta, 'column', -1),
+                getattr(meta, 'start_pos', -1))
+    return -1, -1, -1
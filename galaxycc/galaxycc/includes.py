@@ -0,0 +1,306 @@
+"""
+include 依赖图
+==============
+不做完整解析，只用 prescan 的词法级扫描取出每个文件的 include "..."，
+经 IncludeIndex（search_dirs 的目录索引，大小写不敏感）解析成文件，
+建出整个工作区的 include 图：
+
+  edges       文件 → 它直接 include 的文件（按出现顺序）
+  missing     文件 → 找不到的 include 路径
+  cycles()    互相 include 的文件组（强连通分量，含自己 include 自己）
+  order()     拓扑序：被依赖的库在前，入口文件在后；环里的文件排在一起
+
+extracted_files.txt 那种手工整理的加载顺序可以直接由 order() 得到。
+批量分析时按这个顺序自底向上跑，每个库只解析一次，AST 在整批里共享
+（见 GalaxyFrontend.share_include_asts / BatchRunner(order_includes=True)）。
+
+用法：
+    graph = IncludeGraph.build(Path('scripts').rglob('*.galaxy'), search_dirs)
+    for path in graph.order():
+        ...
+    print(graph.summary())
+
+命令行：
+    python -m galaxycc.includes scripts/*.galaxy -I mods/core.sc2mod/base.sc2data
+"""
+
+from __future__ import annotations
+import argparse
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .corpus import Corpus
+from .prescan import FileDecls, scan_declarations
+
+
+def _norm(path: str) -> str:
+    """include 路径 / 相对路径 → 索引键：统一 / 分隔、小写（SC2 的 include 不区分大小写）"""
+    return path.replace('\\', '/').strip('/').lower()
+
+
+class IncludeIndex:
+    """
+    search_dirs 的目录索引：构造时把每个目录整棵遍历一次，
+    记下 "相对路径（小写）→ 文件" 的映射，之后每次 include 查找是 O(1) 的字典查询，
+    不再对每个目录、每种写法调用 os.path.exists。
+
+    查找规则与原先逐个探测一致：按 search_dirs 的顺序，每个目录里先试
+    path + '.galaxy'，再试 path 本身；只是比较不区分大小写
+    （include "TriggerLibs/natives" 能找到 cascviewer 导出的 triggerlibs/natives.galaxy）。
+
+    目录内容变了调用 refresh() 重建。
+    """
+
+    def __init__(self, search_dirs: Iterable[str | Path] = ()):
+        self.search_dirs = [str(d) for d in search_dirs]
+        self._files: dict[str, tuple[int, str]] = {}     # 键 → (目录序号, 文件路径)
+        self.refresh()
+
+    @classmethod
+    def discover(cls, base: str | Path, marker: str = 'base.sc2data') -> 'IncludeIndex':
+        """以 base 下所有名为 marker 的目录为 search_dirs（大小写不敏感，按路径排序）"""
+        marker = marker.lower()
+        dirs = []
+        for root, subdirs, _ in os.walk(base):
+            for d in subdirs:
+                if d.lower() == marker:
+                    dirs.append(os.path.join(root, d))
+            subdirs[:] = [d for d in subdirs if d.lower() != marker]
+        return cls(sorted(dirs))
+
+    @classmethod
+    def chain(cls, indexes: Iterable['IncludeIndex']) -> 'IncludeIndex':
+        """
+        把已建好的索引按顺序串起来（排前面的优先），不再遍历目录。
+        工作区里每个目录只索引一次，各层的搜索路径由它们拼出来
+        """
+        index = cls.__new__(cls)
+        index.search_dirs, index._files = [], {}
+        for part in indexes:
+            offset = len(index.search_dirs)
+            for key, (i, path) in part._files.items():
+                index._files.setdefault(key, (offset + i, path))
+            index.search_dirs.extend(part.search_dirs)
+        return index
+
+    def refresh(self):
+        """重新遍历所有目录"""
+        files = {}
+        for i, d in enumerate(self.search_dirs):
+            for root, _, names in os.walk(d):
+                rel_root = os.path.relpath(root, d)
+                rel_root = '' if rel_root == '.' else rel_root + '/'
+                for name in names:
+                    path = os.path.join(root, name)
+                    files.setdefault(_norm(rel_root + name), (i, path))   # 排前面的目录优先
+        self._files = files
+
+    def resolve(self, include_path: str) -> Optional[str]:
+        """include 路径 → 文件路径，找不到返回 None"""
+        key = _norm(include_path)
+        with_ext = self._files.get(key + '.galaxy')
+        exact = self._files.get(key)
+        if with_ext is None:
+            return exact[1] if exact else None
+        if exact is None or with_ext[0] <= exact[0]:
+            return with_ext[1]
+        return exact[1]
+
+    def __len__(self):
+        return len(self._files)
+
+
+class IncludeGraph:
+    """
+    工作区的 include 图。节点是文件路径（按 Corpus.key 归一），
+    names 记录每个节点第一次见到时的原始写法，输出时用它。
+    """
+
+    def __init__(self):
+        self.edges:   dict[str, list[str]] = {}
+        self.missing: dict[str, list[str]] = {}     # 文件 → 找不到的 include 路径
+        self.names:   dict[str, str] = {}           # key → 原始路径
+        self.unreadable: dict[str, OSError] = {}    # 读不了的文件（也不再展开）
+
+    @classmethod
+    def build(cls, roots: Iterable[str | Path], search_dirs: Iterable[str | Path] = (),
+              corpus: Corpus = None, resolve=None,
+              scans: dict[str, FileDecls] = None) -> 'IncludeGraph':
+        """
+        从 roots 出发沿 include 展开，建出整张图。
+
+        resolve(include_path) → 文件路径或 None，默认用 search_dirs 建一个 IncludeIndex；
+        corpus 给出时文件从它读，与之后的解析共用缓冲。
+        scans 是 "源码文本 → 扫描结果" 的缓存，多次建图时传同一个，
+        natives 这类被所有文件 include 的大库只扫描一次。
+        """
+        corpus = corpus if corpus is not None else Corpus()
+        if resolve is None:
+            resolve = IncludeIndex(search_dirs).resolve
+        if scans is None:
+            scans = {}
+        graph = cls()
+        # include 路径 → 解析结果；同一个库被上千个文件 include，只查一次目录
+        resolved: dict[str, Optional[str]] = {}
+
+        stack = [str(p) for p in roots]
+        stack.reverse()
+        while stack:
+            path = stack.pop()
+            key = corpus.key(path)
+            if key in graph.edges:
+                continue
+            graph.names[key] = path
+            children = graph.edges[key] = []
+            try:
+                src = corpus.load(path)
+            except OSError as e:
+                graph.unreadable[key] = e
+                continue
+            decls = scans.get(src.text)
+            if decls is None:
+                decls = scans[src.text] = scan_declarations(src.text)
+            for inc in decls.includes:
+                if inc not in resolved:
+                    resolved[inc] = resolve(inc)
+                target = resolved[inc]
+                if target is None:
+                    graph.missing.setdefault(key, []).append(inc)
+                    continue
+                tkey = corpus.key(target)
+                if tkey not in children:
+                    children.append(tkey)
+                if tkey not in graph.edges:
+                    graph.names.setdefault(tkey, target)
+                    stack.append(target)
+        return graph
+
+    # ── 查询 ───────────────────────────────────────────────────────────
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __contains__(self, key) -> bool:
+        return key in self.edges
+
+    def closure(self, key: str) -> set[str]:
+        """key 直接或间接 include 的所有文件（不含自身，除非在环上）"""
+        seen: set[str] = set()
+        stack = list(self.edges.get(key, ()))
+        while stack:
+            k = stack.pop()
+            if k not in seen:
+                seen.add(k)
+                stack.extend(self.edges.get(k, ()))
+        return seen
+
+    def includers(self) -> dict[str, list[str]]:
+        """反向边：文件 → include 它的文件"""
+        rev: dict[str, list[str]] = {k: [] for k in self.edges}
+        for k, children in self.edges.items():
+            for c in children:
+                rev[c].append(k)
+        return rev
+
+    def components(self) -> list[list[str]]:
+        """
+        强连通分量（Tarjan，迭代实现），按逆拓扑顺序产出——
+        也就是被依赖的分量在前，正好是自底向上的分析顺序
+        """
+        index: dict[str, int] = {}
+        low:   dict[str, int] = {}
+        on_stack: set[str] = set()
+        stack: list[str] = []
+        result: list[list[str]] = []
+        counter = 0
+
+        for root in self.edges:
+            if root in index:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.edges[root]))]
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self.edges.get(child, ()))))
+                        break
+                    if child in on_stack:
+                        low[node] = min(low[node], index[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        comp = []
+                        while True:
+                            k = stack.pop()
+                            on_stack.discard(k)
+                            comp.append(k)
+                            if k == node:
+                                break
+                        comp.reverse()
+                        result.append(comp)
+        return result
+
+    def cycles(self) -> list[list[str]]:
+        """互相 include 的文件组（多于一个文件，或自己 include 自己）"""
+        return [c for c in self.components()
+                if len(c) > 1 or c[0] in self.edges.get(c[0], ())]
+
+    def order(self) -> list[str]:
+        """所有文件的拓扑序（原始路径），被 include 的在前"""
+        return [self.names[k] for comp in self.components() for k in comp]
+
+    def summary(self) -> str:
+        missing = sum(len(v) for v in self.missing.values())
+        text = (f"{len(self.edges)} 个文件，{sum(len(v) for v in self.edges.values())} 条 include，"
+                f"{missing} 条找不到")
+        cycles = self.cycles()
+        if cycles:
+            text += f"，{len(cycles)} 个 include 环"
+        if self.unreadable:
+            text += f"，{len(self.unreadable)} 个文件读取失败"
+        return text
+
+
+# ─── 命令行 ───────────────────────────────────────────────────────────────────
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='python -m galaxycc.includes',
+                                 description='include 依赖图：拓扑序、环、找不到的文件')
+    ap.add_argument('files', nargs='+', help='入口 .galaxy 文件')
+    ap.add_argument('-I', dest='search_dirs', action='append', default=[],
+                    help='include 搜索目录（可多次给出）')
+    ap.add_argument('--discover', metavar='BASE',
+                    help='把 BASE 下所有 base.sc2data 目录加入搜索目录')
+    ap.add_argument('--order', action='store_true', help='只输出拓扑序，每行一个文件')
+    args = ap.parse_args(argv)
+
+    dirs = list(args.search_dirs)
+    if args.discover:
+        dirs += IncludeIndex.discover(args.discover).search_dirs
+    graph = IncludeGraph.build(args.files, resolve=IncludeIndex(dirs).resolve)
+    if args.order:
+        for path in graph.order():
+            print(path)
+        return
+    print(graph.summary())
+    for key, incs in graph.missing.items():
+        for inc in incs:
+            print(f"找不到: {graph.names[key]} → include \"{inc}\"")
+    for cycle in graph.cycles():
+        print("include 环: " + " → ".join(graph.names[k] for k in cycle))
+
+
+if __name__ == '__main__':
+    main()
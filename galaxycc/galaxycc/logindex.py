@@ -0,0 +1,532 @@
+"""
+验证日志索引
+============
+把 validation_errors_*.log 和 report.py 的 JSONL 导入本地 SQLite，按文件 / 错误类型 /
+token / 行号建索引，替代手工 grep 几 MB 的日志。
+
+支持的输入：
+  validate_galaxy.py      纯语法报告（FILE / PATH / UnexpectedToken ... 块）
+  validate_galaxy_V2.py   语法+语义报告（【语法错误】【文件截断】【语义问题】分节）
+  *.jsonl                 galaxycc.report.JsonlWriter 的输出
+
+每条错误记一行 entries：
+  kind    UnexpectedToken / UnexpectedCharacters / Truncated / Semantic / 其他异常名，
+          JSONL 里是诊断码（GS0401 等）
+  token   出错的 token 或消息里第一个引号括起的名字（标识符、类型名）
+  file    报告里的相对文件名；JSONL 取路径的文件名部分
+
+一次导入是一个 run，名字默认取日志文件名（validation_errors_7）；
+重复导入同名 run 会整体替换。查询时 run 可以写 id、完整名字或末尾编号（7）。
+
+命令行：
+    python -m galaxycc.logindex ingest validation_errors_*.log diags.jsonl
+    python -m galaxycc.logindex runs
+    python -m galaxycc.logindex token funcref            # 哪些文件在 token X 上失败
+    python -m galaxycc.logindex kinds 7                  # 某次运行按错误类型统计
+    python -m galaxycc.logindex file LibIGHS.galaxy      # 某个文件历次的错误
+    python -m galaxycc.logindex diff 5 7                 # 两次运行之间的变化
+
+数据库默认是当前目录下的 validation_index.db（--db 指定）。
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path, PureWindowsPath
+from typing import Iterator, Optional
+
+DEFAULT_DB = 'validation_index.db'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY,
+    name        TEXT UNIQUE NOT NULL,
+    source      TEXT,
+    format      TEXT,
+    generated   TEXT,
+    grammar     TEXT,
+    scripts_dir TEXT,
+    total_files INTEGER,
+    ingested_at TEXT
+);
+CREATE TABLE IF NOT EXISTS entries (
+    run_id   INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    file     TEXT NOT NULL,
+    path     TEXT,
+    section  TEXT,
+    kind     TEXT NOT NULL,
+    token    TEXT,
+    line     INTEGER,
+    col      INTEGER,
+    context  TEXT,
+    message  TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_entries_run_file ON entries(run_id, file);
+CREATE INDEX IF NOT EXISTS ix_entries_kind     ON entries(kind, run_id);
+CREATE INDEX IF NOT EXISTS ix_entries_token    ON entries(token, run_id);
+CREATE INDEX IF NOT EXISTS ix_entries_file     ON entries(file, run_id);
+CREATE INDEX IF NOT EXISTS ix_entries_line     ON entries(file, line);
+"""
+
+_ENTRY_COLUMNS = ('file', 'path', 'section', 'kind', 'token', 'line', 'col', 'context', 'message')
+
+
+@dataclass
+class LogEntry:
+    """日志里的一条错误"""
+    file:    str
+    path:    str = ''
+    section: str = 'syntax'       # syntax / truncated / semantic，JSONL 里是诊断类别
+    kind:    str = ''
+    token:   Optional[str] = None
+    line:    int = -1
+    col:     int = -1
+    context: str = ''             # 所在函数（语义错误）
+    message: str = ''
+
+    def row(self, run_id: int) -> tuple:
+        return (run_id,) + tuple(getattr(self, c) for c in _ENTRY_COLUMNS)
+
+
+@dataclass
+class LogRun:
+    """一份日志解析出的运行信息 + 条目"""
+    name:        str
+    source:      str
+    format:      str
+    generated:   str = ''
+    grammar:     str = ''
+    scripts_dir: str = ''
+    total_files: Optional[int] = None
+    entries:     list[LogEntry] = field(default_factory=list)
+
+
+# ─── 文本日志解析 ─────────────────────────────────────────────────────────────
+
+_RE_TOKEN    = re.compile(r"UnexpectedToken '(.*)' at line (\d+), col (\d+)$")
+_RE_CHARS    = re.compile(r"UnexpectedCharacters at line (\d+), col (\d+)$")
+_RE_TRUNC_AT = re.compile(r"\[文件截断\] 文件在 line (\d+), col (\d+) 处意外结束")
+_RE_SEMANTIC = re.compile(r"\[语义错误\] line (-?\d+), col (-?\d+)(?: \(in ([^)]*)\))?: (.*)$")
+_RE_QUOTED   = re.compile(r"'([^']*)'")
+_RE_TOTAL    = re.compile(r"(\d+) 个文件")
+
+_SECTIONS = {
+    '【语法错误】': 'syntax',
+    '【文件截断（内容不完整，非语法错误）】': 'truncated',
+    '【语义问题】': 'semantic',
+}
+_HEADERS = {
+    '生成时间': 'generated',
+    '语法文件': 'grammar',
+    '脚本目录': 'scripts_dir',
+}
+_RULE_EQ   = '=' * 72
+_RULE_DASH = '-' * 72
+
+
+def _first_quoted(text: str) -> Optional[str]:
+    m = _RE_QUOTED.search(text)
+    return m.group(1) if m else None
+
+
+def _parse_block(file: str, path: str, section: str, lines: list[str]) -> Iterator[LogEntry]:
+    """一个 FILE/PATH 块的正文 → 条目（语义块每行一条，语法块一条）"""
+    if section == 'semantic':
+        for text in lines:
+            m = _RE_SEMANTIC.search(text)
+            if m:
+                message = m.group(4)
+                yield LogEntry(file, path, section, 'Semantic', _first_quoted(message),
+                               int(m.group(1)), int(m.group(2)), m.group(3) or '', message)
+            elif text.strip():
+                yield LogEntry(file, path, section, 'Semantic', _first_quoted(text),
+                               message=text.strip())
+        return
+
+    if not lines:
+        return
+    head = lines[0].strip()
+    message = '\n'.join(lines)
+    if m := _RE_TOKEN.match(head):
+        token, line, col = m.group(1), int(m.group(2)), int(m.group(3))
+        yield LogEntry(file, path, section, 'UnexpectedToken' if token else 'Truncated',
+                       token, line, col, message=message)
+    elif m := _RE_CHARS.match(head):
+        context = next((l.split(':', 1)[1].strip() for l in lines[1:]
+                        if l.strip().startswith('Context')), None)
+        yield LogEntry(file, path, section, 'UnexpectedCharacters', context,
+                       int(m.group(1)), int(m.group(2)), message=message)
+    elif m := _RE_TRUNC_AT.match(head):
+        yield LogEntry(file, path, 'truncated', 'Truncated', '',
+                       int(m.group(1)), int(m.group(2)), message=message)
+    elif head.startswith('[文件截断]'):
+        yield LogEntry(file, path, 'truncated', 'Truncated', '', message=message)
+    else:
+        # parse_file 兜底分支："ExcName: message"
+        kind = head.split(':', 1)[0] if ':' in head else 'Error'
+        yield LogEntry(file, path, section, kind, _first_quoted(head), message=message)
+
+
+def parse_text_log(path: str | Path, name: str = None) -> LogRun:
+    """解析 validate_galaxy.py / validate_galaxy_V2.py 生成的文本日志"""
+    path = Path(path)
+    run = LogRun(name=name or path.stem, source=str(path), format='text')
+    section = 'syntax'
+    file = file_path = None
+    body: list[str] = []
+
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for raw in f:
+            line = raw.rstrip('\n')
+            if file is not None:
+                if line == _RULE_DASH:
+                    run.entries.extend(_parse_block(file, file_path, section, body))
+                    file = None
+                elif line.startswith('PATH: ') and file_path == '':
+                    file_path = line[6:]
+                else:
+                    body.append(line)
+                continue
+
+            if line.startswith('FILE: '):
+                file, file_path, body = line[6:], '', []
+            elif line in _SECTIONS:
+                section = _SECTIONS[line]
+            elif line.startswith('Galaxy Script '):
+                run.format = 'text+semantic' if '语义' in line else 'text'
+            elif ':' in line and line != _RULE_EQ:
+                key, _, value = line.partition(':')
+                key = key.strip()
+                if key in _HEADERS:
+                    setattr(run, _HEADERS[key], value.strip())
+                elif key == '总计' and (m := _RE_TOTAL.search(value)):
+                    run.total_files = int(m.group(1))
+
+    if file is not None:                      # 末尾缺分隔线的残块
+        run.entries.extend(_parse_block(file, file_path, section, body))
+    return run
+
+
+# ─── JSONL 解析 ──────────────────────────────────────────────────────────────
+
+def _display_name(path: str) -> str:
+    # 日志可能来自 Windows，路径分隔符两种都认
+    return PureWindowsPath(path).name if '\\' in path else Path(path).name
+
+
+def parse_jsonl(path: str | Path, name: str = None) -> LogRun:
+    """解析 galaxycc.report.JsonlWriter 的输出"""
+    path = Path(path)
+    run = LogRun(name=name or path.stem, source=str(path), format='jsonl')
+    analyzed = set()
+    with open(path, encoding='utf-8') as f:
+        for text in f:
+            if not text.strip():
+                continue
+            rec = json.loads(text)
+            origin = rec.get('file') or rec['path']
+            analyzed.add(rec['path'])
+            message = rec.get('message', '')
+            run.entries.append(LogEntry(
+                file=_display_name(origin), path=origin,
+                section=rec.get('category', ''),
+                kind=rec.get('code') or rec.get('severity', 'error'),
+                token=_first_quoted(message),
+                line=rec.get('line', -1), col=rec.get('column', -1),
+                context=rec['path'] if origin != rec['path'] else '',
+                message=message))
+    run.generated = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(path.stat().st_mtime))
+    return run
+
+
+def parse_log(path: str | Path, name: str = None) -> LogRun:
+    """按扩展名选择解析器"""
+    if Path(path).suffix.lower() in ('.jsonl', '.ndjson'):
+        return parse_jsonl(path, name)
+    return parse_text_log(path, name)
+
+
+# ─── 索引 ────────────────────────────────────────────────────────────────────
+
+@dataclass
+class RunDiff:
+    """两次运行的差异（条目按 (file, kind, token, line) 比较）"""
+    old:      str
+    new:      str
+    fixed:    list[str]           # 旧运行失败、新运行干净的文件
+    broken:   list[str]           # 新运行才失败的文件
+    changed:  list[str]           # 两次都失败但错误不同的文件
+    added:    list[tuple]         # 新增的条目 (file, kind, token, line)
+    removed:  list[tuple]         # 消失的条目
+
+    def summary(self) -> str:
+        return (f"{self.old} → {self.new}: 修复 {len(self.fixed)} 个文件，"
+                f"新失败 {len(self.broken)} 个，变化 {len(self.changed)} 个；"
+                f"条目 +{len(self.added)} / -{len(self.removed)}")
+
+
+class LogIndex:
+    """
+    验证日志的 SQLite 索引。
+
+    用法：
+        with LogIndex('validation_index.db') as idx:
+            idx.ingest('validation_errors_7.log')
+            idx.files_failing_on('funcref')
+            print(idx.diff('5', '7').summary())
+    """
+
+    def __init__(self, db: str | Path = DEFAULT_DB):
+        self.conn = sqlite3.connect(str(db))
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ── 写入 ──────────────────────────────────────────────────────────────
+
+    def ingest(self, path: str | Path, name: str = None) -> tuple[str, int]:
+        """导入一份日志，返回 (run 名, 条目数)；同名 run 先删除再导入"""
+        return self.add_run(parse_log(path, name))
+
+    def add_run(self, run: LogRun) -> tuple[str, int]:
+        with self.conn:
+            self.conn.execute('DELETE FROM runs WHERE name = ?', (run.name,))
+            cur = self.conn.execute(
+                'INSERT INTO runs (name, source, format, generated, grammar, scripts_dir,'
+                ' total_files, ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (run.name, run.source, run.format, run.generated, run.grammar,
+                 run.scripts_dir, run.total_files, time.strftime('%Y-%m-%d %H:%M:%S')))
+            run_id = cur.lastrowid
+            self.conn.executemany(
+                'INSERT INTO entries (run_id, %s) VALUES (?%s)'
+                % (', '.join(_ENTRY_COLUMNS), ', ?' * len(_ENTRY_COLUMNS)),
+                (e.row(run_id) for e in run.entries))
+        return run.name, len(run.entries)
+
+    def remove_run(self, ref: str):
+        with self.conn:
+            self.conn.execute('DELETE FROM runs WHERE id = ?', (self.run_id(ref),))
+
+    # ── 查询 ──────────────────────────────────────────────────────────────
+
+    def run_id(self, ref: str | int) -> int:
+        """run 引用 → id：数字 id、完整名字，或名字末尾的 _<编号>（'7' → validation_errors_7）"""
+        ref = str(ref)
+        row = self.conn.execute('SELECT id FROM runs WHERE name = ?', (ref,)).fetchone()
+        if row is None:
+            rows = self.conn.execute(
+                "SELECT id FROM runs WHERE name LIKE ? ESCAPE '\\'",
+                ('%\\_' + ref,)).fetchall()
+            if len(rows) > 1:
+                raise KeyError(f"run '{ref}' 不唯一，请写完整名字")
+            row = rows[0] if rows else None
+        if row is None and ref.isdigit():
+            row = self.conn.execute('SELECT id FROM runs WHERE id = ?', (int(ref),)).fetchone()
+        if row is None:
+            raise KeyError(f"没有 run '{ref}'")
+        return row[0]
+
+    def runs(self) -> list[tuple]:
+        """[(id, name, format, generated, total_files, 失败文件数, 条目数), ...]"""
+        return self.conn.execute(
+            'SELECT r.id, r.name, r.format, r.generated, r.total_files,'
+            '       COUNT(DISTINCT e.file), COUNT(e.run_id)'
+            ' FROM runs r LEFT JOIN entries e ON e.run_id = r.id'
+            ' GROUP BY r.id ORDER BY r.id').fetchall()
+
+    def _run_filter(self, run: str | int = None, column: str = 'run_id') -> tuple[str, tuple]:
+        if run is None:
+            return '', ()
+        return f' AND {column} = ?', (self.run_id(run),)
+
+    def files_failing_on(self, token: str, run: str | int = None,
+                         kind: str = None) -> list[tuple]:
+        """在指定 token 上出错的文件：[(run 名, file, line, col, kind), ...]"""
+        where, params = self._run_filter(run, 'e.run_id')
+        if kind:
+            where += ' AND e.kind = ?'
+            params += (kind,)
+        return self.conn.execute(
+            'SELECT r.name, e.file, e.line, e.col, e.kind FROM entries e'
+            ' JOIN runs r ON r.id = e.run_id'
+            ' WHERE e.token = ?' + where +
+            ' ORDER BY e.run_id, e.file, e.line', (token,) + params).fetchall()
+
+    def kinds(self, run: str | int = None) -> list[tuple]:
+        """按错误类型统计：[(kind, 条目数, 文件数), ...]"""
+        where, params = self._run_filter(run)
+        return self.conn.execute(
+            'SELECT kind, COUNT(*), COUNT(DISTINCT file) FROM entries WHERE 1' + where +
+            ' GROUP BY kind ORDER BY COUNT(*) DESC', params).fetchall()
+
+    def tokens(self, run: str | int = None, kind: str = None, n: int = 20) -> list[tuple]:
+        """出错最多的 token：[(token, 条目数, 文件数), ...]"""
+        where, params = self._run_filter(run)
+        if kind:
+            where += ' AND kind = ?'
+            params += (kind,)
+        return self.conn.execute(
+            'SELECT token, COUNT(*), COUNT(DISTINCT file) FROM entries'
+            ' WHERE token IS NOT NULL' + where +
+            ' GROUP BY token ORDER BY COUNT(*) DESC LIMIT ?', params + (n,)).fetchall()
+
+    def file_entries(self, file: str, run: str | int = None,
+                     line: int = None) -> list[tuple]:
+        """某个文件的条目：[(run 名, kind, token, line, col, context, message), ...]"""
+        where, params = self._run_filter(run, 'e.run_id')
+        if line is not None:
+            where += ' AND e.line = ?'
+            params += (line,)
+        return self.conn.execute(
+            'SELECT r.name, e.kind, e.token, e.line, e.col, e.context, e.message'
+            ' FROM entries e JOIN runs r ON r.id = e.run_id'
+            ' WHERE e.file = ?' + where +
+            ' ORDER BY e.run_id, e.line, e.col', (file,) + params).fetchall()
+
+    def diff(self, old: str | int, new: str | int) -> RunDiff:
+        """比较两次运行"""
+        a, b = self.run_id(old), self.run_id(new)
+        q = self.conn.execute
+
+        def files(x, y):
+            return [r[0] for r in q(
+                'SELECT DISTINCT file FROM entries WHERE run_id = ?'
+                ' EXCEPT SELECT DISTINCT file FROM entries WHERE run_id = ?'
+                ' ORDER BY 1', (x, y))]
+
+        def entries(x, y):
+            return q('SELECT file, kind, token, line FROM entries WHERE run_id = ?'
+                     ' EXCEPT SELECT file, kind, token, line FROM entries WHERE run_id = ?'
+                     ' ORDER BY 1, 4', (x, y)).fetchall()
+
+        added, removed = entries(b, a), entries(a, b)
+        fixed, broken = files(a, b), files(b, a)
+        gone = set(fixed) | set(broken)
+        changed = sorted({e[0] for e in added + removed} - gone)
+        names = dict(q('SELECT id, name FROM runs WHERE id IN (?, ?)', (a, b)).fetchall())
+        return RunDiff(names[a], names[b], fixed, broken, changed, added, removed)
+
+
+# ─── 命令行 ──────────────────────────────────────────────────────────────────
+
+def _fmt_token(token) -> str:
+    return '<EOF>' if token == '' else (token if token is not None else '-')
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='python -m galaxycc.logindex', description='验证日志索引与查询')
+    ap.add_argument('--db', default=DEFAULT_DB, help=f'索引数据库（默认 {DEFAULT_DB}）')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+
+    p = sub.add_parser('ingest', help='导入日志（.log 文本报告或 .jsonl）')
+    p.add_argument('logs', nargs='+')
+    p.add_argument('--name', help='run 名字（只导入一份日志时可用）')
+
+    sub.add_parser('runs', help='列出已导入的运行')
+
+    p = sub.add_parser('token', help='在指定 token 上出错的文件')
+    p.add_argument('token')
+    p.add_argument('--run')
+    p.add_argument('--kind')
+
+    p = sub.add_parser('kinds', help='按错误类型统计')
+    p.add_argument('run', nargs='?')
+
+    p = sub.add_parser('tokens', help='出错最多的 token')
+    p.add_argument('run', nargs='?')
+    p.add_argument('--kind')
+    p.add_argument('-n', type=int, default=20)
+
+    p = sub.add_parser('file', help='某个文件的错误')
+    p.add_argument('file')
+    p.add_argument('--run')
+    p.add_argument('--line', type=int)
+
+    p = sub.add_parser('diff', help='比较两次运行')
+    p.add_argument('old')
+    p.add_argument('new')
+    p.add_argument('--entries', action='store_true', help='同时列出新增 / 消失的条目')
+
+    p = sub.add_parser('drop', help='删除一次运行')
+    p.add_argument('run')
+
+    args = ap.parse_args(argv)
+    t0 = time.perf_counter()
+
+    with LogIndex(args.db) as idx:
+        try:
+            if args.cmd == 'ingest':
+                if args.name and len(args.logs) > 1:
+                    ap.error('--name 只能配合单个日志使用')
+                for log in args.logs:
+                    name, count = idx.ingest(log, args.name)
+                    print(f"{name:<24} {count:>7} 条  ← {log}")
+
+            elif args.cmd == 'runs':
+                print(f"{'id':>3}  {'名字':<24} {'格式':<14} {'生成时间':<20} {'总文件':>6} {'失败':>5} {'条目':>7}")
+                for rid, name, fmt, gen, total, files, count in idx.runs():
+                    print(f"{rid:>3}  {name:<24} {fmt:<14} {gen or '-':<20} "
+                          f"{total if total is not None else '-':>6} {files:>5} {count:>7}")
+
+            elif args.cmd == 'token':
+                rows = idx.files_failing_on(args.token, args.run, args.kind)
+                for run, file, line, col, kind in rows:
+                    print(f"{run:<24} {file}:{line}:{col}  {kind}")
+                print(f"共 {len(rows)} 条，{len({(r[0], r[1]) for r in rows})} 个文件")
+
+            elif args.cmd == 'kinds':
+                print(f"{'类型':<24} {'条数':>7} {'文件数':>6}")
+                for kind, count, files in idx.kinds(args.run):
+                    print(f"{kind:<24} {count:>7} {files:>6}")
+
+            elif args.cmd == 'tokens':
+                print(f"{'token':<32} {'条数':>7} {'文件数':>6}")
+                for token, count, files in idx.tokens(args.run, args.kind, args.n):
+                    print(f"{_fmt_token(token):<32} {count:>7} {files:>6}")
+
+            elif args.cmd == 'file':
+                for run, kind, token, line, col, ctx, message in \
+                        idx.file_entries(args.file, args.run, args.line):
+                    where = f" (in {ctx})" if ctx else ''
+                    first = message.splitlines()[0] if message else _fmt_token(token)
+                    print(f"{run:<24} {line}:{col}{where}  [{kind}] {first}")
+
+            elif args.cmd == 'diff':
+                d = idx.diff(args.old, args.new)
+                print(d.summary())
+                for title, files in (('修复', d.fixed), ('新失败', d.broken), ('变化', d.changed)):
+                    if files:
+                        print(f"\n{title}:")
+                        for file in files:
+                            print(f"  {file}")
+                if args.entries:
+                    for sign, rows in (('+', d.added), ('-', d.removed)):
+                        for file, kind, token, line in rows:
+                            print(f"{sign} {file}:{line}  [{kind}] {_fmt_token(token)}")
+
+            elif args.cmd == 'drop':
+                idx.remove_run(args.run)
+
+        except KeyError as e:
+            print(f"错误: {e.args[0]}", file=sys.stderr)
+            return 1
+
+    print(f"（{(time.perf_counter() - t0) * 1000:.1f} ms）", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,857 @@
+"""
+Language Server
+===============
+在 GalaxyFrontend 上实现 Language Server Protocol（stdio，Content-Length 分帧的 JSON-RPC），
+供编辑器集成：
+
+  textDocument/didOpen / didChange（增量同步）/ didSave / didClose
+  textDocument/publishDiagnostics     打开、修改后推送本文件的诊断
+  textDocument/hover                  光标处节点的类型（符号则显示声明）
+  textDocument/definition             经 Symbol.node / Symbol.file 跳到声明处
+  textDocument/completion             局部变量、全局作用域（含 include 进来的）和 native
+
+分析方式：
+  - 前端常驻，share_include_asts=True：库文件只解析一次；
+  - 当前文件按顶层声明分块解析（chunk_cache），改动一个函数只重新解析这个函数；
+  - include 进来的库只注册声明、不检查函数体（checked_includes），推送的诊断也只含当前文件；
+  - 打开的文件以编辑器缓冲区为准（放进前端的 corpus），其他打开的文件 include 它时
+    看到的是未保存的内容；保存后重新分析其他打开的文件；
+  - 连续的修改先全部应用，输入队列空了才分析一次（打字时不会每个按键都分析）；
+    hover / definition 需要位置准确，遇到未分析的修改先分析；completion 用最近一次
+    成功的分析结果，当前文本有语法错误时照样可用。
+
+位置：LSP 的 character 按 UTF-16 码元计，Lark 的列按字符计，这里做转换。
+
+命令行：
+    python -m galaxycc.lsp serve --grammar galaxy.lark --natives natives.galaxy --discover mods
+    python -m galaxycc.lsp probe maps/MyMap.galaxy --hover 120:14 --grammar galaxy.lark ...
+
+probe 起一个服务进程，用 LspClient 打开文件、发请求、打印结果和耗时。
+LspClient 也可以在代码里直接用（本地测试客户端）：
+
+    with LspClient.spawn(['--grammar', 'galaxy.lark']) as client:
+        client.initialize()
+        diags = client.open('a.galaxy')
+        client.hover('a.galaxy', 10, 4)
+"""
+
+from __future__ import annotations
+import argparse
+import inspect
+import json
+import os
+import queue
+import re
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Optional
+from urllib.parse import unquote, urlparse
+
+from .corpus import SourceFile
+from .daemon import (RpcError, PARSE_ERROR, INVALID_PARAMS, INVALID_REQUEST, METHOD_NOT_FOUND,
+                     INTERNAL_ERROR, build_frontend)
+from .error import ErrorSeverity
+from .pipeline import FrontendResult, GalaxyFrontend
+from .semantic.symbol import SymbolKind
+from .semantic.type import ErrorType, FunctionType, StructType, TypedefType
+from .tree.transformer import (FuncDecl, FuncDef, Identifier, MemberAccess, ParamDecl,
+                               StructDef, TypedefDecl, VarDecl, walk)
+
+SERVER_NOT_INITIALIZED = -32002
+
+# LSP 枚举
+_SEVERITY = {ErrorSeverity.ERROR: 1, ErrorSeverity.WARNING: 2}
+SYNC_INCREMENTAL = 2
+COMPLETION_FUNCTION, COMPLETION_VARIABLE, COMPLETION_CLASS, COMPLETION_STRUCT, \
+    COMPLETION_CONSTANT = 3, 6, 7, 22, 21
+
+MAX_COMPLETIONS = 500
+
+
+# ─── 分帧 ─────────────────────────────────────────────────────────────────────
+
+def read_frame(stream: BinaryIO) -> Optional[bytes]:
+    """读一帧 Content-Length 分帧的消息体，流结束返回 None；帧头坏了抛 ValueError"""
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.decode('ascii').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    if length is None:
+        raise ValueError("消息缺少 Content-Length")
+    return stream.read(length)
+
+
+def read_message(stream: BinaryIO) -> Optional[dict]:
+    """读一条消息并解码 JSON，流结束返回 None"""
+    body = read_frame(stream)
+    return None if body is None else json.loads(body)
+
+
+def write_message(stream: BinaryIO, message: dict):
+    body = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    stream.write(b'Content-Length: %d\r\n\r\n' % len(body) + body)
+    stream.flush()
+
+
+# ─── 位置换算 ─────────────────────────────────────────────────────────────────
+
+def uri_to_path(uri: str) -> str:
+    parsed = urlparse(uri)
+    if parsed.scheme != 'file':
+        return uri
+    return unquote(parsed.path)
+
+
+def path_to_uri(path: str | Path) -> str:
+    return Path(os.path.abspath(path)).as_uri()
+
+
+def _utf16_len(text: str) -> int:
+    if text.isascii():
+        return len(text)
+    return len(text.encode('utf-16-le')) // 2
+
+
+def lsp_position(src: SourceFile, offset: int) -> dict:
+    """text 中的字符偏移 → LSP Position（行从 0 起，character 按 UTF-16 计）"""
+    offset = max(0, min(offset, len(src.text)))
+    line, col = src.line_col(offset)
+    start = src.line_offsets[line - 1]
+    return {'line': line - 1, 'character': _utf16_len(src.text[start:offset])}
+
+
+def text_offset(src: SourceFile, position: dict) -> int:
+    """LSP Position → text 中的字符偏移（超出范围的截到行尾 / 文末）"""
+    line = position['line']
+    if line >= src.line_count:
+        return len(src.text)
+    start = src.line_offsets[line]
+    line_text = src.line_text(line + 1)
+    units = position['character']
+    if line_text.isascii():
+        return start + min(units, len(line_text))
+    for i, ch in enumerate(line_text):
+        if units <= 0:
+            return start + i
+        units -= 2 if ord(ch) > 0xFFFF else 1
+    return start + len(line_text)
+
+
+def _node_offset(src: SourceFile, node) -> int:
+    """节点起点的字符偏移（没有 offset 时由行列推出）"""
+    if node.offset >= 0:
+        return node.offset
+    if node.line > 0 and node.line <= src.line_count:
+        return src.line_offsets[node.line - 1] + max(node.col - 1, 0)
+    return 0
+
+
+def _name_offset(src: SourceFile, node, name: str) -> int:
+    """声明节点的起点在类型上，名字在后面：从节点起点往后找第一个完整匹配的名字"""
+    start = _node_offset(src, node)
+    m = re.compile(r'\b' + re.escape(name) + r'\b').search(src.text, start)
+    return m.start() if m else start
+
+
+def _range(src: SourceFile, start: int, end: int) -> dict:
+    return {'start': lsp_position(src, start), 'end': lsp_position(src, end)}
+
+
+def _word_at(text: str, offset: int) -> tuple[int, int]:
+    """offset 处（或紧挨在它前面）的标识符的 [start, end)，不在标识符上时 start == end"""
+    start = offset
+    while start > 0 and (text[start - 1].isalnum() or text[start - 1] == '_'):
+        start -= 1
+    end = offset
+    while end < len(text) and (text[end].isalnum() or text[end] == '_'):
+        end += 1
+    return start, end
+
+
+# ─── 文档 ─────────────────────────────────────────────────────────────────────
+
+class Document:
+    """一个打开的文件：编辑器里的当前文本，以及最近的分析结果"""
+
+    def __init__(self, uri: str, text: str, version: int):
+        self.uri = uri
+        self.path = uri_to_path(uri)
+        self.version = version
+        self.src = SourceFile.from_text(self.path, text)
+        self.dirty = True
+        # 最近一次分析（版本、当时的文本、结果）；位置查询只在版本一致时可用
+        self.analyzed_version: Optional[int] = None
+        self.analyzed_src: Optional[SourceFile] = None
+        self.result: Optional[FrontendResult] = None
+        self.good_result: Optional[FrontendResult] = None    # 最近一次进入了语义分析的结果
+        self.good_src: Optional[SourceFile] = None
+        self._index: Optional[dict] = None
+        self.chunks: dict = {}          # 顶层声明块的 AST 缓存（process_string 的 chunk_cache）
+
+    def apply_change(self, change: dict):
+        """应用一条 contentChanges（有 range 是增量修改，没有是整篇替换）"""
+        text = self.src.text
+        if 'range' in change:
+            start = text_offset(self.src, change['range']['start'])
+            end = text_offset(self.src, change['range']['end'])
+            text = text[:start] + change['text'] + text[end:]
+        else:
+            text = change['text']
+        self.src = SourceFile.from_text(self.path, text)
+        self.dirty = True
+
+    def set_result(self, result: FrontendResult):
+        self.result = result
+        self.analyzed_version = self.version
+        self.analyzed_src = self.src
+        self._index = None
+        if result.symbol_table is not None:
+            self.good_result, self.good_src = result, self.src
+        self.dirty = False
+
+    @property
+    def current(self) -> bool:
+        return not self.dirty and self.result is not None and self.result.ast is not None
+
+    def index(self) -> dict:
+        """
+        名字起点偏移 → AST 节点：标识符引用、声明的名字、成员访问的成员名。
+        hover / definition 按光标所在单词的起点查这张表
+        """
+        if self._index is None:
+            src = self.analyzed_src
+            index = {}
+            for node in walk(self.result.ast):
+                if isinstance(node, Identifier):
+                    index.setdefault(_node_offset(src, node), node)
+                elif isinstance(node, (FuncDef, FuncDecl, VarDecl, ParamDecl, StructDef)) and node.name:
+                    index.setdefault(_name_offset(src, node, node.name), node)
+                elif isinstance(node, TypedefDecl) and node.alias:
+                    index.setdefault(_name_offset(src, node, node.alias), node)
+                elif isinstance(node, MemberAccess):
+                    m = re.compile(r'\.\s*(' + re.escape(node.member) + r')\b').search(
+                        src.text, _node_offset(src, node))
+                    if m:
+                        index.setdefault(m.start(1), node)
+            self._index = index
+        return self._index
+
+
+class _AllIncludes:
+    """checked_includes：所有 include 进来的文件都只注册声明，不检查函数体"""
+
+    def __contains__(self, include_path) -> bool:
+        return True
+
+
+_ALL_INCLUDES = _AllIncludes()
+
+
+# ─── 符号描述 ─────────────────────────────────────────────────────────────────
+
+def _type_name(spec) -> str:
+    return spec.base_name + '[]' * len(spec.dimensions) if spec is not None else '?'
+
+
+def describe_symbol(sym) -> str:
+    """符号的声明形式，如 `native int Add(int a, int b)`、`const int N = 3`"""
+    gtype = sym.gtype
+    if sym.kind == SymbolKind.FUNC and isinstance(gtype, FunctionType):
+        names = [p.name for p in getattr(sym.node, 'params', ())]
+        params = [f"{t} {names[i]}" if i < len(names) and names[i] else str(t)
+                  for i, t in enumerate(gtype.param_types)]
+        prefix = 'native ' if sym.is_native else ''
+        return f"{prefix}{gtype.return_type} {sym.name}({', '.join(params)})"
+    if sym.kind == SymbolKind.TYPE:
+        if isinstance(gtype, StructType):
+            members = ' '.join(f"{t} {n};" for n, t in (gtype.members or {}).items())
+            return f"struct {sym.name} {{ {members} }}"
+        if isinstance(gtype, TypedefType):
+            return f"typedef {gtype.underlying} {sym.name}"
+        return str(gtype)
+    flags = ('static ' if sym.is_static else '') + ('const ' if sym.is_const else '')
+    text = f"{flags}{gtype} {sym.name}"
+    if sym.kind == SymbolKind.PARAM:
+        text = f"(参数) {text}"
+    if sym.const_value is not None:
+        text += f" = {sym.const_value!r}"
+    return text
+
+
+def _describe_node(node, table) -> Optional[str]:
+    """hover 显示的内容：符号取声明形式，其余节点取类型"""
+    sym = node.symbol
+    if sym is None and isinstance(node, (VarDecl, StructDef, TypedefDecl)) and table is not None:
+        name = node.alias if isinstance(node, TypedefDecl) else node.name
+        candidate = table.lookup_global(name)
+        if candidate is not None and candidate.node is node:
+            sym = candidate
+    if sym is not None:
+        return describe_symbol(sym)
+    if isinstance(node, VarDecl):
+        return f"{'const ' if node.is_const else ''}{node.gtype} {node.name}"
+    if isinstance(node, ParamDecl):
+        return f"(参数) {_type_name(node.type_spec)} {node.name}"
+    if isinstance(node, MemberAccess):
+        return f"{node.gtype} {node.obj.gtype}.{node.member}"
+    if node.gtype is not None and not isinstance(node.gtype, ErrorType):
+        return str(node.gtype)
+    return None                             # 未声明的名字等：没有可显示的类型
+
+
+def _completion_kind(sym) -> int:
+    if sym.kind == SymbolKind.FUNC:
+        return COMPLETION_FUNCTION
+    if sym.kind == SymbolKind.TYPE:
+        return COMPLETION_STRUCT if isinstance(sym.gtype, StructType) else COMPLETION_CLASS
+    return COMPLETION_CONSTANT if sym.is_const else COMPLETION_VARIABLE
+
+
+# ─── 服务端 ───────────────────────────────────────────────────────────────────
+
+class GalaxyLanguageServer:
+    """
+    stdio 上的 Language Server。消息由读线程放进队列，主线程逐条处理；
+    队列空了才分析有未分析修改的文档并推送诊断。
+    """
+
+    def __init__(self, frontend: GalaxyFrontend, reader: BinaryIO, writer: BinaryIO):
+        self.frontend = frontend
+        self.reader, self.writer = reader, writer
+        self.documents: dict[str, Document] = {}
+        self.initialized = False
+        self.shutdown_requested = False
+        self._exit = False
+        self._queue: queue.Queue = queue.Queue()
+        self.log = None                 # 可设为文本流，记录每次分析的耗时
+
+    # ── 主循环 ─────────────────────────────────────────────────────────
+
+    def serve(self) -> int:
+        """处理消息直到 exit 或输入结束；返回进程退出码"""
+        threading.Thread(target=self._read_loop, daemon=True).start()
+        while not self._exit:
+            message = self._queue.get()
+            if message is None:
+                break
+            if isinstance(message, ValueError):
+                write_message(self.writer, {'jsonrpc': '2.0', 'id': None, 'error': {
+                    'code': PARSE_ERROR, 'message': f"JSON 解析失败: {message}"}})
+                continue
+            self._dispatch(message)
+            if self._queue.empty():
+                self._flush()
+        return 0 if self.shutdown_requested else 1
+
+    def _read_loop(self):
+        """
+        读线程。只有帧头坏了（分帧已经乱了）或输入结束才结束会话；
+        单条消息体不是合法 JSON 时把异常交给主线程回 -32700，接着读下一条
+        """
+        try:
+            while True:
+                body = read_frame(self.reader)
+                if body is None:
+                    break
+                try:
+                    self._queue.put(json.loads(body))
+                except ValueError as e:
+                    self._queue.put(e)
+        except (OSError, ValueError):
+            pass
+        self._queue.put(None)
+
+    def _dispatch(self, message: dict):
+        if not isinstance(message, dict):
+            write_message(self.writer, {'jsonrpc': '2.0', 'id': None, 'error': {
+                'code': INVALID_REQUEST, 'message': "消息必须是 JSON 对象（不支持批量请求）"}})
+            return
+        method = message.get('method')
+        req_id = message.get('id')
+        if method is None:
+            return                          # 客户端对我们请求的响应，这里不发请求
+        if not isinstance(method, str):
+            if req_id is not None:
+                write_message(self.writer, {'jsonrpc': '2.0', 'id': req_id, 'error': {
+                    'code': INVALID_REQUEST, 'message': "method 必须是字符串"}})
+            return
+        handler = getattr(self, '_on_' + method.replace('/', '_').replace('$', 'dollar'), None)
+        if req_id is None:                  # 通知：不回复，出错也只能忽略
+            if handler is not None and (self.initialized or method == 'exit'):
+                try:
+                    handler(**(message.get('params') or {}))
+                except Exception as e:
+                    self._log(f"{method} 失败: {type(e).__name__}: {e}")
+            return
+        try:
+            if handler is None:
+                raise RpcError(METHOD_NOT_FOUND, f"未知方法: {method}")
+            if not self.initialized and method != 'initialize':
+                raise RpcError(SERVER_NOT_INITIALIZED, "尚未 initialize")
+            if self.shutdown_requested:
+                raise RpcError(INVALID_REQUEST, "已经 shutdown")
+            params = message.get('params') or {}
+            if not isinstance(params, dict):
+                raise RpcError(INVALID_PARAMS, "params 必须是对象")
+            try:
+                inspect.signature(handler).bind(**params)
+            except TypeError as e:
+                # 同 daemon：只有参数对不上签名才回 -32602，处理函数内部的 TypeError 算内部错误
+                raise RpcError(INVALID_PARAMS, f"参数不匹配: {e}")
+            result = handler(**params)
+        except RpcError as e:
+            response = {'error': {'code': e.code, 'message': str(e)}}
+        except Exception as e:
+            response = {'error': {'code': INTERNAL_ERROR, 'message': f"{type(e).__name__}: {e}"}}
+        else:
+            response = {'result': result}
+        write_message(self.writer, {'jsonrpc': '2.0', 'id': req_id, **response})
+
+    def _notify(self, method: str, params: dict):
+        write_message(self.writer, {'jsonrpc': '2.0', 'method': method, 'params': params})
+
+    def _log(self, text: str):
+        if self.log is not None:
+            print(text, file=self.log, flush=True)
+
+    # ── 分析 ───────────────────────────────────────────────────────────
+
+    def _flush(self):
+        for doc in list(self.documents.values()):
+            if doc.dirty:
+                self._analyze(doc)
+
+    def _analyze(self, doc: Document):
+        t0 = time.perf_counter()
+        self.frontend.refresh()
+        result = self.frontend.process_string(doc.src.text, source_name=doc.path,
+                                              chunk_cache=doc.chunks,
+                                              checked_includes=_ALL_INCLUDES)
+        doc.set_result(result)
+        self._log(f"分析 {doc.path} v{doc.version}: {(time.perf_counter() - t0) * 1000:.1f} ms")
+        self._publish(doc)
+
+    def _publish(self, doc: Document):
+        src = doc.analyzed_src
+        diagnostics = []
+        for d in doc.result.diags.iter_sorted():
+            if d.file and d.file != doc.path:
+                continue                    # include 进来的文件的诊断不在这里报
+            if d.offset >= 0:
+                start = d.offset
+            elif 0 < d.line <= src.line_count:
+                start = src.line_offsets[d.line - 1] + max(d.column - 1, 0)
+            else:
+                start = 0
+            _, end = _word_at(src.text, start)
+            if end <= start:
+                end = min(start + 1, len(src.text))
+            message = d.message
+            if d.hint and len(d.hint) <= 200:
+                message += '\n' + d.hint
+            diagnostics.append({
+                'range':    _range(src, start, end),
+                'severity': _SEVERITY[d.severity],
+                'code':     d.code,
+                'source':   'galaxycc',
+                'message':  message,
+            })
+        self._notify('textDocument/publishDiagnostics',
+                     {'uri': doc.uri, 'version': doc.analyzed_version, 'diagnostics': diagnostics})
+
+    def _document(self, uri: str) -> Document:
+        doc = self.documents.get(uri)
+        if doc is None:
+            raise RpcError(INVALID_PARAMS, f"文档未打开: {uri}")
+        return doc
+
+    def _fresh(self, uri: str) -> Document:
+        """位置查询前：有未分析的修改先分析"""
+        doc = self._document(uri)
+        if doc.dirty:
+            self._analyze(doc)
+        return doc
+
+    def _share(self, doc: Document):
+        """打开的文件以缓冲区为准：换掉 corpus 里的内容（旧 AST 一并丢弃）"""
+        self.frontend.forget_file(doc.path)
+        self.frontend.corpus.put(doc.src)
+
+    # ── 生命周期 ───────────────────────────────────────────────────────
+
+    def _on_initialize(self, processId=None, rootUri=None, initializationOptions=None, **_):
+        options = initializationOptions or {}
+        dirs = list(options.get('searchDirs') or ())
+        if options.get('discover'):
+            from .includes import IncludeIndex
+            base = options['discover'] if isinstance(options['discover'], str) else \
+                uri_to_path(rootUri) if rootUri else None
+            if base:
+                dirs += IncludeIndex.discover(base).search_dirs
+        if dirs:
+            from .includes import IncludeIndex
+            self.frontend.include_index = IncludeIndex(list(self.frontend.include_index.search_dirs) + dirs)
+        self.initialized = True
+        return {
+            'capabilities': {
+                'textDocumentSync': {'openClose': True, 'change': SYNC_INCREMENTAL,
+                                     'save': {'includeText': False}},
+                'hoverProvider': True,
+                'definitionProvider': True,
+                'completionProvider': {'resolveProvider': False},
+            },
+            'serverInfo': {'name': 'galaxycc'},
+        }
+
+    def _on_initialized(self, **_):
+        pass
+
+    def _on_shutdown(self, **_):
+        self.shutdown_requested = True
+        return None
+
+    def _on_exit(self, **_):
+        self._exit = True
+
+    def _on_dollar_cancelRequest(self, **_):
+        pass                                # 请求按顺序同步处理，来不及取消
+
+    # ── 文档同步 ───────────────────────────────────────────────────────
+
+    def _on_textDocument_didOpen(self, textDocument: dict, **_):
+        doc = Document(textDocument['uri'], textDocument['text'], textDocument.get('version', 0))
+        self.documents[doc.uri] = doc
+        self._share(doc)
+
+    def _on_textDocument_didChange(self, textDocument: dict, contentChanges: list, **_):
+        doc = self._document(textDocument['uri'])
+        for change in contentChanges:
+            doc.apply_change(change)
+        doc.version = textDocument.get('version', doc.version + 1)
+        self._share(doc)
+
+    def _on_textDocument_didSave(self, textDocument: dict, **_):
+        # 其他打开的文件可能 include 了它
+        for other in self.documents.values():
+            if other.uri != textDocument['uri']:
+                other.dirty = True
+
+    def _on_textDocument_didClose(self, textDocument: dict, **_):
+        doc = self.documents.pop(textDocument['uri'], None)
+        if doc is not None:
+            self.frontend.forget_file(doc.path)     # 之后按磁盘上的内容读
+            self._notify('textDocument/publishDiagnostics', {'uri': doc.uri, 'diagnostics': []})
+
+    # ── 查询 ───────────────────────────────────────────────────────────
+
+    def _node_at(self, doc: Document, position: dict):
+        if not doc.current:
+            return None, None
+        src = doc.analyzed_src
+        start, end = _word_at(src.text, text_offset(src, position))
+        if start == end:
+            return None, None
+        return doc.index().get(start), (start, end)
+
+    def _on_textDocument_hover(self, textDocument: dict, position: dict, **_):
+        doc = self._fresh(textDocument['uri'])
+        node, span = self._node_at(doc, position)
+        if node is None:
+            return None
+        text = _describe_node(node, doc.result.symbol_table)
+        if text is None:
+            return None
+        value = f"```galaxy\n{text}\n```"
+        sym = node.symbol
+        if sym is not None and sym.file and sym.file != doc.path:
+            value += f"\n\n{sym.file}"
+        return {'contents': {'kind': 'markdown', 'value': value},
+                'range': _range(doc.analyzed_src, *span)}
+
+    def _on_textDocument_definition(self, textDocument: dict, position: dict, **_):
+        doc = self._fresh(textDocument['uri'])
+        node, _ = self._node_at(doc, position)
+        if node is None:
+            return None
+        sym = node.symbol
+        if sym is None and isinstance(node, Identifier) and doc.result.symbol_table is not None:
+            sym = doc.result.symbol_table.lookup_global(node.name)
+        if sym is None:
+            if isinstance(node, (Identifier, MemberAccess)):
+                return None                 # 查不到的名字没有声明处
+            target_node, name, path = node, getattr(node, 'name', ''), doc.path
+        elif sym.is_native or sym.node is None:
+            return None                     # native 没有源码位置
+        else:
+            target_node, name = sym.node, sym.name
+            path = doc.path if not sym.file or sym.file == doc.path \
+                else self.frontend.include_index.resolve(sym.file)
+        if path is None:
+            return None
+        if path == doc.path:
+            src, uri = doc.analyzed_src, doc.uri
+        else:
+            try:
+                src = self.frontend.corpus.load(path)
+            except OSError:
+                return None
+            uri = path_to_uri(path)
+        start = _name_offset(src, target_node, name) if name else _node_offset(src, target_node)
+        return {'uri': uri, 'range': _range(src, start, start + len(name))}
+
+    def _on_textDocument_completion(self, textDocument: dict, position: dict, **_):
+        doc = self._document(textDocument['uri'])
+        offset = text_offset(doc.src, position)
+        start, _ = _word_at(doc.src.text, offset)
+        prefix = doc.src.text[start:offset].lower()
+        items: dict[str, dict] = {}
+
+        def add(label, kind, detail):
+            if label not in items and label.lower().startswith(prefix):
+                items[label] = {'label': label, 'kind': kind, 'detail': detail}
+
+        result = doc.good_result
+        if result is not None:
+            for node in self._locals_at(doc, offset):
+                add(node.name, COMPLETION_VARIABLE, _describe_node(node, None))
+            for sym in result.symbol_table.globals():
+                add(sym.name, _completion_kind(sym), describe_symbol(sym))
+        for name, ftype in self.frontend.native_scope.functions.items():
+            if name.lower().startswith(prefix) and name not in items:
+                params = ', '.join(map(str, ftype.param_types))
+                add(name, COMPLETION_FUNCTION, f"native {ftype.return_type} {name}({params})")
+        labels = sorted(items, key=str.lower)
+        return {'isIncomplete': len(labels) > MAX_COMPLETIONS,
+                'items': [items[label] for label in labels[:MAX_COMPLETIONS]]}
+
+    @staticmethod
+    def _locals_at(doc: Document, offset: int) -> list:
+        """光标所在函数（按最近一次成功分析的 AST 定位）的参数和之前声明的局部变量"""
+        src = doc.good_src
+        func = None
+        for decl in doc.good_result.ast.decls:
+            if _node_offset(src, decl) > offset:
+                break
+            func = decl
+        if not isinstance(func, FuncDef):
+            return []
+        found = list(func.params)
+        found += [n for n in walk(func.body)
+                  if isinstance(n, VarDecl) and _node_offset(src, n) < offset]
+        return [n for n in found if n.name]
+
+
+# ─── 测试客户端 ───────────────────────────────────────────────────────────────
+
+class LspClient:
+    """
+    本地 LSP 客户端（测试 / probe 用）：同步发请求，期间收到的通知存进 notifications。
+
+        with LspClient.spawn(['--grammar', 'galaxy.lark']) as client:
+            client.initialize()
+            diags = client.open('a.galaxy')
+    """
+
+    def __init__(self, reader: BinaryIO, writer: BinaryIO, process: subprocess.Popen = None):
+        self.reader, self.writer = reader, writer
+        self.process = process
+        self.notifications: list[dict] = []
+        self._next_id = 0
+        self._versions: dict[str, int] = {}
+
+    @classmethod
+    def spawn(cls, server_args: list[str]) -> 'LspClient':
+        """起一个 python -m galaxycc.lsp serve 子进程并连上它的 stdio"""
+        process = subprocess.Popen([sys.executable, '-m', 'galaxycc.lsp', 'serve', *server_args],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        return cls(process.stdout, process.stdin, process)
+
+    def request(self, method: str, params: dict = None):
+        self._next_id += 1
+        req_id = self._next_id
+        write_message(self.writer, {'jsonrpc': '2.0', 'id': req_id, 'method': method,
+                                    'params': params or {}})
+        while True:
+            message = read_message(self.reader)
+            if message is None:
+                raise ConnectionError("服务端关闭了连接")
+            if message.get('id') == req_id and 'method' not in message:
+                if 'error' in message:
+                    raise RpcError(message['error']['code'], message['error']['message'])
+                return message.get('result')
+            self.notifications.append(message)
+
+    def notify(self, method: str, params: dict = None):
+        write_message(self.writer, {'jsonrpc': '2.0', 'method': method, 'params': params or {}})
+
+    def wait_diagnostics(self, uri: str) -> list[dict]:
+        """等到 uri 的下一条 publishDiagnostics（已收到的先用），返回诊断列表"""
+        for i, message in enumerate(self.notifications):
+            if message.get('method') == 'textDocument/publishDiagnostics' \
+                    and message['params']['uri'] == uri:
+                del self.notifications[i]
+                return message['params']['diagnostics']
+        while True:
+            message = read_message(self.reader)
+            if message is None:
+                raise ConnectionError("服务端关闭了连接")
+            if message.get('method') == 'textDocument/publishDiagnostics' \
+                    and message['params']['uri'] == uri:
+                return message['params']['diagnostics']
+            self.notifications.append(message)
+
+    # ── 便捷方法（path 是本地文件路径）──────────────────────────────────
+
+    def initialize(self, **options) -> dict:
+        result = self.request('initialize', {'processId': os.getpid(), 'rootUri': None,
+                                             'capabilities': {},
+                                             'initializationOptions': options})
+        self.notify('initialized')
+        return result
+
+    def open(self, path: str | Path, text: str = None) -> list[dict]:
+        """打开文件（text 不给时读磁盘），返回推送来的诊断"""
+        uri = path_to_uri(path)
+        if text is None:
+            text = Path(path).read_text(encoding='utf-8', errors='replace')
+        self._versions[uri] = 1
+        self.notify('textDocument/didOpen', {'textDocument': {
+            'uri': uri, 'languageId': 'galaxy', 'version': 1, 'text': text}})
+        return self.wait_diagnostics(uri)
+
+    def change(self, path: str | Path, changes: list[dict]) -> list[dict]:
+        """发一组 contentChanges，返回推送来的诊断"""
+        uri = path_to_uri(path)
+        self._versions[uri] += 1
+        self.notify('textDocument/didChange', {
+            'textDocument': {'uri': uri, 'version': self._versions[uri]},
+            'contentChanges': changes})
+        return self.wait_diagnostics(uri)
+
+    def _at(self, method: str, path, line: int, character: int):
+        return self.request(method, {'textDocument': {'uri': path_to_uri(path)},
+                                     'position': {'line': line, 'character': character}})
+
+    def hover(self, path, line: int, character: int):
+        return self._at('textDocument/hover', path, line, character)
+
+    def definition(self, path, line: int, character: int):
+        return self._at('textDocument/definition', path, line, character)
+
+    def completion(self, path, line: int, character: int):
+        return self._at('textDocument/completion', path, line, character)
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            try:
+                self.request('shutdown')
+                self.notify('exit')
+            except (ConnectionError, OSError):
+                pass
+            self.writer.close()
+            self.process.wait(timeout=10)
+        self.writer.close()
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ─── 命令行 ───────────────────────────────────────────────────────────────────
+
+def _add_server_options(ap: argparse.ArgumentParser):
+    ap.add_argument('--grammar', required=True)
+    ap.add_argument('--natives', help='natives.galaxy（不给时用内置的常用 native）')
+    ap.add_argument('--natives-db', help='native 签名数据库（见 nativedb.py）')
+    ap.add_argument('-I', dest='search_dirs', action='append', default=[])
+    ap.add_argument('--discover', metavar='BASE', help='把 BASE 下所有 base.sc2data 加入搜索目录')
+    ap.add_argument('--preload', action='append', default=[],
+                    help='启动时预先解析的库文件（如 natives.galaxy），可多次给出')
+
+
+def _server_argv(args) -> list[str]:
+    argv = ['--grammar', os.path.abspath(args.grammar)]
+    if args.natives:
+        argv += ['--natives', os.path.abspath(args.natives)]
+    if args.natives_db:
+        argv += ['--natives-db', os.path.abspath(args.natives_db)]
+    for d in args.search_dirs:
+        argv += ['-I', os.path.abspath(d)]
+    if args.discover:
+        argv += ['--discover', os.path.abspath(args.discover)]
+    for p in args.preload:
+        argv += ['--preload', os.path.abspath(p)]
+    return argv
+
+
+def _line_col(text: str) -> tuple[int, int]:
+    """命令行里的 行:列（都从 1 开始）→ LSP 的 (line, character)"""
+    line, _, col = text.partition(':')
+    return int(line) - 1, int(col or 1) - 1
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='python -m galaxycc.lsp', description='Galaxy Script 语言服务')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+
+    serve = sub.add_parser('serve', help='在 stdio 上提供服务（编辑器启动的就是这个）')
+    _add_server_options(serve)
+    serve.add_argument('--log', help='把每次分析的耗时写到这个文件')
+
+    probe = sub.add_parser('probe', help='起一个服务进程，打开文件并发几个请求，打印结果和耗时')
+    probe.add_argument('file')
+    _add_server_options(probe)
+    probe.add_argument('--hover', action='append', default=[], metavar='L:C')
+    probe.add_argument('--definition', action='append', default=[], metavar='L:C')
+    probe.add_argument('--complete', action='append', default=[], metavar='L:C')
+    probe.add_argument('--repeat', type=int, default=1, help='每个请求重复次数（看热缓存耗时）')
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == 'serve':
+        server = GalaxyLanguageServer(build_frontend(args), sys.stdin.buffer, sys.stdout.buffer)
+        if args.log:
+            server.log = open(args.log, 'a', encoding='utf-8')
+        code = server.serve()
+        sys.stdout.flush()
+        os._exit(code)          # 读线程可能还阻塞在 stdin 上，不等它
+
+    with LspClient.spawn(_server_argv(args)) as client:
+        client.initialize()
+        t0 = time.perf_counter()
+        diags = client.open(args.file)
+        print(f"didOpen → {len(diags)} 条诊断（{(time.perf_counter() - t0) * 1000:.1f} ms）")
+        for d in diags:
+            start = d['range']['start']
+            print(f"  {start['line'] + 1}:{start['character'] + 1} [{d['code']}] {d['message']}")
+        for method, positions in (('hover', args.hover), ('definition', args.definition),
+                                  ('completion', args.complete)):
+            for pos in positions:
+                line, character = _line_col(pos)
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    result = getattr(client, method)(args.file, line, character)
+                    elapsed = (time.perf_counter() - t0) * 1000
+                if method == 'completion':
+                    labels = [item['label'] for item in result['items']]
+                    result = f"{len(labels)} 项: {', '.join(labels[:20])}"
+                else:
+                    result = json.dumps(result, ensure_ascii=False)
+                print(f"{method} {pos} ({elapsed:.1f} ms): {result}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+# galaxycc/opt/__init__.py
+from .fold import ConstantFolder, FoldStats, fold_constants
@@ -0,0 +1,262 @@
+"""
+常量折叠 & 死分支消除
+======================
+语义分析之后的可选 AST 优化 pass（原地修改 AST）：
+
+  1. 常量表达式折叠成字面量：1 + 2 → 3，c_MaxPlayers * 2 → 32，"a" + "b" → "ab"
+     （求值规则见 semantic/consteval.py；有副作用的子表达式不会被折叠掉）
+  2. if (常量)：只保留会执行的分支；没有 else 的 if (假) 整条删掉
+  3. while (假)：整条删掉
+
+do-while / for 的条件即使为假，循环体或初始化也会执行一次，只折叠不删除。
+
+编辑器生成的触发器代码里大量 if (true)、if (0 == 1)，折叠后树明显变小；
+同时可以把被改动函数的调用边在调用图里刷新一遍。
+
+用法：
+    stats = fold_constants(result.ast, analyzer.consts, analyzer.call_graph)
+    print(stats)
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Optional
+
+from ..semantic.consteval import ConstEvaluator
+from ..semantic.callgraph import CallGraph
+from ..semantic.symbol import SymbolKind
+from ..tree.transformer import (
+    ASTNode, TranslationUnit, TypeSpecNode,
+    VarDecl, FuncDef,
+    CompoundStmt, ExprStmt, IfStmt, WhileStmt, DoWhileStmt, ForStmt, ReturnStmt,
+    Identifier, IntLiteral, FixedLiteral, BoolLiteral, StringLiteral, NullLiteral,
+    AssignOp, FuncCall,
+    walk,
+)
+
+_LITERALS = (IntLiteral, FixedLiteral, BoolLiteral, StringLiteral, NullLiteral)
+
+
+@dataclass
+class FoldStats:
+    """一次折叠的统计"""
+    folded_exprs:    int = 0    # 折叠成字面量的表达式
+    pruned_branches: int = 0    # 删掉的 if / while 分支
+    removed_nodes:   int = 0    # 从树上摘掉的节点总数
+    changed_funcs:   set = field(default_factory=set)   # 函数体有改动的函数
+
+    def __str__(self):
+        return (f"折叠表达式 {self.folded_exprs} 处，删除分支 {self.pruned_branches} 个，"
+                f"共移除 {self.removed_nodes} 个节点（涉及 {len(self.changed_funcs)} 个函数）")
+
+
+def _size(node) -> int:
+    return sum(1 for _ in walk(node)) if node is not None else 0
+
+
+def _truthy(value) -> Optional[bool]:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    return None
+
+
+def _fixed_raw(value: float) -> str:
+    # 常量求值给出的 fixed 值都是 1/4096 的整数倍，12 位小数正好精确，写回后语义不变
+    raw = f"{value:.12f}".rstrip('0')
+    return raw + '0' if raw.endswith('.') else raw
+
+
+def make_literal(value, like: ASTNode) -> Optional[ASTNode]:
+    """按常量值造一个字面量节点，位置 / 类型 / const_value 沿用原节点"""
+    if isinstance(value, bool):
+        node = BoolLiteral(value=value)
+    elif isinstance(value, int):
+        node = IntLiteral(raw=str(value))
+    elif isinstance(value, float):
+        node = FixedLiteral(raw=_fixed_raw(value))
+    elif isinstance(value, str):
+        node = StringLiteral(raw=f'"{value}"')
+    else:
+        return None
+    node.line, node.col = like.line, like.col
+    node.gtype = like.gtype
+    node.const_value = value
+    return node
+
+
+class ConstantFolder:
+    """
+    常量折叠 pass。
+
+    需要语义分析之后的 AST（Identifier.symbol / gtype 已填写）和分析器的 ConstEvaluator。
+    给了 call_graph 时，折叠完成后按新的函数体刷新改动函数的出边。
+    """
+
+    def __init__(self, evaluator: ConstEvaluator, call_graph: CallGraph = None):
+        self._ev = evaluator
+        self._graph = call_graph
+        self.stats = FoldStats()
+
+    # ══════════════════════════════════════════════════════════════════════
+    # 入口
+    # ══════════════════════════════════════════════════════════════════════
+
+    def fold(self, root: TranslationUnit) -> FoldStats:
+        changed_bodies = []
+        for decl in root.decls:
+            if isinstance(decl, VarDecl):
+                if decl.init is not None:
+                    decl.init = self._expr(decl.init)
+            elif isinstance(decl, FuncDef) and decl.body is not None:
+                before = self.stats.removed_nodes
+                decl.body = self._stmt(decl.body, in_block=False)
+                if self.stats.removed_nodes != before:
+                    self.stats.changed_funcs.add(decl.name)
+                    changed_bodies.append(decl)
+
+        if self._graph is not None and changed_bodies:
+            self._graph.replace_calls(
+                {decl.name: list(self._calls_in(decl.body)) for decl in changed_bodies})
+        return self.stats
+
+    @staticmethod
+    def _calls_in(body: ASTNode):
+        """折叠后的函数体里引用的函数（按分析器填写的 symbol 判断）"""
+        for n in walk(body):
+            if isinstance(n, Identifier):
+                sym = n.symbol
+                if sym is not None and sym.kind == SymbolKind.FUNC:
+                    yield sym.name, False
+            elif (isinstance(n, FuncCall) and isinstance(n.callee, Identifier)
+                  and n.callee.name == 'TriggerCreate'
+                  and n.args and isinstance(n.args[0], StringLiteral)):
+                yield n.args[0].value, True
+
+    # ══════════════════════════════════════════════════════════════════════
+    # 语句
+    # ══════════════════════════════════════════════════════════════════════
+
+    def _removed(self, *nodes):
+        self.stats.removed_nodes += sum(_size(n) for n in nodes)
+
+    def _empty(self, like: ASTNode) -> CompoundStmt:
+        node = CompoundStmt(items=[])
+        node.line, node.col = like.line, like.col
+        return node
+
+    def _cond(self, cond: ASTNode) -> Optional[bool]:
+        return _truthy(self._ev.evaluate(cond))
+
+    def _stmt(self, node, in_block: bool):
+        """
+        折叠一条语句，返回替换后的语句。
+        in_block=True（位于 {} 内）时返回 None 表示整条删除；
+        否则用空的 {} 占位（例如 while 的循环体）。
+        """
+        result = self._stmt_inner(node)
+        if result is None and not in_block:
+            return self._empty(node)
+        return result
+
+    def _stmt_inner(self, node):
+        if isinstance(node, CompoundStmt):
+            items = []
+            for item in node.items:
+                for sub in (item if isinstance(item, list) else [item]):
+                    folded = self._stmt(sub, in_block=True)
+                    if folded is not None:
+                        items.append(folded)
+            node.items = items
+            return node
+
+        if isinstance(node, IfStmt):
+            node.cond = self._expr(node.cond)
+            taken = self._cond(node.cond)
+            if taken is None:
+                node.then_br = self._stmt(node.then_br, in_block=False)
+                if node.else_br is not None:
+                    node.else_br = self._stmt(node.else_br, in_block=False)
+                return node
+            kept, dropped = (node.then_br, node.else_br) if taken else (node.else_br, node.then_br)
+            self.stats.pruned_branches += 1
+            self.stats.removed_nodes += 1          # if 节点本身
+            self._removed(node.cond, dropped)
+            return self._stmt_inner(kept) if kept is not None else None
+
+        if isinstance(node, WhileStmt):
+            node.cond = self._expr(node.cond)
+            if self._cond(node.cond) is False:
+                self.stats.pruned_branches += 1
+                self._removed(node)
+                return None
+            node.body = self._stmt(node.body, in_block=False)
+            return node
+
+        if isinstance(node, DoWhileStmt):
+            node.body = self._stmt(node.body, in_block=False)
+            node.cond = self._expr(node.cond)
+            return node
+
+        if isinstance(node, ForStmt):
+            for name in ('init', 'cond', 'post'):
+                part = getattr(node, name)
+                if isinstance(part, ExprStmt):
+                    if part.expr is not None:
+                        part.expr = self._expr(part.expr)
+                elif part is not None:
+                    setattr(node, name, self._expr(part))
+            node.body = self._stmt(node.body, in_block=False)
+            return node
+
+        if isinstance(node, ExprStmt):
+            if node.expr is not None:
+                node.expr = self._expr(node.expr)
+            return node
+
+        if isinstance(node, ReturnStmt):
+            if node.value is not None:
+                node.value = self._expr(node.value)
+            return node
+
+        if isinstance(node, VarDecl):
+            if node.init is not None:
+                node.init = self._expr(node.init)
+            return node
+
+        return node
+
+    # ══════════════════════════════════════════════════════════════════════
+    # 表达式
+    # ══════════════════════════════════════════════════════════════════════
+
+    def _expr(self, node: ASTNode) -> ASTNode:
+        """常量子树换成字面量；否则递归折叠子表达式"""
+        if node is None or isinstance(node, (_LITERALS, TypeSpecNode)):
+            return node
+        value = self._ev.evaluate(node)
+        if value is not None:
+            literal = make_literal(value, node)
+            if literal is not None:
+                self.stats.folded_exprs += 1
+                self._removed(node)
+                self.stats.removed_nodes -= 1      # 换上来的字面量
+                return literal
+
+        for name, child in list(node.__dict__.items()):
+            if isinstance(node, AssignOp) and name == 'left':
+                continue                          # 左值不折叠
+            if isinstance(node, FuncCall) and name == 'callee':
+                continue
+            if isinstance(child, ASTNode):
+                setattr(node, name, self._expr(child))
+            elif isinstance(child, list):
+                child[:] = [self._expr(c) if isinstance(c, ASTNode) else c for c in child]
+        return node
+
+
+def fold_constants(root: TranslationUnit, evaluator: ConstEvaluator,
+                   call_graph: CallGraph = None) -> FoldStats:
+    """对分析过的 AST 做常量折叠和死分支消除，返回统计"""
+    return ConstantFolder(evaluator, call_graph).fold(root)
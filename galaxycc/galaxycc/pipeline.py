@@ -11,10 +11,14 @@ from typing import Optional
 
 from lark import Lark, exceptions as lark_exc
 
-from .tree.transformer import GalaxyTransformer, TranslationUnit
+from .corpus import Corpus
+from .prescan import top_level_chunks
+from .tree.transformer import GalaxyTransformer, TranslationUnit, walk
 from .semantic.analyzer import GalaxyAnalyzer
 from .semantic.natives import NativeLoader, COMMON_NATIVES
-from .semantic.symbol import SymbolTable
+from .semantic.symbol import SymbolTable, FlatSymbolTable
+from .semantic.callgraph import CallGraph
+from .opt.fold import FoldStats, fold_constants
 from galaxycc.error import DiagnosticBag, SemanticError
 
 
@@ -25,12 +29,40 @@ class FrontendResult:
     """分析流水线的输出"""
     ast:          Optional[TranslationUnit]   # None 表示语法分析失败
     diags:        DiagnosticBag
-    symbol_table: Optional[SymbolTable]       # None 表示未进入语义分析
+    symbol_table: Optional[SymbolTable | FlatSymbolTable]   # None 表示未进入语义分析
+    call_graph:   Optional[CallGraph] = None  # include 闭包上的调用图
+    fold_stats:   Optional[FoldStats] = None  # optimize=True 时的折叠统计
+    natives_used: Optional[dict[str, set[str]]] = None   # 文件 → 引用到的 native 函数名
+    reused_bodies: int = 0                    # checked_includes 里的文件，未重查的函数体数
 
     @property
     def success(self) -> bool:
         return self.ast is not None and not self.diags.has_errors
 
+    @property
+    def truncated(self) -> bool:
+        """是否因诊断上限（fail_fast / max_diagnostics）提前结束"""
+        return self.diags.truncated
+
+
+def _clear_annotations(ast):
+    """清掉上一次分析写在节点上的注解（复用的 AST 交给新的一次分析之前）"""
+    for node in walk(ast):
+        node.gtype = node.symbol = node.const_value = None
+
+
+def _shift_error(e: lark_exc.UnexpectedInput, lines: int, offset: int):
+    """块内的解析错误 → 整个文件里的位置（块从行首开始，列不变）"""
+    if isinstance(e.line, int) and e.line > 0:
+        e.line += lines
+    if isinstance(e.pos_in_stream, int) and e.pos_in_stream >= 0:
+        e.pos_in_stream += offset
+    token = getattr(e, 'token', None)
+    if token is not None and isinstance(getattr(token, 'line', None), int):
+        token.line += lines
+        if isinstance(token.start_pos, int):
+            token.start_pos += offset
+
 
 # ─── 主流水线 ─────────────────────────────────────────────────────────────────
 
@@ -51,12 +83,26 @@ class GalaxyFrontend:
         print(result.diags.report())
     """
 
-    def __init__(self, grammar_file: str | Path = None, grammar_text: str = None, search_dirs=None):
+    def __init__(self, grammar_file: str | Path = None, grammar_text: str = None, search_dirs=None,
+                 analyzer_options: dict = None, corpus: Corpus = None,
+                 share_include_asts: bool = False, include_index=None):
         """
         Args:
             grammar_file: .lark 文件路径（与 grammar_text 二选一）
             grammar_text: 直接传入 grammar 字符串
             search_dirs: include 搜索目录列表
+            analyzer_options: 传给 GalaxyAnalyzer 的默认选项，
+                              如 {'prune_unreachable': True}；
+                              process_file / process_string 的关键字参数可逐次覆盖
+            corpus: 源文件缓存（见 corpus.py）；主文件和 include 的库文件都从这里取，
+                    整批运行中每个文件只读一次。不给时新建一个
+            share_include_asts: include 进来的库文件只解析一次，AST 在之后的分析间共享
+                    （分析只给节点写注解，不改树的结构；每次分析第一次用到时先清掉
+                    上一次的注解）。批量分析大量 include 同一组库的
+                    文件时使用；库文件内容变了（corpus 里换成新的 SourceFile）会重新解析
+            include_index: 已建好的 IncludeIndex（includes.py），多个前端共享同一份目录索引；
+                    不给时第一次 include 查找时由 search_dirs 建一个。
+                    include 查找不区分大小写
         """
         if grammar_file is None and grammar_text is None:
             raise ValueError("必须提供 grammar_file 或 grammar_text")
@@ -64,12 +110,12 @@ class GalaxyFrontend:
         self._parser = Lark.open(
             str(grammar_file),
             parser='earley',          # 或 'lalr'（需要 grammar 无歧义）
-            # propagate_positions=True,
+            propagate_positions=True,   # 规则节点的 meta 带位置，AST / 诊断才有行列和偏移
             ambiguity='resolve',
         ) if grammar_file else Lark(
             grammar_text,
             parser='earley',
-            # propagate_positions=True,
+            propagate_positions=True,
             ambiguity='resolve',
         )
 
@@ -77,6 +123,14 @@ class GalaxyFrontend:
         self._native_loader = NativeLoader()
         
         self._search_dirs = search_dirs or []
+        self._include_index = include_index
+        self._analyzer_options = dict(analyzer_options or {})
+        self.corpus = corpus if corpus is not None else Corpus()
+        # 源码文本 → AST。键是 corpus 里 SourceFile.text 这个对象本身，
+        # 同一对象的哈希只算一次、比较走 identity，命中是 O(1)
+        self._include_asts: Optional[dict[str, TranslationUnit]] = \
+            {} if share_include_asts else None
+        self._include_scans: dict = {}      # include_graph 用的预扫描缓存（同样以文本为键）
 
     # ── 加载 native 函数 ───────────────────────────────────────────────────
 
@@ -84,109 +138,287 @@ class GalaxyFrontend:
         """加载内置的常用 native 函数定义（无需外部文件）"""
         self._native_loader.load_from_dict(COMMON_NATIVES)
 
-    def load_natives_from_file(self, path: str | Path) -> int:
-        """从 .galaxy native 声明文件加载，返回加载的函数数量"""
-        return self._native_loader.load_from_file(path)
+    def load_natives_from_file(self, path: str | Path, db_path: str | Path = None) -> int:
+        """
+        从 .galaxy native 声明文件加载，返回加载的函数数量。
+        给了 db_path 时使用编译好的签名数据库（过期或不存在则解析后重写，见 nativedb.py）
+        """
+        return self._native_loader.load_from_file(path, db_path)
+
+    def load_natives_from_db(self, db_path: str | Path) -> int:
+        """直接从签名数据库加载（不检查源文件）"""
+        return self._native_loader.load_from_db(db_path)
 
     def load_natives_from_dict(self, definitions: dict):
         """从手工字典加载（格式见 NativeLoader.load_from_dict）"""
         self._native_loader.load_from_dict(definitions)
 
+    @property
+    def native_scope(self):
+        """已加载的 native 函数（NativeScope，各次分析共享）"""
+        return self._native_loader.get_scope()
+
     # ── 分析入口 ───────────────────────────────────────────────────────────
 
-    def process_file(self, path: str | Path) -> FrontendResult:
-        """分析单个 .galaxy 文件"""
+    def process_file(self, path: str | Path, optimize: bool = False,
+                     **analyzer_options) -> FrontendResult:
+        """分析单个 .galaxy 文件（参数同 process_string）"""
         path = Path(path)
-        if not path.exists():
+        try:
+            source = self.corpus.load(path).text
+        except OSError:
             diag = DiagnosticBag()
-            diag.error(f"文件不存在: {path}")
+            diag.file = str(path)
+            diag.error(f"文件不存在: {path}", code='GS0001')
             return FrontendResult(ast=None, diags=diag, symbol_table=None)
-        source = path.read_text(encoding='utf-8', errors='replace')
-        return self.process_string(source, source_name=str(path))
+        return self.process_string(source, source_name=str(path), optimize=optimize,
+                                   **analyzer_options)
 
     def _parse_source(self, source: str) -> TranslationUnit:
+        cache = self._include_asts
+        if cache is not None:
+            ast = cache.get(source)
+            if ast is None:
+                ast = cache[source] = self._transformer.transform(self._parser.parse(source))
+            return ast
         cst = self._parser.parse(source)
         return self._transformer.transform(cst)
 
+    def _make_include_parser(self):
+        """
+        给一次分析用的 include 解析函数。共享 AST 缓存命中时，本次分析里第一次取到
+        那棵树先清掉注解：上一次分析的 symbol / gtype / const_value 属于别的符号表，
+        留着会让这次的 const 求值等直接用上旧值。同一次分析里再取（const 预收集之后的
+        正式遍历）不再清，免得抹掉本次已写的注解
+        """
+        cache = self._include_asts
+        if cache is None:
+            return self._parse_source
+        cleared: set[int] = set()
+
+        def parse(source: str) -> TranslationUnit:
+            hit = source in cache
+            ast = self._parse_source(source)
+            if id(ast) not in cleared:
+                cleared.add(id(ast))
+                if hit:
+                    _clear_annotations(ast)
+            return ast
+        return parse
+
+    def preparse_include(self, path: str | Path) -> bool:
+        """
+        解析一个库文件并放进共享 AST 缓存（share_include_asts=True 时才有意义）。
+        按 include 图的拓扑序预先调用，每个库在整批里只解析一次。
+        返回是否成功；语法错误留到真正 include 它的分析里报告
+        """
+        if self._include_asts is None:
+            return False
+        try:
+            self._parse_source(self.corpus.load(path).text)
+        except (OSError, lark_exc.LarkError):
+            return False
+        return True
+
+    def include_graph(self, paths) -> 'IncludeGraph':
+        """用本前端的 search_dirs 和 corpus 建出 paths 的 include 图（见 includes.py）"""
+        from .includes import IncludeGraph
+        return IncludeGraph.build(paths, corpus=self.corpus, resolve=self.include_index.resolve,
+                                  scans=self._include_scans)
+
+    def forget_file(self, path: str | Path) -> bool:
+        """丢弃一个文件的缓存（corpus 里的内容、共享的 AST 和预扫描结果），下次用到时重读"""
+        src = self.corpus.get(path)
+        if src is None:
+            return False
+        if self._include_asts is not None:
+            self._include_asts.pop(src.text, None)
+        self._include_scans.pop(src.text, None)
+        return self.corpus.forget(path)
+
+    def refresh(self) -> list[str]:
+        """丢弃磁盘上已改动的文件的缓存，返回这些文件的路径（长驻进程每次请求前调用）"""
+        stale = [str(src.path) for src in self.corpus.stale()]
+        for path in stale:
+            self.forget_file(path)
+        return stale
+
+    def clear_include_asts(self):
+        """丢弃共享的库 AST 和预扫描结果（库文件被改过、或想释放内存时）"""
+        if self._include_asts is not None:
+            self._include_asts.clear()
+        self._include_scans.clear()
+
+    @property
+    def cached_include_asts(self) -> int:
+        """共享 AST 缓存里的库文件数"""
+        return len(self._include_asts) if self._include_asts is not None else 0
+
+    @property
+    def include_index(self) -> 'IncludeIndex':
+        """search_dirs 的目录索引，第一次用到时遍历一次目录，之后整批共享"""
+        if self._include_index is None:
+            from .includes import IncludeIndex
+            self._include_index = IncludeIndex(self._search_dirs)
+        return self._include_index
+
+    @include_index.setter
+    def include_index(self, index: 'IncludeIndex'):
+        """换一套 include 查找（如工作区里切换到另一层的搜索路径）"""
+        self._include_index = index
+        self._search_dirs = list(index.search_dirs)
+
     def _make_file_loader(self):
-        import os
-        dirs = self._search_dirs
+        resolve = self.include_index.resolve
+        corpus = self.corpus
         def loader(path):
-            for d in dirs:
-                for candidate in [
-                    os.path.join(d, path + '.galaxy'),
-                    os.path.join(d, path),
-                ]:
-                    if os.path.exists(candidate):
-                        with open(candidate, encoding='utf-8', errors='replace') as f:
-                            return f.read()
-            raise FileNotFoundError(path)
+            target = resolve(path)
+            if target is None:
+                raise FileNotFoundError(path)
+            return corpus.load(target).text
         return loader
-        
-    def process_string(self, source: str, source_name: str = '<input>') -> FrontendResult:
+
+    def process_string(self, source: str, source_name: str = '<input>',
+                       optimize: bool = False, chunk_cache: dict = None,
+                       **analyzer_options) -> FrontendResult:
         """
         分析源码字符串，返回 FrontendResult。
         即使有错误也尽量完成分析（错误恢复模式）。
+
+        optimize=True 时在语义分析之后做常量折叠 & 死分支消除（原地改 AST，
+        调用图同步刷新），统计放在 result.fold_stats。
+
+        analyzer_options 覆盖构造时给定的默认分析选项，例如：
+            prune_unreachable=True   只检查主文件可达的函数体（交互/增量场景）
+            fail_fast=True           第一条错误后即停（只判断文件是否干净）
+            max_diagnostics=N        记满 N 条诊断后即停
+            checked_includes=C       C 里的 include 只注册签名、不重查函数体（见 workspace.py）；
+                                     这些函数体的调用边和 native 引用不进 call_graph / natives_used
+        提前结束时 result.truncated 为 True，且不做 optimize 折叠。
+
+        chunk_cache 给出时（编辑器里反复分析同一个文件的不同版本，每个文件一个 dict）
+        源码按顶层声明分块解析，块的 AST 按文本缓存在里面，改动一处只重新解析那一块。
         """
         diag = DiagnosticBag()
+        diag.file = source_name
 
         # ── Step 1: 词法 + 语法分析 ─────────────────────────────────────
         try:
-            cst = self._parser.parse(source)
+            if chunk_cache is not None:
+                ast = self._parse_chunked(source, chunk_cache)
+            else:
+                cst = self._parser.parse(source)
         except lark_exc.UnexpectedCharacters as e:
             diag.error(
-                f"词法错误：意外字符 '{e.char}' at {e.line}:{e.column}",
-                hint=f"期望：{e.allowed}")
+                f"词法错误：意外字符 '{e.char}' at {e.line}:{e.column}", e,
+                hint=f"期望：{e.allowed}", code='GS0101')
             return FrontendResult(ast=None, diags=diag, symbol_table=None)
         except lark_exc.UnexpectedToken as e:
             diag.error(
                 f"语法错误：意外 token '{e.token}' (类型 {e.token.type}) "
-                f"at {e.line}:{e.column}",
-                hint=f"期望：{e.expected}")
+                f"at {e.line}:{e.column}", e.token,
+                hint=f"期望：{e.expected}", code='GS0102')
             return FrontendResult(ast=None, diags=diag, symbol_table=None)
         except lark_exc.ParseError as e:
-            diag.error(f"语法分析失败: {e}")
+            diag.error(f"语法分析失败: {e}", code='GS0103')
+            return FrontendResult(ast=None, diags=diag, symbol_table=None)
+        except lark_exc.VisitError as e:        # 分块解析时转换在块里就做了
+            diag.error(f"AST 转换失败（可能是 Transformer 未完整覆盖某规则）: {e.orig_exc}",
+                       code='GS0901')
             return FrontendResult(ast=None, diags=diag, symbol_table=None)
 
         # ── Step 2: CST → AST ───────────────────────────────────────────
-        try:
-            ast = self._transformer.transform(cst)
-        except Exception as e:
-            diag.error(f"AST 转换失败（可能是 Transformer 未完整覆盖某规则）: {e}")
-            return FrontendResult(ast=None, diags=diag, symbol_table=None)
+        if chunk_cache is None:
+            try:
+                ast = self._transformer.transform(cst)
+            except Exception as e:
+                diag.error(f"AST 转换失败（可能是 Transformer 未完整覆盖某规则）: {e}",
+                           code='GS0901')
+                return FrontendResult(ast=None, diags=diag, symbol_table=None)
 
         if not isinstance(ast, TranslationUnit):
-            diag.error(f"AST 根节点类型错误：{type(ast).__name__}")
+            diag.error(f"AST 根节点类型错误：{type(ast).__name__}", code='GS0902')
             return FrontendResult(ast=None, diags=diag, symbol_table=None)
 
         # ── Step 3: 语义分析 ─────────────────────────────────────────────
         try:
-            # analyzer = GalaxyAnalyzer(
-            #     native_builtins=self._native_loader.get_builtins()
-            # )
-            
+            # native 作用域只在加载新函数后重建，各次分析共享同一个
             analyzer = GalaxyAnalyzer(
-                native_builtins=self._native_loader.get_builtins(),
+                native_builtins=self._native_loader.get_scope(),
                 file_loader=self._make_file_loader(),
-                parser=self._parse_source,
+                parser=self._make_include_parser(),
+                resolve_include=self.include_index.resolve,
+                **{**self._analyzer_options, **analyzer_options},
             )
-            sem_diag = analyzer.analyze(ast)
+            sem_diag = analyzer.analyze(ast, source_name)
             # 合并诊断
-            for d in sem_diag:
-                diag._diags.append(d)
+            diag.extend(sem_diag)
+            diag.truncated = sem_diag.truncated
         except SemanticError as e:
-            diag.error(f"语义分析内部错误（请报告 bug）: {e}")
+            diag.error(f"语义分析内部错误（请报告 bug）: {e}", code='GS0903')
             return FrontendResult(ast=ast, diags=diag, symbol_table=None)
         except Exception as e:
-            diag.error(f"语义分析崩溃（请报告 bug）: {type(e).__name__}: {e}")
+            diag.error(f"语义分析崩溃（请报告 bug）: {type(e).__name__}: {e}",
+                       code='GS0904')
             return FrontendResult(ast=ast, diags=diag, symbol_table=None)
 
+        # ── Step 4（可选）: 常量折叠 & 死分支消除 ────────────────────────
+        fold_stats = None
+        if optimize and not diag.truncated:
+            fold_stats = fold_constants(ast, analyzer.consts, analyzer.call_graph)
+
         return FrontendResult(
             ast=ast,
             diags=diag,
             symbol_table=analyzer.table,
+            call_graph=analyzer.call_graph,
+            fold_stats=fold_stats,
+            natives_used=analyzer.natives_used,
+            reused_bodies=analyzer.reused_bodies,
         )
 
+    def _parse_chunked(self, source: str, cache: dict) -> TranslationUnit:
+        """
+        按顶层声明分块解析（见 prescan.top_level_chunks），拼成一个 TranslationUnit。
+
+        cache: 块文本 → [AST, 行偏移, 字符偏移]。块的 AST 里的位置是按上次所在的
+        位置换算过的，这次位置变了（前面的块增删了行）就整体平移；
+        这次没用到的块从 cache 里删掉。语法错误的位置同样换算到整个文件。
+        复用的块先清掉上次分析写下的注解（gtype / symbol / const_value），
+        否则这次查不到的名字还会指向上一版的符号
+        """
+        used: dict[str, list] = {}
+        decls = []
+        line = 0
+        for start, end in top_level_chunks(source):
+            text = source[start:end]
+            entry = cache.get(text) if text not in used else None   # 同样的块出现两次时第二个现解析
+            reused = entry is not None
+            if not reused:
+                try:
+                    ast = self._transformer.transform(self._parser.parse(text))
+                except lark_exc.UnexpectedInput as e:
+                    _shift_error(e, line, start)
+                    raise
+                entry = [ast, 0, 0]
+            ast, old_line, old_start = entry
+            d_line, d_offset = line - old_line, start - old_start
+            if reused:
+                _clear_annotations(ast)
+            if d_line or d_offset:
+                for node in walk(ast):
+                    if node.line > 0:
+                        node.line += d_line
+                    if node.offset >= 0:
+                        node.offset += d_offset
+                entry[1], entry[2] = line, start
+            used.setdefault(text, entry)
+            decls.extend(ast.decls)
+            line += text.count('\n')
+        cache.clear()
+        cache.update(used)
+        return TranslationUnit(decls=decls)
+
     # ── 调试工具 ───────────────────────────────────────────────────────────
 
     def parse_only(self, source: str):
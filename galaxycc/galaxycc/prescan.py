@@ -0,0 +1,197 @@
+"""
+声明预扫描
+==========
+语法里 IDENTIFIER 既可能是变量名也可能是用户类型名（struct / typedef），
+解析器事先不知道哪些名字是类型，只能靠 Earley 的歧义处理或文本替换。
+
+这里在解析之前做一遍词法级扫描（不建语法树）：跳过注释和字符串，
+只认 include "..."、struct NAME、typedef ... NAME; 三种形式，得到每个文件
+自己声明的类型名和 include 列表。再沿 include 闭包合并，得到"解析这个文件时
+哪些名字是类型"——交给词法钩子把这些名字标成 TYPE_NAME（经典的 C lexer hack），
+语法里不再需要 IDENTIFIER 作类型，文件就能走 LALR。
+
+用法：
+    index = TypeNameIndex(corpus, resolve=lambda inc, src: ...)
+    names = index.closure_names('maps/MyMap.galaxy')   # frozenset
+"""
+
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from .corpus import Corpus, SourceFile
+
+# 注释、字符串原样跳过；三种声明形式各占一个分组
+_SCAN = re.compile(r'''
+      //[^\n]*
+    | /\*.*?\*/
+    | "(?:\\.|[^"\\\n])*"
+    | \b(?:
+          include\s*"(?P<include>[^"\n]*)"
+        | struct\s+(?P<struct>[A-Za-z_]\w*)
+        | (?P<typedef>typedef)\b
+      )
+''', re.S | re.X)
+
+# typedef 声明体里的记号：名字、方括号、分号（注释里的分号不算）
+_TYPEDEF_TOKEN = re.compile(r'//[^\n]*|/\*.*?\*/|(?P<word>[A-Za-z_]\w*)|(?P<punct>[\[\];])', re.S)
+
+
+@dataclass(frozen=True)
+class FileDecls:
+    """一个文件自己的声明（不含 include 进来的）"""
+    structs:  frozenset
+    typedefs: frozenset
+    includes: tuple          # include 路径，按出现顺序，原样保留
+
+    @property
+    def type_names(self) -> frozenset:
+        return self.structs | self.typedefs
+
+
+def _typedef_name(text: str, pos: int) -> tuple[Optional[str], int]:
+    """从 typedef 关键字之后扫到分号，返回 (声明的新名字, 分号之后的位置)"""
+    name, depth = None, 0
+    for m in _TYPEDEF_TOKEN.finditer(text, pos):
+        word, punct = m.group('word'), m.group('punct')
+        if word:
+            if depth == 0:
+                name = word          # 方括号外最后一个名字；typedef int A[N]; 里的 N 不算
+        elif punct == '[':
+            depth += 1
+        elif punct == ']':
+            depth = max(depth - 1, 0)
+        elif punct == ';':
+            return name, m.end()
+    return name, len(text)
+
+
+def scan_declarations(text: str) -> FileDecls:
+    """词法级扫描一个文件，返回其中的 struct / typedef 名和 include 列表"""
+    structs, typedefs, includes = set(), set(), []
+    pos = 0
+    while True:
+        m = _SCAN.search(text, pos)
+        if m is None:
+            break
+        pos = m.end()
+        if m.group('include') is not None:
+            includes.append(m.group('include'))
+        elif m.group('struct'):
+            structs.add(m.group('struct'))
+        elif m.group('typedef'):
+            name, pos = _typedef_name(text, pos)
+            if name:
+                typedefs.add(name)
+    return FileDecls(frozenset(structs), frozenset(typedefs), tuple(includes))
+
+
+# 分块用的记号：注释、字符串整体跳过，只看花括号、分号、换行
+_CHUNK_TOKEN = re.compile(r'''//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|[{};\n]|[^\s{};"'/]+|\S''', re.S)
+
+
+def top_level_chunks(text: str) -> list[tuple[int, int]]:
+    """
+    把文件按顶层声明切成若干块，返回每块的 [start, end) 字符偏移。
+
+    块都从行首开始：在花括号深度为 0、行尾最后一个记号是 ; 或 } 的换行处切开
+    （} 之后下一个记号是 ; 时不切，struct 的右括号和分号可能分在两行）。
+    每块单独就是一个合法的 translation_unit，可以分别解析再拼起来；
+    编辑器里改动一个函数时只有这一块需要重新解析（见 GalaxyFrontend.process_string 的 chunk_cache）。
+    花括号不配对时（正在输入）从那里到文件末尾是一块。
+    """
+    chunks = []
+    start = 0
+    depth = 0
+    last = ''           # 当前行深度 0 处最后一个记号
+    pending = -1        # 候选切点（换行之后的位置），等看到下一个记号再决定
+    for m in _CHUNK_TOKEN.finditer(text):
+        tok = m.group()
+        if tok == '\n':
+            if depth == 0 and last in (';', '}') and pending < 0:
+                pending = m.end()
+            last = ''
+            continue
+        if tok.startswith('//') or tok.startswith('/*'):
+            continue
+        if pending >= 0:
+            if tok != ';':
+                chunks.append((start, pending))
+                start = pending
+            pending = -1
+        if tok == '{':
+            depth += 1
+        elif tok == '}':
+            depth = max(depth - 1, 0)
+        last = tok if depth == 0 else ''
+    chunks.append((start, len(text)))
+    return chunks
+
+
+class TypeNameIndex:
+    """
+    每个文件的声明 + include 闭包上的类型名集合，都按需计算并缓存。
+
+    resolve(include_path, src) 把 include 路径解析成文件路径（找不到返回 None），
+    src 是发出 include 的 SourceFile；找不到的 include 只是不贡献类型名。
+    文件内容从 corpus 取，与解析共用同一份缓冲。
+    """
+
+    def __init__(self, corpus: Corpus,
+                 resolve: Callable[[str, SourceFile], Optional[str]]):
+        self.corpus = corpus
+        self.resolve = resolve
+        self._decls: dict[str, FileDecls] = {}           # corpus.key → 声明
+        self._edges: dict[str, tuple[str, ...]] = {}     # corpus.key → 解析后的 include
+        self._closure: dict[str, frozenset] = {}
+        self.unresolved: dict[str, list[str]] = {}       # corpus.key → 找不到的 include
+
+    def decls(self, path) -> FileDecls:
+        key = self.corpus.key(path)
+        d = self._decls.get(key)
+        if d is None:
+            d = self._decls[key] = scan_declarations(self.corpus.load(path).text)
+        return d
+
+    def includes(self, path) -> tuple[str, ...]:
+        """path 直接 include 的文件（已解析的路径，读不到的跳过）"""
+        key = self.corpus.key(path)
+        edges = self._edges.get(key)
+        if edges is None:
+            src = self.corpus.load(path)
+            found, missing = [], []
+            for inc in self.decls(path).includes:
+                target = self.resolve(inc, src)
+                if target is not None and target not in found:
+                    found.append(target)
+                elif target is None:
+                    missing.append(inc)
+            if missing:
+                self.unresolved[key] = missing
+            edges = self._edges[key] = tuple(found)
+        return edges
+
+    def closure_names(self, path) -> frozenset:
+        """解析 path 时应视为类型名的全部名字：自身 + include 闭包中声明的"""
+        key = self.corpus.key(path)
+        names = self._closure.get(key)
+        if names is not None:
+            return names
+        seen = {key}
+        stack = [path]
+        collected = set()
+        while stack:
+            p = stack.pop()
+            try:
+                collected |= self.decls(p).type_names
+                children = self.includes(p)
+            except OSError:
+                continue
+            for child in children:
+                ck = self.corpus.key(child)
+                if ck not in seen:
+                    seen.add(ck)
+                    stack.append(child)
+        names = self._closure[key] = frozenset(collected)
+        return names
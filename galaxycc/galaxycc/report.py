@@ -0,0 +1,222 @@
+"""
+机器可读的诊断输出
+==================
+批量分析时按文件追加写出诊断，不在内存里攒整批结果：
+
+  JsonlWriter   每条诊断一行 JSON（字段见 SemanticDiag.to_dict，另加 path）
+  SarifWriter   SARIF 2.1.0，results 数组边分析边写，规则表在收尾时补上
+
+位置同时给字符偏移和字节偏移。字节偏移按文件原编码算，要先用
+fill_byte_offsets(diags, corpus) 对照 corpus 里的原文换算（BatchRunner 写出前自动做）。
+
+汇总（如"全语料出现最多的 20 个错误码"）对 JSONL 单遍流式扫描完成：
+
+    from galaxycc.report import JsonlWriter, top_codes
+
+    with JsonlWriter('diags.jsonl') as out:
+        BatchRunner(frontend, writers=[out], keep_diags=False).run(paths)
+    for code, count, files in top_codes('diags.jsonl', 20):
+        print(code, count, files)
+
+命令行：
+    python -m galaxycc.report top diags.jsonl [-n 20] [--severity error]
+"""
+
+from __future__ import annotations
+import argparse
+import json
+from abc import ABC, abstractmethod
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Iterator, TextIO
+
+from .corpus import Corpus
+from .error import DIAG_CODES, ErrorSeverity, SemanticDiag
+
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+
+
+def fill_byte_offsets(diags: Iterable[SemanticDiag], corpus: Corpus, path: str | Path = ''):
+    """
+    按 corpus 里缓存的原文把诊断的字符偏移换算成字节偏移（SourceFile.byte_offset）。
+    诊断没有 file 时按 path 算；文件不在 corpus 里的（如编辑器里未保存的缓冲区）保持 -1
+    """
+    sources = {}
+    for d in diags:
+        if d.offset < 0 or d.byte_offset >= 0:
+            continue
+        file = d.file or str(path)
+        src = sources.get(file)
+        if src is None and file not in sources:
+            src = sources[file] = corpus.get(file)
+        if src is not None and d.offset <= len(src.text):
+            d.byte_offset = src.byte_offset(d.offset)
+
+
+class _StreamWriter(ABC):
+    """公共部分：打开 / 关闭输出流，支持 with；子类实现 write_file"""
+
+    def __init__(self, target: str | Path | TextIO):
+        if hasattr(target, 'write'):
+            self._stream, self._owned = target, False
+        else:
+            self._stream, self._owned = open(target, 'w', encoding='utf-8'), True
+        self.files = 0
+        self.count = 0
+
+    @abstractmethod
+    def write_file(self, path: str | Path, diags: Iterable[SemanticDiag]):
+        """写出一个文件的全部诊断"""
+
+    def close(self):
+        self._stream.flush()
+        if self._owned:
+            self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ─── JSONL ───────────────────────────────────────────────────────────────────
+
+class JsonlWriter(_StreamWriter):
+    """每条诊断一行 JSON，每个文件写完 flush 一次"""
+
+    def write_file(self, path: str | Path, diags: Iterable[SemanticDiag]):
+        path = str(path)
+        write = self._stream.write
+        for d in diags:
+            rec = d.to_dict()
+            rec['path'] = path
+            write(json.dumps(rec, ensure_ascii=False))
+            write('\n')
+            self.count += 1
+        self.files += 1
+        self._stream.flush()
+
+
+def iter_jsonl(path: str | Path) -> Iterator[dict]:
+    """逐行读回 JsonlWriter 的输出"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def top_codes(records: str | Path | Iterable[dict], n: int = 20,
+              severity: str = None) -> list[tuple[str, int, int]]:
+    """
+    单遍统计出现最多的诊断码，返回 [(code, 条数, 涉及文件数), ...]。
+    records 可以是 JSONL 路径或 dict 序列；severity 只统计 'error' / 'warning'。
+    """
+    if isinstance(records, (str, Path)):
+        records = iter_jsonl(records)
+    counts = Counter()
+    files: dict[str, set] = {}
+    for rec in records:
+        if severity and rec['severity'] != severity:
+            continue
+        code = rec['code'] or '(none)'
+        counts[code] += 1
+        files.setdefault(code, set()).add(rec['path'])
+    return [(code, count, len(files[code])) for code, count in counts.most_common(n)]
+
+
+# ─── SARIF ───────────────────────────────────────────────────────────────────
+
+_SARIF_LEVEL = {ErrorSeverity.ERROR: 'error', ErrorSeverity.WARNING: 'warning'}
+
+
+class SarifWriter(_StreamWriter):
+    """
+    SARIF 2.1.0 流式输出。
+
+    文件头在构造时写出，每个文件的 result 依次追加到 runs[0].results；
+    close() 时补上 runs[0].tool（只列出实际出现过的规则）并闭合 JSON。
+    region 用 startLine / startColumn（均为 1 起）和 charOffset。
+    来自 include 文件的诊断，uri 是 include 路径，properties.analyzedFile 是分析入口文件。
+    """
+
+    def __init__(self, target: str | Path | TextIO, tool_name: str = 'galaxycc'):
+        super().__init__(target)
+        self._tool_name = tool_name
+        self._rules: dict[str, int] = {}
+        self._stream.write('{"version": "2.1.0", "$schema": "%s", "runs": [{"results": [\n'
+                           % SARIF_SCHEMA)
+
+    def _rule_index(self, code: str) -> int:
+        idx = self._rules.get(code)
+        if idx is None:
+            idx = self._rules[code] = len(self._rules)
+        return idx
+
+    def write_file(self, path: str | Path, diags: Iterable[SemanticDiag]):
+        path = str(path)
+        for d in diags:
+            region = {}
+            if d.line > 0:
+                region['startLine'] = d.line
+                if d.column > 0:
+                    region['startColumn'] = d.column
+            if d.offset >= 0:
+                region['charOffset'] = d.offset
+            if d.byte_offset >= 0:
+                region['byteOffset'] = d.byte_offset
+            # include 文件里的诊断指向 include 解析到的文件，
+            # 分析入口和 include 里写的原样路径记在 properties 里
+            origin = d.file or path
+            location = {'artifactLocation': {'uri': Path(origin).as_posix()}}
+            if region:
+                location['region'] = region
+            result = {
+                'level':     _SARIF_LEVEL[d.severity],
+                'message':   {'text': d.message + (f"\n{d.hint}" if d.hint else '')},
+                'locations': [{'physicalLocation': location}],
+            }
+            if d.code:
+                result['ruleId'] = d.code
+                result['ruleIndex'] = self._rule_index(d.code)
+            if origin != path:
+                result['properties'] = {'analyzedFile': Path(path).as_posix()}
+                if d.include:
+                    result['properties']['include'] = d.include
+            if self.count:
+                self._stream.write(',\n')
+            self._stream.write(json.dumps(result, ensure_ascii=False))
+            self.count += 1
+        self.files += 1
+        self._stream.flush()
+
+    def close(self):
+        rules = [{'id': code,
+                  'shortDescription': {'text': DIAG_CODES.get(code, (None, code))[1]}}
+                 for code in self._rules]
+        driver = {'name': self._tool_name, 'rules': rules}
+        self._stream.write('\n], "tool": %s}]}\n'
+                           % json.dumps({'driver': driver}, ensure_ascii=False))
+        super().close()
+
+
+# ─── 命令行 ──────────────────────────────────────────────────────────────────
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog='python -m galaxycc.report', description='诊断 JSONL 汇总')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    top = sub.add_parser('top', help='出现最多的诊断码')
+    top.add_argument('jsonl')
+    top.add_argument('-n', type=int, default=20)
+    top.add_argument('--severity', choices=['error', 'warning'])
+    args = ap.parse_args(argv)
+
+    if args.cmd == 'top':
+        print(f"{'code':<8} {'条数':>8} {'文件数':>6}  说明")
+        for code, count, files in top_codes(args.jsonl, args.n, args.severity):
+            title = DIAG_CODES.get(code, (None, ''))[1]
+            print(f"{code:<8} {count:>8} {files:>6}  {title}")
+
+
+if __name__ == '__main__':
+    main()
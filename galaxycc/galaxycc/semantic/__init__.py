@@ -1,5 +1,6 @@
 # galaxycc/semantic/__init__.py
 from .type import *
 from .symbol import *
+from .callgraph import CallGraph
 from .analyzer import GalaxyAnalyzer
 from .natives import NativeLoader, COMMON_NATIVES
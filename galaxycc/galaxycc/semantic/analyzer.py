@@ -17,7 +17,7 @@ Galaxy Script 语义分析器
 from __future__ import annotations
 from typing import Optional
 
-from galaxycc.error import DiagnosticBag, _loc
+from galaxycc.error import DiagnosticBag, DiagnosticLimitReached
 from .type import (
     GType, BasicType, HandleType, ArrayType, FunctionType,
     StructType, TypedefType, NullType, ErrorType,
@@ -26,7 +26,10 @@ from .type import (
     is_numeric, is_arithmetic, is_comparable, is_orderable,
     can_assign, resolve_binary_op,
 )
-from .symbol import Symbol, SymbolKind, SymbolTable
+from .symbol import Symbol, SymbolKind, SymbolTable, FlatSymbolTable, NativeScope
+from .callgraph import CallGraph, collect_calls
+from .consteval import ConstEvaluator
+from . import parallel
 
 # 导入 AST 节点（从 transformer 模块）
 from ..tree.transformer import (
@@ -56,35 +59,86 @@ class GalaxyAnalyzer:
             print(diags.report())
     """
 
-    def __init__(self, native_builtins: dict = None, file_loader=None, parser=None):
+    def __init__(self, native_builtins: dict = None, file_loader=None, parser=None,
+                 prune_unreachable: bool = False, jobs: int = 1,
+                 flat_scopes: bool = False, fail_fast: bool = False,
+                 max_diagnostics: int = None, checked_includes=None, resolve_include=None):
         """
         Args:
-            native_builtins: 预定义的 native 函数字典
-                             { func_name: FunctionType }
-                             通常由外部加载 Galaxy API 定义后传入
+            native_builtins: 预定义的 native 函数，NativeScope（推荐，多个分析器共享，
+                             不再逐个新建 Symbol）或字典 { func_name: FunctionType }
+                             通常由 NativeLoader.get_scope() 得到
+            prune_unreachable: 剪枝模式。所有签名照常注册，但只对从主文件
+                             定义可达的函数体做类型检查；库里用不到的函数体跳过
+            jobs: 函数体分析的进程数。>1 时全局注册完成后把函数体分给
+                  fork 出来的进程池并行检查（见 semantic/parallel.py）
+            flat_scopes: 使用 FlatSymbolTable（名字 → 绑定栈 + 作用域撤销日志），
+                  接口与 SymbolTable 相同，深层嵌套的函数体上查找更快
+            fail_fast: 记下第一条错误后立即结束分析（只想知道文件是否干净时用）
+            max_diagnostics: 记满这么多条诊断（错误 + 警告）后结束分析；None 不限
+            checked_includes: 函数体已在别处检查过的 include 路径（支持 in 的任意容器）。
+                  这些文件照常注册类型、全局变量和函数签名，但不再检查函数体
+                  （工作区按层分析时，下层库的函数体只在分析那一层时检查一次）。
+                  代价：这些函数体里的调用边 / 触发器引用不进 call_graph，
+                  引用的 native 也不进 natives_used；需要完整调用图时不要传
+            resolve_include: include 路径 → 实际文件路径（找不到为 None），通常是
+                  IncludeIndex.resolve；给了时 include 文件里的诊断记在解析出的路径下
         """
         self._file_loader = file_loader
         self._parser = parser
-        self._curr_file = '<main>'
         self._included = set()
-        self.diag  = DiagnosticBag()
-        self.table = SymbolTable()
+        self._resolve_include = resolve_include
+        self._include_targets: dict[str, str] = {}      # include 路径 → 诊断里记的文件
+        self.diag  = DiagnosticBag(fail_fast=fail_fast, max_diagnostics=max_diagnostics)
+        self._main_file = '<main>'
+        self._curr_file = '<main>'
+        if native_builtins is not None and not isinstance(native_builtins, NativeScope):
+            native_builtins = NativeScope(native_builtins)
+        self.table = (FlatSymbolTable if flat_scopes else SymbolTable)(native_builtins)
+        self.consts = ConstEvaluator(self.table.lookup)
+        self.call_graph = CallGraph()
+
+        # 剪枝 / 并行模式：函数体先攒起来，等整个 include 闭包注册完再统一分析
+        self._prune_unreachable = prune_unreachable
+        self._jobs = max(1, int(jobs or 1))
+        self._defer_bodies = prune_unreachable or self._jobs > 1
+        self._deferred_bodies: list[tuple[FuncDef, str]] = []
+        self.pruned_funcs: list[str] = []                # 被跳过的函数体
+        self._checked_includes = checked_includes if checked_includes is not None else ()
+        self.reused_bodies: int = 0                      # 因 checked_includes 跳过的函数体数
 
         # 分析器状态
         self._curr_func: Optional[FunctionType] = None   # 当前所在函数类型
         self._curr_func_name: str = ''
         self._loop_depth: int = 0                        # 嵌套循环深度
+        self._undeclared: set[str] = set()               # 当前函数里已报过的未声明标识符
+        self.natives_used: dict[str, set[str]] = {}      # 文件 → 其中引用到的 native 函数名
 
         # 注册内置类型
         for name, gtype in BUILTIN_TYPES.items():
             sym = Symbol(name, gtype, SymbolKind.TYPE)
             self.table.define(sym)
 
-        # 注册用户提供的 native 函数
-        if native_builtins:
-            for fname, ftype in native_builtins.items():
-                sym = Symbol(fname, ftype, SymbolKind.FUNC, is_native=True)
-                self.table.define(sym)
+    @property
+    def _curr_file(self) -> str:
+        """当前分析的文件（主文件名或 include 路径）"""
+        return self._file
+
+    @_curr_file.setter
+    def _curr_file(self, path: str):
+        self._file = path
+        # 之后的诊断记在这个文件下：include 文件记解析出的路径，原样的 include 路径另记
+        if path == self._main_file:
+            self.diag.file, self.diag.include = path, ''
+        else:
+            self.diag.file, self.diag.include = self._include_target(path), path
+
+    def _include_target(self, path: str) -> str:
+        target = self._include_targets.get(path)
+        if target is None:
+            resolved = self._resolve_include(path) if self._resolve_include else None
+            target = self._include_targets[path] = str(resolved) if resolved is not None else path
+        return target
 
     # ══════════════════════════════════════════════════════════════════════
     # 入口
@@ -94,13 +148,67 @@ class GalaxyAnalyzer:
         """
         分析整个翻译单元，返回诊断信息袋。
         分析后每个 AST 节点的 .gtype 会被填写。
+        设置了诊断上限时，达到上限即停止，diag.truncated 为 True（AST 只注解了一部分）。
         """
         self._const_collected = set()
-        self._collect_consts_recursive(root)  # 预收集所有 const 变量，确保它们在分析 struct 成员时可用
+        self._main_file = source_name
         self._curr_file = source_name
-        self._visit(root)
+        try:
+            self._collect_consts_recursive(root)  # 预收集所有 const 变量，确保它们在分析 struct 成员时可用
+            self._curr_file = source_name
+            self._visit(root)
+            if self._defer_bodies:
+                self._analyze_deferred_bodies()
+        except DiagnosticLimitReached:
+            self._curr_file = self._main_file
+        self.consts.trust_symbols = True    # 此后的求值（常量折叠）用本次写下的 node.symbol
         return self.diag
 
+    def _analyze_deferred_bodies(self):
+        """剪枝 / 并行模式第二阶段：分析攒下的函数体"""
+        bodies = self._deferred_bodies
+        self._deferred_bodies = []
+        if self._prune_unreachable:
+            bodies = self._select_reachable(bodies)
+
+        jobs = parallel.effective_jobs(self._jobs)
+        if jobs > 1 and len(bodies) >= parallel.PARALLEL_MIN_BODIES:
+            parallel.analyze_bodies_parallel(self, bodies, jobs)
+        else:
+            for decl, file in bodies:
+                self._curr_file = file
+                self._visit_FuncDef(decl, body_only=True)
+        self._curr_file = self._main_file
+
+    def _select_reachable(self, bodies: list) -> list:
+        """
+        剪枝模式：
+          1. 语法扫描所有攒下的函数体，把调用边补进调用图
+          2. 以 ROOT（全局初始化）+ 主文件里定义的函数为根求可达集
+          3. 返回可达的函数体，其余记入 pruned_funcs
+        """
+        graph = self.call_graph
+        for decl, _ in bodies:
+            for name, is_trigger in collect_calls(decl.body):
+                sym = self.table.lookup_global(name)
+                if sym is None or sym.kind != SymbolKind.FUNC:
+                    continue
+                if is_trigger:
+                    graph.add_trigger(decl.name, name)
+                else:
+                    graph.add_call(decl.name, name)
+
+        roots = [CallGraph.ROOT] + graph.functions(self._main_file)
+        live = graph.reachable(roots)
+
+        selected = []
+        for decl, file in bodies:
+            if decl.name in live:
+                selected.append((decl, file))
+            else:
+                self.pruned_funcs.append(decl.name)
+        return selected
+
     # ══════════════════════════════════════════════════════════════════════
     # 分发器
     # ══════════════════════════════════════════════════════════════════════
@@ -159,24 +267,25 @@ class GalaxyAnalyzer:
         self._included.add(node.path)
         saved_file = self._curr_file
         try:
-            print(f"[DEBUG] 尝试加载: {node.path}")  # 加这行
             source = self._file_loader(node.path)
             included_ast = self._parser(source)
             self._curr_file = node.path  # 新增
             self._visit_TranslationUnit(included_ast)
             self._curr_file = saved_file  # 恢复
-        except FileNotFoundError as e:
-            print(f"[DEBUG] 找不到: {node.path}, 异常: {e}")  # 加这行
-            self.diag.warning(f"找不到 include 文件 '{node.path}'", node)
+        except FileNotFoundError:
+            self.diag.warning("找不到 include 文件 '{}'", node, args=(node.path,),
+                              code='GS0201')
         finally:
             self._curr_file = saved_file
     
     def _register_type_forward(self, node):
         if isinstance(node, StructDef):
-            sym = Symbol(node.name, StructType(node.name, members=None), SymbolKind.TYPE)
+            sym = Symbol(node.name, StructType(node.name, members=None), SymbolKind.TYPE,
+                         node=node, file=self._curr_file)
             self.table.define(sym)
         elif isinstance(node, TypedefDecl):
-            sym = Symbol(node.alias, VOID, SymbolKind.TYPE)  # 临时占位
+            sym = Symbol(node.alias, VOID, SymbolKind.TYPE,  # 临时占位
+                         node=node, file=self._curr_file)
             self.table.define(sym)
     
     # ══════════════════════════════════════════════════════════════════════
@@ -271,12 +380,16 @@ class GalaxyAnalyzer:
             if isinstance(decl, IncludeDirective):
                 if decl.path not in self._const_collected:
                     self._const_collected.add(decl.path)
+                    saved_file = self._curr_file
                     try:
                         source = self._file_loader(decl.path)
                         included_ast = self._parser(source)
+                        self._curr_file = decl.path     # const 符号记在声明它的文件下
                         self._collect_consts_recursive(included_ast)
                     except FileNotFoundError:
                         pass
+                    finally:
+                        self._curr_file = saved_file
             elif isinstance(decl, VarDecl) and decl.is_const:
                 self._register_global_var(decl)
             
@@ -296,10 +409,17 @@ class GalaxyAnalyzer:
             elif isinstance(decl, (FuncDecl, FuncDef)):
                 self._register_func(decl)
 
-        # 分析函数体
+        # 分析函数体（剪枝 / 并行模式下推迟到整个闭包注册完之后）
+        # checked_includes 里的文件整个跳过：调用边和 natives_used 里也就没有它们
+        if self._curr_file != self._main_file and self._curr_file in self._checked_includes:
+            self.reused_bodies += sum(1 for decl in node.decls if isinstance(decl, FuncDef))
+            return
         for decl in node.decls:
             if isinstance(decl, FuncDef):
-                self._visit_FuncDef(decl, body_only=True)
+                if self._defer_bodies:
+                    self._deferred_bodies.append((decl, self._curr_file))
+                else:
+                    self._visit_FuncDef(decl, body_only=True)
                 
 
     def _visit_IncludeDirective(self, node: IncludeDirective):
@@ -325,10 +445,10 @@ class GalaxyAnalyzer:
                 existing.gtype.members = self._build_struct_members(node)
                 return
             else:
-                self.diag.error(f"类型 '{node.name}' 重复定义", node)
+                self.diag.error("类型 '{}' 重复定义", node, args=(node.name,), code='GS0301')
                 return
         struct_type = StructType(node.name, None)   # 先占位
-        sym = Symbol(node.name, struct_type, SymbolKind.TYPE, node=node)
+        sym = Symbol(node.name, struct_type, SymbolKind.TYPE, node=node, file=self._curr_file)
         self.table.define(sym)
         struct_type.members = self._build_struct_members(node)
 
@@ -338,7 +458,7 @@ class GalaxyAnalyzer:
             mtype = self._resolve_type_spec(member.type_spec)
             for name in member.names:
                 if name in members:
-                    self.diag.error(f"结构体成员 '{name}' 重复定义", member)
+                    self.diag.error("结构体成员 '{}' 重复定义", member, args=(name,), code='GS0302')
                 else:
                     members[name] = mtype
         return members
@@ -346,9 +466,9 @@ class GalaxyAnalyzer:
     def _register_typedef(self, node: TypedefDecl):
         underlying = self._resolve_type_spec(node.type_spec)
         td_type = TypedefType(node.alias, underlying)
-        sym = Symbol(node.alias, td_type, SymbolKind.TYPE, node=node)
+        sym = Symbol(node.alias, td_type, SymbolKind.TYPE, node=node, file=self._curr_file)
         if not self.table.define(sym):
-            self.diag.error(f"类型 '{node.alias}' 重复定义", node)
+            self.diag.error("类型 '{}' 重复定义", node, args=(node.alias,), code='GS0301')
 
     def _register_func(self, node):
         """注册函数签名（FuncDecl 或 FuncDef 的签名部分）"""
@@ -362,7 +482,7 @@ class GalaxyAnalyzer:
 
         if existing:
             if existing.kind != SymbolKind.FUNC:
-                self.diag.error(f"'{func_name}' 已被定义为非函数类型", node)
+                self.diag.error("'{}' 已被定义为非函数类型", node, args=(func_name,), code='GS0303')
                 return
             # if existing.gtype != func_type:
             #     print(f"[REGISTER_FUNC] {func_name}: {func_type}, is_native={is_native}, node_type={type(node).__name__}, file={self._curr_file}")
@@ -373,29 +493,28 @@ class GalaxyAnalyzer:
             #     return
             
             if existing.gtype != func_type:
-                print(f"[REGISTER_FUNC] {func_name}")
-                print(f"  原声明: {existing.gtype}, node_type={type(existing.node).__name__}, file={getattr(existing.node, 'file', '?')}, line={getattr(existing.node, 'line', '?')}")
-                print(f"  新声明: {func_type}, node_type={type(node).__name__}, file={self._curr_file}, line={getattr(node, 'line', '?')}")
                 self.diag.error(
-                    f"函数 '{func_name}' 的重声明与原声明类型不一致\n"
-                    f"  原声明: {existing.gtype}\n"
-                    f"  新声明: {func_type}", node)
+                    "函数 '{}' 的重声明与原声明类型不一致\n"
+                    "  原声明: {}\n"
+                    "  新声明: {}", node, args=(func_name, existing.gtype, func_type), code='GS0304')
                 return
 
             if isinstance(node, FuncDef) and existing.defined:
-                print(f"[DEBUG] InitCounters 重复: existing.node={existing.node}, file={getattr(existing.node, 'file', '?')}")
-                self.diag.error(f"函数 '{func_name}' 重复定义", node)
+                self.diag.error("函数 '{}' 重复定义", node, args=(func_name,), code='GS0305')
                 return
             if isinstance(node, FuncDef):
                 existing.defined = True
+                self.call_graph.add_function(func_name, self._curr_file)
             return
 
         sym = Symbol(func_name, func_type, SymbolKind.FUNC,
                      is_native=is_native,
                      defined=isinstance(node, FuncDef),
-                     node=node)
+                     node=node, file=self._curr_file)
         self.table.define(sym)
         node.symbol = sym
+        if isinstance(node, FuncDef):
+            self.call_graph.add_function(func_name, self._curr_file)
 
     # def _register_global_var(self, node: VarDecl):
     #     gtype = self._resolve_type_spec(node.type_spec)
@@ -416,39 +535,22 @@ class GalaxyAnalyzer:
         sym = Symbol(node.name, gtype, SymbolKind.VAR,
                     is_static=node.is_static,
                     is_const=node.is_const,
-                    node=node)
-        
-        # # 记录 const int 的编译期值
-        # if node.is_const and gtype == INT and node.init:
-        #     val = self._eval_const_int(node.init)
-        #     if val is not None:
-        #         sym.const_value = val
+                    node=node, file=self._curr_file)
         
+        # 记录 const 的编译期值（int / fixed / bool / string，按声明类型转换）
         if node.is_const and node.init:
-            if gtype == INT:
-                val = self._eval_const_int(node.init)
-                if val is not None:
-                    sym.const_value = val
-            elif gtype == STRING:
-                if isinstance(node.init, StringLiteral):
-                    sym.const_value = node.init.value  # 存去掉引号的字符串
-            elif gtype == BOOL:
-                if isinstance(node.init, BoolLiteral):
-                    sym.const_value = node.init.value  # 存 True/False
-            elif gtype == FIXED:
-                if isinstance(node.init, FixedLiteral):
-                    sym.const_value = node.init.value  # 存 float
-        
+            sym.const_value = self.consts.evaluate_as(node.init, gtype)
+
         if not self.table.define(sym):
-            self.diag.error(f"全局变量 '{node.name}' 重复定义", node)
+            self.diag.error("全局变量 '{}' 重复定义", node, args=(node.name,), code='GS0306')
             return
 
         if node.init:
             init_type = self._visit(node.init)
             if not can_assign(gtype, init_type):
                 self.diag.error(
-                    f"全局变量 '{node.name}' 的初始值类型 '{init_type}' "
-                    f"无法赋值给 '{gtype}'", node.init)
+                    "全局变量 '{}' 的初始值类型 '{}' "
+                    "无法赋值给 '{}'", node.init, args=(node.name, init_type, gtype), code='GS0501')
 
     # ══════════════════════════════════════════════════════════════════════
     # 函数体分析（第二遍）
@@ -462,10 +564,12 @@ class GalaxyAnalyzer:
         func_type = func_sym.gtype
         if not isinstance(func_type, FunctionType):
             self.diag.error(
-                f"'{node.name}' 在符号表中不是函数类型，实际为 {type(func_type).__name__}({func_type})", node)
+                "'{}' 在符号表中不是函数类型，实际为 {}({})", node,
+                args=(node.name, type(func_type).__name__, func_type), code='GS0310')
             return
         self._curr_func      = func_type
         self._curr_func_name = node.name
+        self._undeclared     = set()
         self._loop_depth = 0
 
         self.table.enter_function(node.name)
@@ -476,13 +580,14 @@ class GalaxyAnalyzer:
             psym  = Symbol(param.name, ptype, SymbolKind.PARAM,
                            is_const=param.is_const, node=param)
             if not self.table.define(psym):
-                self.diag.error(f"形参 '{param.name}' 重复定义", param)
+                self.diag.error("形参 '{}' 重复定义", param, args=(param.name,), code='GS0307')
 
         self._visit_CompoundStmt(node.body)
 
         self.table.leave_scope()
         self._curr_func      = None
         self._curr_func_name = ''
+        self._undeclared     = set()
 
     # ══════════════════════════════════════════════════════════════════════
     # 语句 visit
@@ -501,20 +606,22 @@ class GalaxyAnalyzer:
     def _visit_VarDecl(self, node: VarDecl):
         gtype = self._resolve_type_spec(node.type_spec)
         if gtype == VOID:
-            self.diag.error(f"变量 '{node.name}' 不能声明为 void 类型", node)
+            self.diag.error("变量 '{}' 不能声明为 void 类型", node, args=(node.name,), code='GS0308')
             gtype = ERROR_T
 
         sym = Symbol(node.name, gtype, SymbolKind.VAR,
                      is_static=node.is_static, is_const=node.is_const, node=node)
         if not self.table.define(sym):
-            self.diag.error(f"变量 '{node.name}' 重复定义", node)
+            self.diag.error("变量 '{}' 重复定义", node, args=(node.name,), code='GS0309')
 
         if node.init:
             init_type = self._visit(node.init)
             if not isinstance(gtype, ErrorType) and not can_assign(gtype, init_type):
                 self.diag.error(
-                    f"变量 '{node.name}' 的初始值类型 '{init_type}' "
-                    f"无法赋值给 '{gtype}'", node.init)
+                    "变量 '{}' 的初始值类型 '{}' "
+                    "无法赋值给 '{}'", node.init, args=(node.name, init_type, gtype), code='GS0501')
+            if node.is_const:
+                sym.const_value = self.consts.evaluate_as(node.init, gtype)
 
         node.gtype = gtype
 
@@ -526,7 +633,7 @@ class GalaxyAnalyzer:
         cond_type = self._visit(node.cond)
         if not can_assign(BOOL, cond_type):
             self.diag.error(
-                f"if 条件表达式类型 '{cond_type}' 无法转换为 bool", node.cond)
+                "if 条件表达式类型 '{}' 无法转换为 bool", node.cond, args=(cond_type,), code='GS0502')
         self._visit(node.then_br)
         if node.else_br:
             self._visit(node.else_br)
@@ -535,7 +642,7 @@ class GalaxyAnalyzer:
         cond_type = self._visit(node.cond)
         if not can_assign(BOOL, cond_type):
             self.diag.error(
-                f"while 条件表达式类型 '{cond_type}' 无法转换为 bool", node.cond)
+                "while 条件表达式类型 '{}' 无法转换为 bool", node.cond, args=(cond_type,), code='GS0502')
         self._loop_depth += 1
         self._visit(node.body)
         self._loop_depth -= 1
@@ -547,7 +654,7 @@ class GalaxyAnalyzer:
         cond_type = self._visit(node.cond)
         if not can_assign(BOOL, cond_type):
             self.diag.error(
-                f"do-while 条件表达式类型 '{cond_type}' 无法转换为 bool", node.cond)
+                "do-while 条件表达式类型 '{}' 无法转换为 bool", node.cond, args=(cond_type,), code='GS0502')
 
     # def _visit_ForStmt(self, node: ForStmt):
     #     self.table.enter_block()   # for 自己的作用域（存放 init 中声明的变量）
@@ -575,7 +682,7 @@ class GalaxyAnalyzer:
                 cond_type = self._visit(cond_node)
                 if not can_assign(BOOL, cond_type):
                     self.diag.error(
-                        f"for 条件表达式类型 '{cond_type}' 无法转换为 bool", node.cond)
+                        "for 条件表达式类型 '{}' 无法转换为 bool", node.cond, args=(cond_type,), code='GS0502')
         if node.post:
             self._visit(node.post)
         self._loop_depth += 1
@@ -585,7 +692,7 @@ class GalaxyAnalyzer:
 
     def _visit_ReturnStmt(self, node: ReturnStmt):
         if self._curr_func is None:
-            self.diag.error("return 语句只能出现在函数内部", node)
+            self.diag.error("return 语句只能出现在函数内部", node, code='GS0601')
             return
 
         expected = self._curr_func.return_type
@@ -593,23 +700,24 @@ class GalaxyAnalyzer:
             actual = self._visit(node.value)
             if expected == VOID:
                 self.diag.error(
-                    f"void 函数 '{self._curr_func_name}' 不能有返回值", node)
+                    "void 函数 '{}' 不能有返回值", node, args=(self._curr_func_name,), code='GS0604')
             elif not can_assign(expected, actual):
                 self.diag.error(
-                    f"函数 '{self._curr_func_name}' 期望返回 '{expected}'，"
-                    f"实际返回 '{actual}'", node.value)
+                    "函数 '{}' 期望返回 '{}'，"
+                    "实际返回 '{}'", node.value,
+                    args=(self._curr_func_name, expected, actual), code='GS0503')
         else:
             if expected != VOID:
                 self.diag.error(
-                    f"函数 '{self._curr_func_name}' 必须返回 '{expected}'", node)
+                    "函数 '{}' 必须返回 '{}'", node, args=(self._curr_func_name, expected), code='GS0605')
 
     def _visit_BreakStmt(self, node: BreakStmt):
         if self._loop_depth == 0:
-            self.diag.error("break 语句只能出现在循环内部", node)
+            self.diag.error("break 语句只能出现在循环内部", node, code='GS0602')
 
     def _visit_ContinueStmt(self, node: ContinueStmt):
         if self._loop_depth == 0:
-            self.diag.error("continue 语句只能出现在循环内部", node)
+            self.diag.error("continue 语句只能出现在循环内部", node, code='GS0603')
 
     def _visit_BreakpointStmt(self, node: BreakpointStmt):
         pass   # breakpoint 始终合法
@@ -642,15 +750,32 @@ class GalaxyAnalyzer:
             # 跨文件符号暂时降级为 warning，不阻断分析
             # print(f"[DEBUG] 查找失败: '{node.name}', 当前文件={self._curr_file}, 当前作用域深度={len(self.table._scopes)}")
              # 只对用户文件报 warning，标准库文件的缺失符号忽略
-            if not self._is_stdlib_file(self._curr_file):
-                self.diag.warning(f"未声明的标识符 '{node.name}'（可能来自 include 文件）", node)
+            # 同一函数里同一个名字只报一次（其余是同一原因的连带报告）
+            if not self._is_stdlib_file(self._curr_file) and node.name not in self._undeclared:
+                self._undeclared.add(node.name)
+                self.diag.warning("未声明的标识符 '{}'（可能来自 include 文件）", node,
+                                  args=(node.name,), code='GS0401')
             # self.diag.warning(f"未声明的标识符 '{node.name}'（可能来自 include 文件）", node)
-            node.gtype = ERROR_T
+            node.gtype  = ERROR_T
+            node.symbol = None      # 复用的 AST（共享的库、编辑器里的块）上可能还留着上次的符号
             return ERROR_T
         node.gtype  = sym.gtype
         node.symbol = sym
+        if sym.kind == SymbolKind.FUNC:
+            # 调用或函数引用都算一条边（全局初始化中的引用挂在 ROOT 上）
+            self.call_graph.add_call(self._curr_func_name, sym.name)
+            if sym.is_native:
+                self._note_native(sym.name)
         return sym.gtype
 
+    def _note_native(self, name: str, file: str = None):
+        """记录 file（默认当前文件）用到了 native 函数 name"""
+        file = file or self._curr_file
+        used = self.natives_used.get(file)
+        if used is None:
+            used = self.natives_used[file] = set()
+        used.add(name)
+
     def _visit_IntLiteral(self, node: IntLiteral) -> GType:
         node.gtype = INT
         return INT
@@ -679,7 +804,7 @@ class GalaxyAnalyzer:
             if ltype == TEXT or rtype == TEXT:
                 print(f"[DEBUG] text+text: op={node.op}, left={node.left}, ltype={ltype}, right={node.right}, rtype={rtype}")
             self.diag.error(
-                f"运算符 '{node.op}' 不支持操作数类型 '{ltype}' 和 '{rtype}'", node)
+                "运算符 '{}' 不支持操作数类型 '{}' 和 '{}'", node, args=(node.op, ltype, rtype), code='GS0504')
             result = ERROR_T
         node.gtype = result
         return result
@@ -696,7 +821,8 @@ class GalaxyAnalyzer:
             if not is_arithmetic(operand_type):
                 print(f"[DEBUG] unary '{op}' on '{operand_type}': operand type={type(node.operand).__name__}, operand={node.operand}")
                 self.diag.error(
-                    f"一元运算符 '{op}' 要求数值类型，实际为 '{operand_type}'", node.operand)
+                    "一元运算符 '{}' 要求数值类型，实际为 '{}'", node.operand,
+                    args=(op, operand_type), code='GS0505')
                 node.gtype = ERROR_T
                 return ERROR_T
             node.gtype = operand_type
@@ -705,7 +831,8 @@ class GalaxyAnalyzer:
         if op == '!':
             if not can_assign(BOOL, operand_type):
                 self.diag.error(
-                    f"逻辑非 '!' 要求可转换为 bool 的类型，实际为 '{operand_type}'", node.operand)
+                    "逻辑非 '!' 要求可转换为 bool 的类型，实际为 '{}'", node.operand,
+                    args=(operand_type,), code='GS0505')
                 node.gtype = ERROR_T
                 return ERROR_T
             node.gtype = BOOL
@@ -714,13 +841,14 @@ class GalaxyAnalyzer:
         if op == '~':
             if operand_type != INT:
                 self.diag.error(
-                    f"按位取反 '~' 要求 int 类型，实际为 '{operand_type}'", node.operand)
+                    "按位取反 '~' 要求 int 类型，实际为 '{}'", node.operand,
+                    args=(operand_type,), code='GS0505')
                 node.gtype = ERROR_T
                 return ERROR_T
             node.gtype = INT
             return INT
 
-        self.diag.error(f"未知一元运算符 '{op}'", node)
+        self.diag.error("未知一元运算符 '{}'", node, args=(op,), code='GS0505')
         node.gtype = ERROR_T
         return ERROR_T
 
@@ -728,7 +856,7 @@ class GalaxyAnalyzer:
         cond_type = self._visit(node.cond)
         if not can_assign(BOOL, cond_type):
             self.diag.error(
-                f"三元运算符条件类型 '{cond_type}' 无法转换为 bool", node.cond)
+                "三元运算符条件类型 '{}' 无法转换为 bool", node.cond, args=(cond_type,), code='GS0502')
 
         then_type = self._visit(node.then_expr)
         else_type = self._visit(node.else_expr)
@@ -742,7 +870,7 @@ class GalaxyAnalyzer:
             result = else_type
         else:
             self.diag.error(
-                f"三元运算符的两个分支类型不兼容：'{then_type}' vs '{else_type}'", node)
+                "三元运算符的两个分支类型不兼容：'{}' vs '{}'", node, args=(then_type, else_type), code='GS0506')
             result = ERROR_T
 
         node.gtype = result
@@ -754,27 +882,28 @@ class GalaxyAnalyzer:
 
         # 检查左值
         if not self._is_lvalue(node.left):
-            self.diag.error("赋值运算符的左侧必须是可修改的左值", node.left)
+            self.diag.error("赋值运算符的左侧必须是可修改的左值", node.left, code='GS0507')
         elif isinstance(node.left, Identifier):
             sym = node.left.symbol
             if sym and sym.is_const:
-                self.diag.error(f"不能修改 const 变量 '{sym.name}'", node.left)
+                self.diag.error("不能修改 const 变量 '{}'", node.left, args=(sym.name,), code='GS0402')
 
         if node.op == '=':
             if not can_assign(ltype, rtype):
                 self.diag.error(
-                    f"无法将 '{rtype}' 赋值给 '{ltype}'", node)
+                    "无法将 '{}' 赋值给 '{}'", node, args=(rtype, ltype), code='GS0508')
         else:
             # 复合赋值 +=, -=, *=, /=
             op = node.op[:-1]   # 去掉 '='
             result = resolve_binary_op(op, ltype, rtype)
             if result is None:
                 self.diag.error(
-                    f"复合赋值运算符 '{node.op}' 不支持操作数类型 '{ltype}' 和 '{rtype}'", node)
+                    "复合赋值运算符 '{}' 不支持操作数类型 '{}' 和 '{}'", node,
+                    args=(node.op, ltype, rtype), code='GS0509')
             elif not can_assign(ltype, result):
                 self.diag.error(
-                    f"复合赋值 '{node.op}' 的结果类型 '{result}' "
-                    f"无法赋值给 '{ltype}'", node)
+                    "复合赋值 '{}' 的结果类型 '{}' "
+                    "无法赋值给 '{}'", node, args=(node.op, result, ltype), code='GS0509')
 
         node.gtype = ltype
         return ltype
@@ -804,7 +933,7 @@ class GalaxyAnalyzer:
         src_type = self._visit(node.expr)
         if not can_assign(target_type, src_type):
             self.diag.warning(
-                f"强制类型转换 '{src_type}' → '{target_type}' 可能不安全", node)
+                "强制类型转换 '{}' → '{}' 可能不安全", node, args=(src_type, target_type), code='GS0518')
         node.gtype = target_type
         return target_type
 
@@ -812,6 +941,11 @@ class GalaxyAnalyzer:
         callee_type = self._visit(node.callee)
         arg_types   = [self._visit(arg) for arg in node.args]
 
+        # TriggerCreate("gt_Xxx_Func") 以字符串引用触发器函数
+        if (isinstance(node.callee, Identifier) and node.callee.name == 'TriggerCreate'
+                and node.args and isinstance(node.args[0], StringLiteral)):
+            self.call_graph.add_trigger(self._curr_func_name, node.args[0].value)
+
         if isinstance(callee_type, ErrorType):
             node.gtype = ERROR_T
             return ERROR_T
@@ -825,21 +959,22 @@ class GalaxyAnalyzer:
             import traceback; traceback.print_stack()
             print(f"[DEBUG] FuncCall 类型错误: callee={self._expr_name(node.callee)}, type={callee_type}, type_class={type(callee_type).__name__}")
             self.diag.error(
-                f"'{self._expr_name(node.callee)}' 不是可调用的函数类型，实际类型={callee_type}", node.callee)
+                "'{}' 不是可调用的函数类型，实际类型={}", node.callee,
+                args=(self._expr_name(node.callee), callee_type), code='GS0510')
             node.gtype = ERROR_T
             return ERROR_T
 
         expected_params = callee_type.param_types
         if len(arg_types) != len(expected_params):
             self.diag.error(
-                f"函数调用参数数量错误：期望 {len(expected_params)} 个，"
-                f"实际传入 {len(arg_types)} 个", node)
+                "函数调用参数数量错误：期望 {} 个，"
+                "实际传入 {} 个", node, args=(len(expected_params), len(arg_types)), code='GS0511')
         else:
             for i, (expected, actual) in enumerate(zip(expected_params, arg_types)):
                 if not can_assign(expected, actual):
                     self.diag.error(
-                        f"第 {i+1} 个参数类型不匹配：期望 '{expected}'，实际 '{actual}'",
-                        node.args[i])
+                        "第 {} 个参数类型不匹配：期望 '{}'，实际 '{}'",
+                        node.args[i], args=(i+1, expected, actual), code='GS0512')
 
         ret_type = callee_type.return_type
         node.gtype = ret_type
@@ -851,7 +986,7 @@ class GalaxyAnalyzer:
 
         if index_type != INT and not isinstance(index_type, ErrorType):
             self.diag.error(
-                f"数组下标必须是 int 类型，实际为 '{index_type}'", node.index)
+                "数组下标必须是 int 类型，实际为 '{}'", node.index, args=(index_type,), code='GS0513')
 
         if isinstance(array_type, ArrayType):
             elem_type = array_type.element_type
@@ -862,7 +997,7 @@ class GalaxyAnalyzer:
             return ERROR_T
         else:
             self.diag.error(
-                f"下标运算符 '[]' 只能用于数组类型，实际为 '{array_type}'", node.array)
+                "下标运算符 '[]' 只能用于数组类型，实际为 '{}'", node.array, args=(array_type,), code='GS0514')
             node.gtype = ERROR_T
             return ERROR_T
 
@@ -880,19 +1015,19 @@ class GalaxyAnalyzer:
 
         if not isinstance(actual_type, StructType):
             self.diag.error(
-                f"成员访问 '.' 只能用于 struct 类型，实际为 '{obj_type}'", node.obj)
+                "成员访问 '.' 只能用于 struct 类型，实际为 '{}'", node.obj, args=(obj_type,), code='GS0515')
             node.gtype = ERROR_T
             return ERROR_T
 
         if actual_type.members is None:
             self.diag.error(
-                f"struct '{actual_type.name}' 尚未完整定义", node)
+                "struct '{}' 尚未完整定义", node, args=(actual_type.name,), code='GS0516')
             node.gtype = ERROR_T
             return ERROR_T
 
         if node.member not in actual_type.members:
             self.diag.error(
-                f"struct '{actual_type.name}' 中没有成员 '{node.member}'", node)
+                "struct '{}' 中没有成员 '{}'", node, args=(actual_type.name, node.member), code='GS0517')
             node.gtype = ERROR_T
             return ERROR_T
 
@@ -964,7 +1099,7 @@ class GalaxyAnalyzer:
                     size = self._eval_const_int(dim_expr)
                     if size is None:
                         # 改为 warning，不阻断分析
-                        self.diag.warning("数组大小无法静态求值，将忽略大小信息", dim_expr)
+                        self.diag.warning("数组大小无法静态求值，将忽略大小信息", dim_expr, code='GS0519')
                         #self.diag.error("数组大小必须是编译期常量整数表达式", dim_expr)
                 result = ArrayType(result, size)
             return result
@@ -973,35 +1108,10 @@ class GalaxyAnalyzer:
 
     def _eval_const_int(self, node) -> Optional[int]:
         """
-        尝试在编译期对整数常量表达式求值。
-        支持：整数字面量、const 变量、基本算术。
+        尝试在编译期对整数常量表达式求值（见 consteval.ConstEvaluator）。
         返回 None 表示无法静态求值。
         """
-        if isinstance(node, IntLiteral):
-            return node.value
-        # if isinstance(node, Identifier):
-        #     sym = self.table.lookup(node.name)
-        #     if sym and sym.is_const and isinstance(sym.gtype, BasicType):
-        #         return None   # 暂时不跟踪 const 变量的值（可扩展）
-        
-        if isinstance(node, Identifier):
-            sym = self.table.lookup(node.name)
-            print(f"[DEBUG] eval '{node.name}': found={sym is not None}, is_const={getattr(sym,'is_const',None)}, const_value={getattr(sym,'const_value',None)}")
-            if sym and sym.is_const and sym.const_value is not None:
-                return sym.const_value   # 改这里
-            return None
-        
-        if isinstance(node, BinaryOp):
-            l = self._eval_const_int(node.left)
-            r = self._eval_const_int(node.right)
-            if l is None or r is None:
-                return None
-            ops = {'+': l+r, '-': l-r, '*': l*r, '/': l//r if r else None, '%': l%r if r else None}
-            return ops.get(node.op)
-        if isinstance(node, UnaryOp) and node.op == '-':
-            v = self._eval_const_int(node.operand)
-            return -v if v is not None else None
-        return None
+        return self.consts.evaluate_int(node)
 
     def _is_lvalue(self, node: ASTNode) -> bool:
         """判断节点是否是可赋值的左值"""
@@ -0,0 +1,250 @@
+"""
+Galaxy Script 调用图
+====================
+在语义分析过程中记录「函数 → 被调函数」的边，覆盖整个 include 闭包。
+
+存储方式：
+  - 函数名映射为连续的整数 ID
+  - 边先追加到两个 array('i')（src / dst），查询时压缩成 CSR
+    （offsets + targets），重复边在压缩时去掉
+  - 可达性查询用 bytearray 标记，BFS 一遍
+
+用法：
+    graph = analyzer.call_graph
+    live = graph.reachable(['InitMap'])
+    dead = graph.unreachable()
+
+另有 collect_calls()：不做类型检查、只按语法扫描函数体里出现的名字，
+供剪枝模式在分析函数体之前先把图建出来。
+"""
+
+from __future__ import annotations
+from array import array
+from collections import deque
+from typing import Iterable, Iterator, Optional
+
+from ..tree.transformer import (
+    ASTNode, Identifier, FuncCall, StringLiteral, walk,
+)
+
+
+class CallGraph:
+    """
+    整个 include 闭包上的调用图。
+
+    节点是函数名（Galaxy Script 只有一个全局函数命名空间），
+    另有一个伪节点 ROOT，代表全局变量初始化等不属于任何函数的调用。
+    """
+
+    ROOT = '<global>'
+
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+        self._names: list[str] = []
+        self._files: list[str] = []        # 函数定义所在文件（'' 表示未定义/native）
+        self._defined = bytearray()          # 是否有函数体
+        self._trigger_refs: set[tuple[int, int]] = set()   # TriggerCreate("...")：(调用方 ID, 触发器函数 ID)
+
+        self._src = array('i')
+        self._dst = array('i')
+
+        # CSR（惰性构建，加边后失效）
+        self._offsets: Optional[array] = None
+        self._targets: Optional[array] = None
+        self._rev_offsets: Optional[array] = None
+        self._rev_targets: Optional[array] = None
+
+        self._id(self.ROOT)
+
+    # ── 构建 ────────────────────────────────────────────────────────────────
+
+    def _id(self, name: str) -> int:
+        fid = self._ids.get(name)
+        if fid is None:
+            fid = len(self._names)
+            self._ids[name] = fid
+            self._names.append(name)
+            self._files.append('')
+            self._defined.append(0)
+        return fid
+
+    def add_function(self, name: str, file: str = '', defined: bool = True) -> int:
+        """登记一个函数（FuncDef 或声明），返回其 ID"""
+        fid = self._id(name)
+        if defined:
+            self._defined[fid] = 1
+            self._files[fid] = file
+        return fid
+
+    def add_call(self, caller: Optional[str], callee: str):
+        """记录一条调用边；caller 为空表示全局上下文（ROOT）"""
+        src = self._id(caller or self.ROOT)
+        dst = self._id(callee)
+        self._src.append(src)
+        self._dst.append(dst)
+        self._offsets = None
+        self._rev_offsets = None
+
+    def add_trigger(self, caller: Optional[str], func_name: str):
+        """TriggerCreate("func") 把函数注册为触发器：既是一条边，也是一个入口"""
+        self.add_call(caller, func_name)
+        self._trigger_refs.add((self._src[-1], self._dst[-1]))
+
+    def replace_calls(self, calls: dict[str, Iterable[tuple[str, bool]]]):
+        """
+        用新的调用列表替换若干函数的出边（例如优化 pass 删掉死分支之后）。
+        calls: {调用方: [(被调函数, 是否为 TriggerCreate 引用), ...]}
+        """
+        callers = {self._id(name) for name in calls}
+        keep = [i for i, s in enumerate(self._src) if s not in callers]
+        self._src = array('i', (self._src[i] for i in keep))
+        self._dst = array('i', (self._dst[i] for i in keep))
+        self._trigger_refs = {ref for ref in self._trigger_refs if ref[0] not in callers}
+        for caller, refs in calls.items():
+            for callee, is_trigger in refs:
+                if is_trigger:
+                    self.add_trigger(caller, callee)
+                else:
+                    self.add_call(caller, callee)
+        self._offsets = None
+        self._rev_offsets = None
+
+    def merge(self, other: 'CallGraph'):
+        """
+        把另一张图（例如并行 worker 的局部图）并入本图。
+        只有对方标记为已定义的函数才覆盖定义信息；边按对方的追加顺序并入。
+        """
+        remap = array('i', bytes(4 * len(other._names)))
+        for oid, name in enumerate(other._names):
+            if other._defined[oid]:
+                remap[oid] = self.add_function(name, other._files[oid])
+            else:
+                remap[oid] = self._id(name)
+        self._src.extend(remap[s] for s in other._src)
+        self._dst.extend(remap[d] for d in other._dst)
+        self._trigger_refs |= {(remap[s], remap[d]) for s, d in other._trigger_refs}
+        self._offsets = None
+        self._rev_offsets = None
+
+    # ── CSR ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _build_csr(n: int, src: array, dst: array) -> tuple[array, array]:
+        pairs = sorted(set(zip(src, dst)))
+        offsets = array('i', bytes(4 * (n + 1)))
+        for s, _ in pairs:
+            offsets[s + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+        targets = array('i', (d for _, d in pairs))
+        return offsets, targets
+
+    def _forward(self) -> tuple[array, array]:
+        if self._offsets is None:
+            self._offsets, self._targets = self._build_csr(
+                len(self._names), self._src, self._dst)
+        return self._offsets, self._targets
+
+    def _reverse(self) -> tuple[array, array]:
+        if self._rev_offsets is None:
+            self._rev_offsets, self._rev_targets = self._build_csr(
+                len(self._names), self._dst, self._src)
+        return self._rev_offsets, self._rev_targets
+
+    # ── 查询 ────────────────────────────────────────────────────────────────
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ids
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @property
+    def edge_count(self) -> int:
+        offsets, _ = self._forward()
+        return offsets[-1]
+
+    def is_defined(self, name: str) -> bool:
+        fid = self._ids.get(name)
+        return fid is not None and bool(self._defined[fid])
+
+    def file_of(self, name: str) -> str:
+        fid = self._ids.get(name)
+        return self._files[fid] if fid is not None else ''
+
+    def functions(self, file: str = None) -> list[str]:
+        """所有有函数体的函数（可按文件过滤）"""
+        return [n for i, n in enumerate(self._names)
+                if self._defined[i] and (file is None or self._files[i] == file)]
+
+    @property
+    def triggers(self) -> set[str]:
+        return {self._names[d] for _, d in self._trigger_refs}
+
+    def callees(self, name: str) -> list[str]:
+        fid = self._ids.get(name)
+        if fid is None:
+            return []
+        offsets, targets = self._forward()
+        return [self._names[t] for t in targets[offsets[fid]:offsets[fid + 1]]]
+
+    def callers(self, name: str) -> list[str]:
+        fid = self._ids.get(name)
+        if fid is None:
+            return []
+        offsets, targets = self._reverse()
+        return [self._names[t] for t in targets[offsets[fid]:offsets[fid + 1]]]
+
+    def entry_points(self) -> list[str]:
+        """默认入口：ROOT（全局初始化）、InitMap、以及所有触发器函数"""
+        entries = [self.ROOT]
+        if 'InitMap' in self._ids:
+            entries.append('InitMap')
+        entries.extend(sorted(self.triggers))
+        return entries
+
+    def reachable(self, roots: Iterable[str] = None) -> set[str]:
+        """从 roots（默认 entry_points()）出发可达的全部函数名，含 roots 本身"""
+        if roots is None:
+            roots = self.entry_points()
+        offsets, targets = self._forward()
+        seen = bytearray(len(self._names))
+        queue = deque()
+        for name in roots:
+            fid = self._ids.get(name)
+            if fid is not None and not seen[fid]:
+                seen[fid] = 1
+                queue.append(fid)
+        while queue:
+            fid = queue.popleft()
+            for t in targets[offsets[fid]:offsets[fid + 1]]:
+                if not seen[t]:
+                    seen[t] = 1
+                    queue.append(t)
+        return {self._names[i] for i in range(len(seen)) if seen[i]}
+
+    def unreachable(self, roots: Iterable[str] = None) -> list[str]:
+        """有函数体但从 roots 不可达的函数（死代码候选）"""
+        live = self.reachable(roots)
+        return [n for n in self.functions() if n not in live]
+
+    def __repr__(self):
+        return f"CallGraph({len(self._names)} nodes, {len(self._src)} edges)"
+
+
+def collect_calls(node: ASTNode) -> Iterator[tuple[str, bool]]:
+    """
+    语法层面扫描一棵子树，产出 (名字, 是否为触发器)。
+
+    - 每个 Identifier 都产出一次（是否真的是函数由调用方查符号表决定；
+      局部变量与函数同名时会多出一条边，只会让可达集变大，不会漏）
+    - TriggerCreate("func") 的字符串参数按触发器产出
+    """
+    for n in walk(node):
+        if isinstance(n, Identifier):
+            yield n.name, False
+        elif (isinstance(n, FuncCall)
+              and isinstance(n.callee, Identifier)
+              and n.callee.name == 'TriggerCreate'
+              and n.args and isinstance(n.args[0], StringLiteral)):
+            yield n.args[0].value, True
@@ -0,0 +1,336 @@
+"""
+Galaxy Script 编译期常量求值
+============================
+对表达式做常量折叠，支持：
+  - int / fixed / bool / string 字面量
+  - const 变量（读 Symbol.const_value，由分析器在定义处写入）
+  - 算术 + - * / %、移位、位运算、比较、逻辑 && ||
+  - 一元 - + ! ~、三目 ?:、强制类型转换
+
+取值约定：
+  int    Python int，按 32 位有符号整数回绕；/ 和 % 按 C 语义向零截断
+  fixed  Python float，但总是 1/4096 的整数倍（20.12 定点数，原始值为 32 位整数）：
+         字面量按十进制精确换算后向零截断，int → fixed 乘 4096 回绕，
+         + - 在原始值上做，* / 的结果向零截断，% 按原始值取 C 余数；
+         这样比较（0.1 + 0.2 == 0.3 在 Galaxy 里为真）与运行时一致
+  bool   Python bool
+  string Python str（字面量去掉引号，不处理转义）
+
+每个节点的结果按节点缓存（含"不是常量"的结论），求得的值写到 node.const_value。
+求值途中遇到尚未登记的名字时，这一路的结果不缓存，之后可以重新求值。
+
+名字的绑定：分析进行中一律经符号表按名字查（求值总发生在声明处，当时可见的就是对的；
+复用的 AST 上 node.symbol 可能还是上一次分析、上一张符号表里的符号）；
+分析结束后（trust_symbols=True，常量折叠阶段）作用域已经关闭，改用本次分析写下的 node.symbol。
+"""
+
+from __future__ import annotations
+import math
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Optional
+
+from .type import GType, TypedefType, INT, FIXED, BOOL, STRING
+from .symbol import Symbol, SymbolKind
+from ..tree.transformer import (
+    ASTNode, Identifier, IntLiteral, FixedLiteral, BoolLiteral, StringLiteral,
+    BinaryOp, UnaryOp, TernaryOp, CastExpr,
+)
+
+
+class _NotConst:
+    def __repr__(self):
+        return 'NOT_CONST'
+
+
+NOT_CONST = _NotConst()
+
+
+def wrap_int(v: int) -> int:
+    """按 32 位有符号整数回绕"""
+    return ((v + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+FIXED_ONE = 4096          # fixed 的 1.0 对应的原始值（12 位小数）
+
+
+def _tdiv(a: int, b: int) -> int:
+    """整数除法，向零截断（C 语义）"""
+    q = abs(a) // abs(b)
+    return -q if (a < 0) != (b < 0) else q
+
+
+def _from_raw(raw: int) -> float:
+    return wrap_int(raw) / FIXED_ONE
+
+
+def fixed_raw(v) -> int:
+    """数值 → fixed 的原始值（1/4096 为单位，向零截断，不回绕）"""
+    if type(v) is float:
+        return math.trunc(v * FIXED_ONE) if math.isfinite(v) else 0
+    return v * FIXED_ONE
+
+
+def to_fixed(v) -> float:
+    """数值 → fixed 值（量化到 1/4096、按 32 位原始值回绕）"""
+    return _from_raw(fixed_raw(v))
+
+
+def fixed_literal(raw: str):
+    """fixed 字面量文本按十进制精确换算，不是合法数字时 NOT_CONST"""
+    try:
+        return _from_raw(math.trunc(Decimal(raw) * FIXED_ONE))
+    except (InvalidOperation, ValueError, OverflowError):
+        return NOT_CONST
+
+
+def _is_int(v) -> bool:
+    return type(v) is int
+
+
+def _is_num(v) -> bool:
+    return type(v) is int or type(v) is float
+
+
+def _truthy(v):
+    """可以当条件用的值（bool / 数值）转为 bool，否则 NOT_CONST"""
+    if type(v) is bool:
+        return v
+    if _is_num(v):
+        return v != 0
+    return NOT_CONST
+
+
+def coerce(value, gtype: GType):
+    """把常量值转换为目标类型的值（隐式 / 显式转换），不兼容返回 NOT_CONST"""
+    if value is NOT_CONST:
+        return NOT_CONST
+    if isinstance(gtype, TypedefType):
+        gtype = gtype.resolve()
+    if gtype is INT:
+        if _is_int(value):
+            return value
+        if type(value) is float and math.isfinite(value):
+            return wrap_int(int(value))            # 向零截断
+        return NOT_CONST
+    if gtype is FIXED:
+        return to_fixed(value) if _is_num(value) else NOT_CONST
+    if gtype is BOOL:
+        return _truthy(value)
+    if gtype is STRING:
+        return value if type(value) is str else NOT_CONST
+    return NOT_CONST
+
+
+class ConstEvaluator:
+    """
+    编译期常量求值器。
+
+    用法：
+        ev = ConstEvaluator(analyzer.table.lookup)
+        ev.evaluate(expr)       # 值，或 None（不是常量）
+        ev.evaluate_int(expr)   # 只接受 int 结果
+
+    trust_symbols: 分析器在分析结束后置为 True，此后标识符按 node.symbol 求值
+    """
+
+    def __init__(self, lookup: Callable[[str], Optional[Symbol]]):
+        self._lookup = lookup
+        self.trust_symbols = False
+        self._memo: dict[int, tuple[ASTNode, object]] = {}   # id(node) → (node, 值)
+        self._incomplete = False
+
+    # ── 对外接口 ──────────────────────────────────────────────────────────
+
+    def evaluate(self, node: ASTNode):
+        """求值，不是常量时返回 None"""
+        if node is None:
+            return None
+        value = self._eval(node)
+        return None if value is NOT_CONST else value
+
+    def evaluate_int(self, node: ASTNode) -> Optional[int]:
+        value = self.evaluate(node)
+        return value if _is_int(value) else None
+
+    def evaluate_as(self, node: ASTNode, gtype: GType):
+        """求值并转换为 gtype（const 变量定义处使用），不是常量时返回 None"""
+        if node is None:
+            return None
+        value = coerce(self._eval(node), gtype)
+        return None if value is NOT_CONST else value
+
+    # ── 缓存 ──────────────────────────────────────────────────────────────
+
+    def _eval(self, node: ASTNode):
+        hit = self._memo.get(id(node))
+        if hit is not None:
+            return hit[1]
+        outer = self._incomplete
+        self._incomplete = False
+        value = self._compute(node)
+        if value is not NOT_CONST and node.gtype is FIXED and _is_int(value):
+            value = to_fixed(value)
+        if not self._incomplete:
+            self._memo[id(node)] = (node, value)
+            if value is not NOT_CONST:
+                node.const_value = value
+        self._incomplete = self._incomplete or outer
+        return value
+
+    # ── 各类节点 ──────────────────────────────────────────────────────────
+
+    def _compute(self, node: ASTNode):
+        if isinstance(node, IntLiteral):
+            try:
+                return wrap_int(node.value)
+            except ValueError:
+                return NOT_CONST
+        if isinstance(node, FixedLiteral):
+            return fixed_literal(node.raw)
+        if isinstance(node, BoolLiteral):
+            return bool(node.value)
+        if isinstance(node, StringLiteral):
+            return node.value
+        if isinstance(node, Identifier):
+            return self._identifier(node)
+        if isinstance(node, BinaryOp):
+            return self._binary(node)
+        if isinstance(node, UnaryOp):
+            return self._unary(node)
+        if isinstance(node, TernaryOp):
+            cond = _truthy(self._eval(node.cond))
+            if cond is NOT_CONST:
+                return NOT_CONST
+            return self._eval(node.then_expr if cond else node.else_expr)
+        if isinstance(node, CastExpr):
+            return self._cast(node)
+        return NOT_CONST
+
+    def _identifier(self, node: Identifier):
+        sym = node.symbol if self.trust_symbols else None
+        if sym is None:
+            sym = self._lookup(node.name)
+            if sym is None:
+                self._incomplete = True
+                return NOT_CONST
+        if sym.is_const and sym.const_value is not None:
+            return sym.const_value
+        return NOT_CONST
+
+    def _binary(self, node: BinaryOp):
+        op = node.op
+        l = self._eval(node.left)
+        if l is NOT_CONST:
+            return NOT_CONST
+
+        # 逻辑运算短路：左边已能决定结果时不需要右边是常量
+        if op in ('&&', '||'):
+            lb = _truthy(l)
+            if lb is NOT_CONST:
+                return NOT_CONST
+            if (op == '&&' and not lb) or (op == '||' and lb):
+                return lb
+            return _truthy(self._eval(node.right))
+
+        r = self._eval(node.right)
+        if r is NOT_CONST:
+            return NOT_CONST
+
+        if op in ('==', '!='):
+            if _is_num(l) and _is_num(r) or type(l) is type(r):
+                return (l == r) == (op == '==')
+            return NOT_CONST
+
+        if type(l) is str or type(r) is str:
+            if type(l) is str and type(r) is str:
+                if op == '+':
+                    return l + r
+                if op in ('<', '>', '<=', '>='):
+                    return _compare(op, l, r)
+            return NOT_CONST
+
+        if not (_is_num(l) and _is_num(r)):
+            return NOT_CONST
+        if op in ('<', '>', '<=', '>='):
+            return _compare(op, l, r)
+
+        both_int = _is_int(l) and _is_int(r)
+        if op in ('<<', '>>', '&', '|', '^'):
+            if not both_int:
+                return NOT_CONST
+            if op == '<<':
+                return wrap_int(l << r) if 0 <= r < 32 else NOT_CONST
+            if op == '>>':
+                return l >> r if 0 <= r < 32 else NOT_CONST
+            if op == '&':
+                return l & r
+            if op == '|':
+                return l | r
+            return l ^ r
+
+        if not both_int:
+            return _fixed_binary(op, fixed_raw(l), fixed_raw(r))
+        if op == '+':
+            return wrap_int(l + r)
+        if op == '-':
+            return wrap_int(l - r)
+        if op == '*':
+            return wrap_int(l * r)
+        if op in ('/', '%'):
+            if r == 0:
+                return NOT_CONST
+            q = _tdiv(l, r)
+            return wrap_int(q) if op == '/' else wrap_int(l - r * q)
+        return NOT_CONST
+
+    def _unary(self, node: UnaryOp):
+        v = self._eval(node.operand)
+        if v is NOT_CONST:
+            return NOT_CONST
+        op = node.op
+        if op == '!':
+            b = _truthy(v)
+            return NOT_CONST if b is NOT_CONST else not b
+        if op == '-' and _is_num(v):
+            return wrap_int(-v) if _is_int(v) else _from_raw(-fixed_raw(v))
+        if op == '+' and _is_num(v):
+            return v
+        if op == '~' and _is_int(v):
+            return wrap_int(~v)
+        return NOT_CONST
+
+    def _cast(self, node: CastExpr):
+        spec = node.target_type
+        if spec is None or spec.dimensions:
+            return NOT_CONST
+        sym = self._lookup(spec.base_name)
+        if sym is None or sym.kind != SymbolKind.TYPE:
+            return NOT_CONST            # 误识别的 cast，如 (FuncName)(args)
+        return coerce(self._eval(node.expr), sym.gtype)
+
+
+def _fixed_binary(op: str, a: int, b: int):
+    """fixed 的算术，a / b 是原始值"""
+    if op == '+':
+        return _from_raw(a + b)
+    if op == '-':
+        return _from_raw(a - b)
+    if op == '*':
+        return _from_raw(_tdiv(a * b, FIXED_ONE))
+    if op in ('/', '%'):
+        if b == 0:
+            return NOT_CONST
+        if op == '/':
+            return _from_raw(_tdiv(a * FIXED_ONE, b))
+        return _from_raw(a - b * _tdiv(a, b))
+    return NOT_CONST
+
+
+def _compare(op: str, l, r) -> bool:
+    if op == '<':
+        return l < r
+    if op == '>':
+        return l > r
+    if op == '<=':
+        return l <= r
+    return l >= r
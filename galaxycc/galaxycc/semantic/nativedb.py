@@ -0,0 +1,208 @@
+"""
+Native 签名数据库
+=================
+natives.galaxy 有几千条声明，每次构造前端都逐行跑正则太浪费。
+这里把解析结果编译成一个紧凑的二进制文件（不用 pickle），之后直接读回。
+
+文件布局（小端）：
+
+    头部    magic 'GXNDB\\0' | u16 版本 | u64 源文件大小 | u64 源文件 mtime_ns
+            | u32 字符串数 | u32 签名数 | u32 函数数
+    字符串表  每项 u16 字节数 + UTF-8（类型名和函数名共用）
+    签名表    u32 数组：[返回类型, 参数个数, 参数类型...] 依次排列
+    函数表    u32 数组：[函数名, 签名下标] 成对排列
+
+相同的签名只存一份，读回时每个签名只构造一次 FunctionType（本身按结构驻留），
+几千个 native 共享几百个类型对象。
+
+头部记下源文件的大小和 mtime，is_fresh() 据此判断数据库是否过期；
+版本号不一致的文件一律视为过期，由调用方重新编译。
+
+用法：
+    loader = NativeLoader()
+    loader.load_from_file('natives.galaxy', db_path='natives.gxndb')  # 过期才重新解析
+"""
+
+from __future__ import annotations
+import os
+import re
+import struct
+from array import array
+from pathlib import Path
+
+from .type import (
+    GType, FunctionType, ArrayType, ERROR_T,
+    VOID, INT, FIXED, BOOL, STRING, TEXT, BUILTIN_TYPES, HANDLE_TYPES,
+)
+
+MAGIC = b'GXNDB\0'
+VERSION = 1
+
+_HEADER = struct.Struct('<6sHQQIII')
+_LEN = struct.Struct('<H')
+_RE_ARRAY = re.compile(r'\[(\d*)\]$')
+
+
+class NativeDBError(Exception):
+    """数据库文件损坏、版本不符或格式错误"""
+
+
+# ─── 类型名 ↔ GType ─────────────────────────────────────────────────────────
+
+def _type_name(t: GType) -> str:
+    return repr(t)      # int / unit / int[4] / <error>
+
+
+def _type_from_name(name: str) -> GType:
+    m = _RE_ARRAY.search(name)
+    if m:
+        size = int(m.group(1)) if m.group(1) else None
+        return ArrayType(_type_from_name(name[:m.start()]), size)
+    for t in (VOID, INT, FIXED, BOOL, STRING, TEXT):
+        if t.name == name:
+            return t
+    if name in HANDLE_TYPES:
+        return HANDLE_TYPES[name]
+    return BUILTIN_TYPES.get(name, ERROR_T)
+
+
+# ─── u32 表 ──────────────────────────────────────────────────────────────────
+
+_BIG_ENDIAN = struct.pack('=I', 1) != struct.pack('<I', 1)
+
+
+def _pack_u32(data: array) -> bytes:
+    """u32 数组 → u32 长度 + 小端字节"""
+    if _BIG_ENDIAN:
+        data = array('I', data)
+        data.byteswap()
+    return struct.pack('<I', len(data)) + data.tobytes()
+
+
+def _unpack_u32(blob: bytes, pos: int) -> tuple[array, int]:
+    (n,) = struct.unpack_from('<I', blob, pos)
+    pos += 4
+    if len(blob) < pos + n * 4:
+        raise ValueError('u32 表越界')
+    data = array('I')
+    data.frombytes(blob[pos:pos + n * 4])
+    if _BIG_ENDIAN:
+        data.byteswap()
+    return data, pos + n * 4
+
+
+# ─── 写 ──────────────────────────────────────────────────────────────────────
+
+def source_stamp(source: str | Path) -> tuple[int, int]:
+    """源文件的 (大小, mtime_ns)，用于判断数据库是否过期"""
+    st = os.stat(source)
+    return st.st_size, st.st_mtime_ns
+
+
+def write_db(path: str | Path, funcs: dict[str, FunctionType],
+             stamp: tuple[int, int] = (0, 0)) -> int:
+    """把 { 函数名: FunctionType } 写成数据库，返回写出的字节数"""
+    strings: dict[str, int] = {}
+    sigs: dict[int, int] = {}              # id(FunctionType) → 签名下标（类型已驻留）
+    sig_data = array('I')
+    func_data = array('I')
+
+    def sid(s: str) -> int:
+        idx = strings.get(s)
+        if idx is None:
+            idx = strings[s] = len(strings)
+        return idx
+
+    for name, ftype in funcs.items():
+        sig = sigs.get(id(ftype))
+        if sig is None:
+            sig = sigs[id(ftype)] = len(sigs)
+            sig_data.append(sid(_type_name(ftype.return_type)))
+            sig_data.append(len(ftype.param_types))
+            sig_data.extend(sid(_type_name(p)) for p in ftype.param_types)
+        func_data.append(sid(name))
+        func_data.append(sig)
+
+    parts = [_HEADER.pack(MAGIC, VERSION, stamp[0], stamp[1],
+                          len(strings), len(sigs), len(funcs))]
+    for s in strings:
+        raw = s.encode('utf-8')
+        parts.append(_LEN.pack(len(raw)))
+        parts.append(raw)
+    parts.append(_pack_u32(sig_data))
+    parts.append(_pack_u32(func_data))
+    blob = b''.join(parts)
+
+    tmp = Path(str(path) + '.tmp')
+    tmp.write_bytes(blob)
+    os.replace(tmp, path)                          # 原子替换，并发读者不会读到半个文件
+    return len(blob)
+
+
+# ─── 读 ──────────────────────────────────────────────────────────────────────
+
+def read_header(path: str | Path) -> tuple[int, tuple[int, int]]:
+    """只读头部，返回 (版本, 源文件戳)"""
+    with open(path, 'rb') as f:
+        head = f.read(_HEADER.size)
+    if len(head) < _HEADER.size:
+        raise NativeDBError(f"文件过短: {path}")
+    magic, version, size, mtime, *_ = _HEADER.unpack(head)
+    if magic != MAGIC:
+        raise NativeDBError(f"不是 native 数据库: {path}")
+    return version, (size, mtime)
+
+
+def is_fresh(db_path: str | Path, source: str | Path) -> bool:
+    """数据库存在、版本一致且与源文件的大小 / mtime 相符"""
+    try:
+        version, stamp = read_header(db_path)
+        return version == VERSION and stamp == source_stamp(source)
+    except (OSError, NativeDBError):
+        return False
+
+
+def read_db(path: str | Path) -> dict[str, FunctionType]:
+    """读回数据库，返回 { 函数名: FunctionType }"""
+    blob = Path(path).read_bytes()
+    try:
+        magic, version, _, _, n_strings, n_sigs, n_funcs = _HEADER.unpack_from(blob)
+    except struct.error:
+        raise NativeDBError(f"文件过短: {path}") from None
+    if magic != MAGIC:
+        raise NativeDBError(f"不是 native 数据库: {path}")
+    if version != VERSION:
+        raise NativeDBError(f"数据库版本 {version}，当前支持 {VERSION}: {path}")
+
+    try:
+        pos = _HEADER.size
+        strings = []
+        for _ in range(n_strings):
+            (n,) = _LEN.unpack_from(blob, pos)
+            pos += 2
+            strings.append(blob[pos:pos + n].decode('utf-8'))
+            pos += n
+
+        sig_data, pos = _unpack_u32(blob, pos)
+        func_data, pos = _unpack_u32(blob, pos)
+
+        types = {}
+        def gtype(idx):
+            t = types.get(idx)
+            if t is None:
+                t = types[idx] = _type_from_name(strings[idx])
+            return t
+
+        sigs = []
+        i = 0
+        for _ in range(n_sigs):
+            ret, n = sig_data[i], sig_data[i + 1]
+            sigs.append(FunctionType(gtype(ret), [gtype(p) for p in sig_data[i + 2:i + 2 + n]]))
+            i += 2 + n
+
+        funcs = {}
+        for k in range(0, 2 * n_funcs, 2):
+            funcs[strings[func_data[k]]] = sigs[func_data[k + 1]]
+    except (IndexError, ValueError, struct.error, UnicodeDecodeError) as e:
+        raise NativeDBError(f"数据库损坏: {path} ({e})") from None
+    return funcs
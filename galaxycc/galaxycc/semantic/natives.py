@@ -10,18 +10,22 @@ Galaxy Script 的标准库（SC2 Editor 的 native 函数）数量庞大（数
 典型的 native 声明文件就是星际争霸II安装目录下的：
   Mods/Core.SC2Mod/Base.SC2Data/TriggerLibs/natives.galaxy
 
+解析结果可以编译成二进制签名数据库（见 nativedb.py），之后跳过正则扫描直接读回。
+
 用法示例：
     loader = NativeLoader()
-    loader.load_from_file("path/to/natives.galaxy")
-    builtins = loader.get_builtins()   # dict[str, FunctionType]
+    loader.load_from_file("path/to/natives.galaxy", db_path="natives.gxndb")
+    scope = loader.get_scope()         # NativeScope，所有分析器共享
 
-    analyzer = GalaxyAnalyzer(native_builtins=builtins)
+    analyzer = GalaxyAnalyzer(native_builtins=scope)
 """
 
 from __future__ import annotations
 import re
 from pathlib import Path
 
+from . import nativedb
+from .symbol import NativeScope
 from .type import (
     GType, FunctionType, ArrayType,
     VOID, INT, FIXED, BOOL, STRING, TEXT, ERROR_T,
@@ -78,18 +82,51 @@ class NativeLoader:
     def __init__(self):
         self._funcs: dict[str, FunctionType] = {}
         self._load_errors: list[str] = []
+        self._scope: NativeScope | None = None     # get_scope 的缓存，加载新函数时作废
 
-    def load_from_file(self, path: str | Path) -> int:
+    def load_from_file(self, path: str | Path, db_path: str | Path = None) -> int:
         """
         从 .galaxy 文件加载 native 函数。
         返回成功加载的函数数量。
+
+        给了 db_path 时：数据库与源文件相符就直接读数据库；
+        否则照常解析源文件，再把结果写成数据库供下次使用。
         """
         path = Path(path)
         if not path.exists():
             self._load_errors.append(f"文件不存在: {path}")
             return 0
 
-        count = 0
+        if db_path is not None and nativedb.is_fresh(db_path, path):
+            try:
+                return self.load_from_db(db_path)
+            except (OSError, nativedb.NativeDBError) as e:
+                self._load_errors.append(str(e))     # 读失败就退回解析源文件
+
+        funcs = self._parse_file(path)
+        self._funcs.update(funcs)
+        self._scope = None
+        if db_path is not None:
+            try:
+                nativedb.write_db(db_path, funcs, nativedb.source_stamp(path))
+            except OSError as e:
+                self._load_errors.append(f"写 native 数据库失败: {e}")
+        return len(funcs)
+
+    def load_from_db(self, db_path: str | Path) -> int:
+        """从 nativedb 编译好的数据库加载，返回函数数量（格式错误抛 NativeDBError）"""
+        funcs = nativedb.read_db(db_path)
+        self._funcs.update(funcs)
+        self._scope = None
+        return len(funcs)
+
+    def save_db(self, db_path: str | Path, source: str | Path = None) -> int:
+        """把已加载的全部函数写成数据库；给了 source 时记下它的大小 / mtime 供过期检查"""
+        stamp = nativedb.source_stamp(source) if source is not None else (0, 0)
+        return nativedb.write_db(db_path, self._funcs, stamp)
+
+    def _parse_file(self, path: Path) -> dict[str, FunctionType]:
+        funcs = {}
         with open(path, encoding='utf-8', errors='replace') as f:
             for line in f:
                 line = line.strip()
@@ -104,10 +141,9 @@ class NativeLoader:
                 ret_type = _parse_type_str(ret_str)
                 param_types = self._parse_params(params_str)
 
-                self._funcs[func_name] = FunctionType(ret_type, param_types)
-                count += 1
+                funcs[func_name] = FunctionType(ret_type, param_types)
 
-        return count
+        return funcs
 
     def load_from_dict(self, definitions: dict[str, tuple]):
         """
@@ -123,11 +159,21 @@ class NativeLoader:
             ret_type    = _parse_type_str(ret_str)
             param_types = [_parse_type_str(p) for p in param_strs]
             self._funcs[name] = FunctionType(ret_type, param_types)
+        self._scope = None
 
     def get_builtins(self) -> dict[str, FunctionType]:
-        """返回已加载的函数类型字典"""
+        """返回已加载的函数类型字典（副本）"""
         return dict(self._funcs)
 
+    def get_scope(self) -> NativeScope:
+        """
+        返回已加载函数的 NativeScope。
+        只在加载了新函数后重建一次，之后每次调用返回同一个对象，可直接交给各个分析器共享。
+        """
+        if self._scope is None:
+            self._scope = NativeScope(self._funcs)
+        return self._scope
+
     @property
     def load_errors(self):
         return list(self._load_errors)
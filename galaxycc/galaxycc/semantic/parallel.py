@@ -0,0 +1,159 @@
+"""
+函数体并行分析
+==============
+全局注册（类型、全局变量、函数签名）完成后，各个 FuncDef 的函数体只读全局作用域，
+互相独立，可以分给多个进程做。
+
+做法：
+  - 用 fork 启动进程池，子进程直接继承父进程里已经注册好的分析器（符号表、AST），
+    不需要序列化符号表
+  - 函数体按原顺序切成连续的块，每块交给一个 worker
+  - worker 用空的 DiagnosticBag / CallGraph 分析自己的块，返回：
+        诊断列表、局部调用图、以及函数体子树里每个节点的 gtype / const_value / symbol
+        （节点按 walk 顺序编号，不传 AST 本身）
+  - node.symbol 指向全局符号的，回父进程后按名字重新查表；
+    其余（局部变量 / 形参等）带上 Symbol 的全部字段，在父进程里重建一个 Symbol
+    （worker 里同一个符号只建一个），node 按编号指回父进程里的声明节点
+  - 父进程按块的顺序合并，结果与顺序分析一致（诊断顺序、gtype、符号、调用边）
+  - 设了诊断上限（fail_fast / max_diagnostics）时，每个 worker 在自己的块里到上限即停，
+    父进程按顺序合并到上限为止
+
+平台不支持 fork（Windows）时退回顺序分析。
+"""
+
+from __future__ import annotations
+import multiprocessing
+import os
+from typing import TYPE_CHECKING
+
+from galaxycc.error import DiagnosticLimitReached
+from .callgraph import CallGraph
+from .symbol import Symbol
+from ..tree.transformer import walk
+
+if TYPE_CHECKING:
+    from .analyzer import GalaxyAnalyzer
+
+# 函数体少于这个数时，开进程池不划算
+PARALLEL_MIN_BODIES = 32
+
+# 局部符号回传的字段（node 另按编号传）
+_SYMBOL_FIELDS = ('gtype', 'kind', 'is_static', 'is_native', 'is_const',
+                  'defined', 'file', 'const_value')
+
+# fork 之前设置，子进程通过继承拿到
+_worker_analyzer: 'GalaxyAnalyzer' = None
+_worker_bodies: list = None
+
+
+def can_fork() -> bool:
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def effective_jobs(jobs: int) -> int:
+    """实际可用的进程数：不超过 CPU 核数；不支持 fork 时为 1"""
+    if jobs <= 1 or not can_fork():
+        return 1
+    return max(1, min(jobs, os.cpu_count() or 1))
+
+
+def _analyze_chunk(bounds: tuple[int, int]):
+    """worker：分析 [start, end) 范围的函数体"""
+    start, end = bounds
+    analyzer = _worker_analyzer
+    analyzer.diag = analyzer.diag.spawn()
+    analyzer.call_graph = CallGraph()
+
+    annotations = []
+    for i in range(start, end):
+        decl, file = _worker_bodies[i]
+        analyzer._curr_file = file
+        try:
+            analyzer._visit_FuncDef(decl, body_only=True)
+        except DiagnosticLimitReached:
+            break                   # 块内已到上限，后面的函数体不必再做
+
+        nodes = list(walk(decl))
+        index_of = {id(n): idx for idx, n in enumerate(nodes)}
+        types = []
+        consts = []
+        symbols = []
+        locals_ = []                # [(名字, 声明节点编号或 None, 字段值), ...]
+        local_of = {}               # id(Symbol) → 在 locals_ 里的下标
+        for idx, n in enumerate(nodes):
+            if n.gtype is not None:
+                types.append((idx, n.gtype))
+            if n.const_value is not None:
+                consts.append((idx, n.const_value))
+            sym = n.symbol
+            if sym is None:
+                continue
+            if analyzer.table.lookup_global(sym.name) is sym:
+                symbols.append((idx, sym.name))
+                continue
+            k = local_of.get(id(sym))
+            if k is None:
+                k = local_of[id(sym)] = len(locals_)
+                locals_.append((sym.name, index_of.get(id(sym.node)),
+                                tuple(getattr(sym, f) for f in _SYMBOL_FIELDS)))
+            symbols.append((idx, k))
+        annotations.append((types, consts, symbols, locals_))
+
+    diags = list(analyzer.diag)
+    for d in diags:
+        d.message               # 在子进程里格式化，不把模板实参（类型对象）传回父进程
+    return diags, analyzer.call_graph, annotations
+
+
+def analyze_bodies_parallel(analyzer: 'GalaxyAnalyzer', bodies: list, jobs: int):
+    """
+    并行分析 bodies（[(FuncDef, 所在文件), ...]），结果合并回 analyzer。
+    """
+    global _worker_analyzer, _worker_bodies
+
+    n = len(bodies)
+    n_chunks = min(n, jobs * 4)
+    step, extra = divmod(n, n_chunks)
+    chunks = []
+    start = 0
+    for i in range(n_chunks):
+        end = start + step + (1 if i < extra else 0)
+        chunks.append((start, end))
+        start = end
+
+    _worker_analyzer, _worker_bodies = analyzer, bodies
+    try:
+        ctx = multiprocessing.get_context('fork')
+        with ctx.Pool(processes=jobs) as pool:
+            results = pool.map(_analyze_chunk, chunks)
+    finally:
+        _worker_analyzer, _worker_bodies = None, None
+
+    # 按块顺序合并，保证与顺序分析的结果一致；
+    # 设了诊断上限时，合并到上限会抛 DiagnosticLimitReached，由 analyze() 收尾
+    for (start, end), (diags, graph, annotations) in zip(chunks, results):
+        analyzer.call_graph.merge(graph)
+        for d in diags:
+            analyzer.diag.add(d)
+        for (decl, file), (types, consts, symbols, locals_) in zip(bodies[start:end], annotations):
+            nodes = list(walk(decl))
+            for idx, gtype in types:
+                nodes[idx].gtype = gtype
+            for idx, value in consts:
+                nodes[idx].const_value = value
+            local_syms = [_rebuild_symbol(nodes, *entry) for entry in locals_]
+            for idx, ref in symbols:
+                if isinstance(ref, int):
+                    nodes[idx].symbol = local_syms[ref]
+                    continue
+                sym = nodes[idx].symbol = analyzer.table.lookup_global(ref)
+                if sym is not None and sym.is_native:
+                    analyzer._note_native(ref, file)
+
+
+def _rebuild_symbol(nodes: list, name: str, decl_idx, values: tuple) -> Symbol:
+    """按 worker 传回的字段重建局部符号，node 指回父进程里的声明节点"""
+    sym = Symbol(name, None, None, node=None if decl_idx is None else nodes[decl_idx])
+    for field, value in zip(_SYMBOL_FIELDS, values):
+        setattr(sym, field, value)
+    return sym
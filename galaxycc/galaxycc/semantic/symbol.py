@@ -11,6 +11,7 @@ Galaxy Script 特性：
 """
 
 from enum import Enum, auto
+from types import MappingProxyType
 from .type import GType
 
 
@@ -35,10 +36,11 @@ class Symbol:
         is_const:   const 修饰
         defined:  函数是否已有函数体（用于检测重定义）
         node:     对应的 Lark Tree 节点（用于报错定位）
+        file:     声明所在文件（主文件名或 include 路径；全局符号才记，native 为空）
     """
     def __init__(self, name: str, gtype: GType, kind: SymbolKind, *,
                  is_static=False, is_native=False, is_const=False,
-                 defined=True, node=None):
+                 defined=True, node=None, file: str = ''):
         self.name      = name
         self.gtype     = gtype
         self.kind      = kind
@@ -47,6 +49,7 @@ class Symbol:
         self.is_const  = is_const
         self.defined   = defined
         self.node      = node
+        self.file      = file
         self.const_value = None   # 加这行
 
     def __repr__(self):
@@ -77,14 +80,78 @@ class Scope:
         return self._table.values()
 
 
+class _NativeSymbol(Symbol):
+    """NativeScope 里的符号：多个分析器共享，构造后只读"""
+    __frozen = False
+
+    def __init__(self, name: str, gtype: GType):
+        super().__init__(name, gtype, SymbolKind.FUNC, is_native=True)
+        self.__frozen = True
+
+    def __setattr__(self, key, value):
+        if self.__frozen:
+            raise AttributeError(f"native 符号 '{self.name}' 是共享只读的，不能修改 {key}")
+        super().__setattr__(key, value)
+
+
+class NativeScope:
+    """
+    不可变的 native 函数作用域，位于全局作用域之下。
+
+    natives.galaxy 有几千个函数，以前每个分析器都为每个 native 新建 Symbol；
+    现在前端构造一次 NativeScope，所有分析器（含 fork 出的子进程）共享它。
+    符号表在全局作用域查不到时才查这里；在全局定义同名符号视为重复定义，
+    与 native 直接登记在全局作用域时的行为一致。
+
+    Symbol 是惰性创建的：构造时只保存 { 名字: FunctionType }，
+    某个名字第一次被查到时才建 Symbol 并缓存（脚本一般只用到几百个 native）。
+    """
+    def __init__(self, funcs: dict = None):
+        self._funcs = MappingProxyType(dict(funcs or {}))
+        self._symbols: dict[str, _NativeSymbol] = {}
+
+    def lookup_local(self, name: str):
+        sym = self._symbols.get(name)
+        if sym is None:
+            ftype = self._funcs.get(name)
+            if ftype is None:
+                return None
+            sym = self._symbols[name] = _NativeSymbol(name, ftype)
+        return sym
+
+    def symbols(self):
+        """全部 native 符号（会把没建的 Symbol 都建出来，调试用）"""
+        return [self.lookup_local(name) for name in self._funcs]
+
+    @property
+    def functions(self):
+        """{ 名字: FunctionType }（只读，不建 Symbol；补全列表用）"""
+        return self._funcs
+
+    @property
+    def materialized(self) -> int:
+        """已经建出 Symbol 的 native 数"""
+        return len(self._symbols)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._funcs
+
+    def __len__(self):
+        return len(self._funcs)
+
+
+_EMPTY_NATIVES = NativeScope()
+
+
 class SymbolTable:
     """
     嵌套作用域符号表。
 
     作用域层次：
-      global → function-param → block → block …
+      native（共享，只读）→ global → function-param → block → block …
     """
-    def __init__(self):
+    def __init__(self, natives: NativeScope = None):
+        self._natives = natives or _EMPTY_NATIVES
         self._scopes: list[Scope] = []
         self._enter('global')
 
@@ -119,6 +186,8 @@ class SymbolTable:
 
     def define(self, sym: Symbol) -> bool:
         """在当前作用域定义符号，重复定义返回 False"""
+        if len(self._scopes) == 1 and sym.name in self._natives:
+            return False
         return self.current_scope.define(sym)
 
     def lookup(self, name: str) -> Symbol | None:
@@ -127,23 +196,170 @@ class SymbolTable:
             sym = scope.lookup_local(name)
             if sym is not None:
                 return sym
-        return None
+        return self._natives.lookup_local(name)
 
     def lookup_local(self, name: str) -> Symbol | None:
-        """仅在当前作用域查找（用于检测同层重定义）"""
-        return self.current_scope.lookup_local(name)
+        """仅在当前作用域查找（用于检测同层重定义；全局层包括 native）"""
+        sym = self.current_scope.lookup_local(name)
+        if sym is None and len(self._scopes) == 1:
+            return self._natives.lookup_local(name)
+        return sym
 
     def lookup_global(self, name: str) -> Symbol | None:
-        """仅查全局作用域"""
-        return self._scopes[0].lookup_local(name)
+        """仅查全局作用域（包括 native）"""
+        sym = self._scopes[0].lookup_local(name)
+        return sym if sym is not None else self._natives.lookup_local(name)
+
+    @property
+    def natives(self) -> NativeScope:
+        return self._natives
+
+    def globals(self) -> list[Symbol]:
+        """全局作用域里的符号（不含 native），按定义顺序"""
+        return list(self._scopes[0].symbols())
 
     # ── 调试辅助 ────────────────────────────────────────────────────────────
 
     def dump(self) -> str:
-        lines = []
+        lines = [f"[native: {len(self._natives)} 个函数]"] if len(self._natives) else []
         for i, scope in enumerate(self._scopes):
             indent = '  ' * i
             lines.append(f"{indent}[{scope.name}]")
             for sym in scope.symbols():
                 lines.append(f"{indent}  {sym}")
         return '\n'.join(lines)
+
+
+class FlatSymbolTable:
+    """
+    扁平符号表：与 SymbolTable 接口相同，内部不再为每层 {} 建 Scope。
+
+      - 全局作用域是一个普通 dict（不会被弹出）
+      - 局部名字映射到一个绑定栈 [(depth, Symbol), ...]，栈顶即当前可见的绑定
+      - 每定义一个局部名字就记一笔到 _log；离开作用域时按 _marks 记下的位置
+        把本层记录的名字逐个弹栈撤销
+
+    lookup 只查一次 dict（全局没有时再查共享的 NativeScope），enter/leave 不分配对象。
+    """
+    def __init__(self, natives: NativeScope = None):
+        self._natives = natives or _EMPTY_NATIVES
+        self._globals: dict[str, Symbol] = {}
+        self._bindings: dict[str, list[tuple[int, Symbol]]] = {}
+        self._log: list[str] = []           # 局部定义的名字，按定义顺序
+        self._marks: list[int] = []         # 每层局部作用域开始时 _log 的长度
+        self._scope_names: list[str] = ['global']
+
+    # ── 作用域管理 ──────────────────────────────────────────────────────────
+
+    def _enter(self, name: str = ''):
+        self._marks.append(len(self._log))
+        self._scope_names.append(name)
+
+    def enter_global(self):
+        """已在 __init__ 中建立，外部一般不需调用"""
+        pass
+
+    def enter_function(self, func_name: str):
+        self._enter(f'func:{func_name}')
+
+    def enter_block(self):
+        self._enter('block')
+
+    def leave_scope(self):
+        if not self._marks:
+            return
+        mark = self._marks.pop()
+        self._scope_names.pop()
+        log = self._log
+        bindings = self._bindings
+        for i in range(len(log) - 1, mark - 1, -1):
+            name = log[i]
+            stack = bindings[name]
+            stack.pop()
+            if not stack:
+                del bindings[name]
+        del log[mark:]
+
+    @property
+    def current_scope(self) -> Scope:
+        """当前作用域的快照（新建的 Scope，修改它不会影响符号表）"""
+        depth = len(self._marks)
+        scope = Scope(self._scope_names[-1])
+        if depth == 0:
+            scope._table = dict(self._globals)
+        else:
+            for name in self._log[self._marks[-1]:]:
+                scope._table[name] = self._bindings[name][-1][1]
+        return scope
+
+    @property
+    def is_global(self) -> bool:
+        return not self._marks
+
+    # ── 符号操作 ────────────────────────────────────────────────────────────
+
+    def define(self, sym: Symbol) -> bool:
+        """在当前作用域定义符号，重复定义返回 False"""
+        depth = len(self._marks)
+        if depth == 0:
+            if sym.name in self._globals or sym.name in self._natives:
+                return False
+            self._globals[sym.name] = sym
+            return True
+        stack = self._bindings.get(sym.name)
+        if stack is None:
+            self._bindings[sym.name] = [(depth, sym)]
+        elif stack[-1][0] == depth:
+            return False
+        else:
+            stack.append((depth, sym))
+        self._log.append(sym.name)
+        return True
+
+    def lookup(self, name: str) -> Symbol | None:
+        """从最内层作用域向外查找"""
+        stack = self._bindings.get(name)
+        if stack is not None:
+            return stack[-1][1]
+        sym = self._globals.get(name)
+        return sym if sym is not None else self._natives.lookup_local(name)
+
+    def lookup_local(self, name: str) -> Symbol | None:
+        """仅在当前作用域查找（用于检测同层重定义；全局层包括 native）"""
+        depth = len(self._marks)
+        if depth == 0:
+            return self.lookup_global(name)
+        stack = self._bindings.get(name)
+        if stack is not None and stack[-1][0] == depth:
+            return stack[-1][1]
+        return None
+
+    def lookup_global(self, name: str) -> Symbol | None:
+        """仅查全局作用域（包括 native）"""
+        sym = self._globals.get(name)
+        return sym if sym is not None else self._natives.lookup_local(name)
+
+    @property
+    def natives(self) -> NativeScope:
+        return self._natives
+
+    def globals(self) -> list[Symbol]:
+        """全局作用域里的符号（不含 native），按定义顺序"""
+        return list(self._globals.values())
+
+    # ── 调试辅助 ────────────────────────────────────────────────────────────
+
+    def dump(self) -> str:
+        levels: list[list[Symbol]] = [list(self._globals.values())]
+        levels.extend([] for _ in self._marks)
+        for name in self._log:
+            for depth, sym in self._bindings[name]:
+                if sym not in levels[depth]:
+                    levels[depth].append(sym)
+        lines = [f"[native: {len(self._natives)} 个函数]"] if len(self._natives) else []
+        for i, (name, syms) in enumerate(zip(self._scope_names, levels)):
+            indent = '  ' * i
+            lines.append(f"{indent}[{name}]")
+            for sym in syms:
+                lines.append(f"{indent}  {sym}")
+        return '\n'.join(lines)
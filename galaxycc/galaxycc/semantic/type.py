@@ -7,33 +7,81 @@ Galaxy Script 是星际争霸II编辑器的脚本语言，类似于C语言，
 但有一套专属的内置"句柄"类型（如 unit、trigger、region 等）。
 """
 
+import weakref
+
 
 class GType:
-    """所有类型的基类"""
+    """
+    所有类型的基类。
+
+    类型对象是 hash-consed 的：BasicType / HandleType / NullType / ErrorType 按名字
+    唯一，ArrayType / FunctionType 经工厂（__new__）查表，结构相同就返回同一个对象。
+    每个类型在创建时算好：
+        _key    精确结构键（含数组 size；struct / typedef 用对象 id，按名义区分）
+        _shape  忽略所有数组 size 后的规范对象（相等性不看 size）
+        _pure   只由可驻留类型组成（不含 struct / typedef / error）
+        _hash   预先计算的哈希值
+        _tid    标量类型（basic / handle / null / error）的稠密编号，其余为 -1，
+                用于 can_assign / resolve_binary_op 查表
+    两个 _pure 类型相等当且仅当 _shape 是同一对象；
+    含 struct / typedef / error 的类型退回逐项比较，语义与驻留前一致。
+    """
+    _key  = None
+    _pure = False
+    _hash = 0
+    _tid  = -1
+
     def __eq__(self, other):
-        return isinstance(other, self.__class__)
+        return self is other or isinstance(other, self.__class__)
 
     def __hash__(self):
-        return hash(repr(self))
+        return self._hash
 
     def __repr__(self):
         return self.__class__.__name__
 
 
+# 标量类型登记表：下标即 _tid。新登记标量类型时作废已编译的规则表（见文件末尾）
+_SCALAR_TYPES: list = []
+_ASSIGN_TABLE: list = None
+_BINOP_TABLE:  list = None
+
+
+def _register_scalar(t: GType):
+    global _ASSIGN_TABLE, _BINOP_TABLE
+    t._tid = len(_SCALAR_TYPES)
+    _SCALAR_TYPES.append(t)
+    _ASSIGN_TABLE = _BINOP_TABLE = None
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # 基础标量类型
 # ──────────────────────────────────────────────────────────────────────────────
 
 class BasicType(GType):
     """基础标量类型（int、fixed、bool、string、void …）"""
-    def __init__(self, name: str):
-        self.name = name
+    _interned: dict = {}
+
+    def __new__(cls, name: str):
+        t = cls._interned.get(name)
+        if t is None:
+            t = super().__new__(cls)
+            t.name  = name
+            t._key  = ('basic', name)
+            t._pure = True
+            t._hash = hash(name)
+            t._shape = t
+            _register_scalar(t)
+            cls._interned[name] = t
+        return t
+
+    def __reduce__(self):
+        return (BasicType, (self.name,))
 
     def __eq__(self, other):
-        return isinstance(other, BasicType) and self.name == other.name
+        return self is other
 
-    def __hash__(self):
-        return hash(self.name)
+    __hash__ = GType.__hash__
 
     def __repr__(self):
         return self.name
@@ -44,14 +92,28 @@ class HandleType(GType):
     Galaxy Script 的句柄类型（unit、trigger、region 等）。
     句柄类型在语义上是不透明的引用，不能做算术，只能比较和传参。
     """
-    def __init__(self, name: str):
-        self.name = name
+    _interned: dict = {}
+
+    def __new__(cls, name: str):
+        t = cls._interned.get(name)
+        if t is None:
+            t = super().__new__(cls)
+            t.name  = name
+            t._key  = ('handle', name)
+            t._pure = True
+            t._hash = hash(('handle', name))
+            t._shape = t
+            _register_scalar(t)
+            cls._interned[name] = t
+        return t
+
+    def __reduce__(self):
+        return (HandleType, (self.name,))
 
     def __eq__(self, other):
-        return isinstance(other, HandleType) and self.name == other.name
+        return self is other
 
-    def __hash__(self):
-        return hash(('handle', self.name))
+    __hash__ = GType.__hash__
 
     def __repr__(self):
         return self.name
@@ -62,16 +124,47 @@ class HandleType(GType):
 # ──────────────────────────────────────────────────────────────────────────────
 
 class ArrayType(GType):
-    """数组类型，支持多维（Galaxy Script 用 int[8][8] 语法）"""
-    def __init__(self, element_type: GType, size=None):
-        self.element_type = element_type
-        self.size = size          # None 表示在初始化时推断
+    """
+    数组类型，支持多维（Galaxy Script 用 int[8][8] 语法）。
+    按 (元素类型, size) 驻留；相等性忽略 size（各维都忽略），比较的是 _shape。
+    """
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, element_type: GType, size=None):
+        key = ('array', element_type._key, size)
+        try:
+            t = cls._interned.get(key)
+        except TypeError:           # size 不可哈希：不驻留
+            key, t = None, None
+        if t is None:
+            t = super().__new__(cls)
+            t.element_type = element_type
+            t.size  = size          # None 表示在初始化时推断
+            t._key  = key
+            t._pure = element_type._pure
+            t._hash = hash(('array', element_type))
+            elem_shape = element_type._shape
+            if size is None and elem_shape is element_type:
+                t._shape = t
+            else:
+                t._shape = ArrayType(elem_shape)
+            if key is not None:
+                cls._interned[key] = t
+        return t
+
+    def __reduce__(self):
+        return (ArrayType, (self.element_type, self.size))
 
     def __eq__(self, other):
-        return isinstance(other, ArrayType) and self.element_type == other.element_type
+        if self is other:
+            return True
+        if not isinstance(other, ArrayType):
+            return False
+        if self._pure and other._pure:
+            return self._shape is other._shape
+        return self.element_type == other.element_type
 
-    def __hash__(self):
-        return hash(('array', self.element_type))
+    __hash__ = GType.__hash__
 
     def __repr__(self):
         size_str = str(self.size) if self.size is not None else ''
@@ -79,18 +172,46 @@ class ArrayType(GType):
 
 
 class FunctionType(GType):
-    """函数类型（返回类型 + 参数类型列表）"""
-    def __init__(self, return_type: GType, param_types: list):
-        self.return_type = return_type
-        self.param_types = param_types or []
+    """
+    函数类型（返回类型 + 参数类型列表）。
+    按结构键驻留；param_types 为共享列表，不要原地修改。
+    """
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, return_type: GType, param_types: list):
+        param_types = list(param_types or [])
+        key = ('func', return_type._key, tuple(p._key for p in param_types))
+        t = cls._interned.get(key)
+        if t is None:
+            t = super().__new__(cls)
+            t.return_type = return_type
+            t.param_types = param_types
+            t._key  = key
+            t._pure = return_type._pure and all(p._pure for p in param_types)
+            t._hash = hash(('func', return_type, tuple(param_types)))
+            shapes = [p._shape for p in param_types]
+            if (return_type._shape is return_type
+                    and all(sp is p for sp, p in zip(shapes, param_types))):
+                t._shape = t
+            else:
+                t._shape = FunctionType(return_type._shape, shapes)
+            cls._interned[key] = t
+        return t
+
+    def __reduce__(self):
+        return (FunctionType, (self.return_type, self.param_types))
 
     def __eq__(self, other):
-        return (isinstance(other, FunctionType) and
-                self.return_type == other.return_type and
+        if self is other:
+            return True
+        if not isinstance(other, FunctionType):
+            return False
+        if self._pure and other._pure:
+            return self._shape is other._shape
+        return (self.return_type == other.return_type and
                 self.param_types == other.param_types)
 
-    def __hash__(self):
-        return hash(('func', self.return_type, tuple(self.param_types)))
+    __hash__ = GType.__hash__
 
     def __repr__(self):
         params = ', '.join(map(str, self.param_types))
@@ -98,26 +219,31 @@ class FunctionType(GType):
 
 
 class StructType(GType):
-    """结构体类型"""
+    """结构体类型（名义类型，不驻留：members 在前向声明后才填）"""
     def __init__(self, name: str, members: dict = None):
         self.name = name
         self.members = members  # {field_name: GType}，None 表示前向声明未完成
+        self._key  = ('struct', id(self))
+        self._hash = hash(('struct', name))
+        self._shape = self
 
     def __eq__(self, other):
         return isinstance(other, StructType) and self.name == other.name
 
-    def __hash__(self):
-        return hash(('struct', self.name))
+    __hash__ = GType.__hash__
 
     def __repr__(self):
         return f"struct {self.name}"
 
 
 class TypedefType(GType):
-    """typedef 别名类型"""
+    """typedef 别名类型（名义类型，不驻留）"""
     def __init__(self, name: str, underlying: GType):
         self.name = name
         self.underlying = underlying
+        self._key  = ('typedef', id(self))
+        self._hash = hash(('typedef', name))
+        self._shape = self
 
     def resolve(self) -> GType:
         """递归解析到最终类型"""
@@ -131,8 +257,7 @@ class TypedefType(GType):
             return self.name == other.name
         return self.resolve() == other
 
-    def __hash__(self):
-        return hash(('typedef', self.name))
+    __hash__ = GType.__hash__
 
     def __repr__(self):
         return self.name
@@ -143,25 +268,55 @@ class TypedefType(GType):
 # ──────────────────────────────────────────────────────────────────────────────
 
 class NullType(GType):
-    """null 字面量的类型，可赋给任何句柄类型"""
+    """null 字面量的类型，可赋给任何句柄类型（单例）"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            t = super().__new__(cls)
+            t._key  = ('null',)
+            t._pure = True
+            t._hash = hash('null')
+            t._shape = t
+            _register_scalar(t)
+            cls._instance = t
+        return cls._instance
+
+    def __reduce__(self):
+        return (NullType, ())
+
     def __repr__(self):
         return 'null'
 
 
 class ErrorType(GType):
     """
-    语义错误恢复类型。
+    语义错误恢复类型（单例）。
     当子表达式已经报过错时，父节点使用 ErrorType，
     避免产生大量级联错误。
     """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            t = super().__new__(cls)
+            t._key  = ('error',)
+            t._hash = hash('error')
+            t._shape = t
+            _register_scalar(t)
+            cls._instance = t
+        return cls._instance
+
+    def __reduce__(self):
+        return (ErrorType, ())
+
     def __repr__(self):
         return '<error>'
 
     def __eq__(self, other):
         return True   # ErrorType 与一切类型"兼容"，阻断级联错误
 
-    def __hash__(self):
-        return hash('error')
+    __hash__ = GType.__hash__
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -225,9 +380,10 @@ def is_orderable(t: GType) -> bool:
     """可以用 < > <= >= 比较"""
     return is_numeric(t) or t == STRING
 
-def can_assign(dst: GType, src: GType) -> bool:
+def _can_assign_rules(dst: GType, src: GType) -> bool:
     """
-    判断 src 能否赋值给 dst（隐式类型转换规则）。
+    判断 src 能否赋值给 dst（隐式类型转换规则）——规则链本体。
+    标量类型之间的结果由它编译成表；typedef / struct / array 走这里。
 
     Galaxy Script 的转换规则远比 C 严格：
     - int  ↔ fixed 可以相互赋值（隐式转换）
@@ -267,9 +423,9 @@ def can_assign(dst: GType, src: GType) -> bool:
         return can_assign(dst, src.resolve())
     return False
 
-def resolve_binary_op(op: str, ltype: GType, rtype: GType):
+def _resolve_binary_op_rules(op: str, ltype: GType, rtype: GType):
     """
-    给定二元运算符和两个操作数类型，返回结果类型。
+    给定二元运算符和两个操作数类型，返回结果类型——规则链本体。
     无法推导时返回 None。
     """
     if isinstance(ltype, ErrorType) or isinstance(rtype, ErrorType):
@@ -311,14 +467,86 @@ def resolve_binary_op(op: str, ltype: GType, rtype: GType):
         if ltype == NULL_T or rtype == NULL_T:
             return BOOL
         if is_comparable(ltype) and is_comparable(rtype):
-            if can_assign(ltype, rtype) or can_assign(rtype, ltype):
+            if _can_assign_rules(ltype, rtype) or _can_assign_rules(rtype, ltype):
                 return BOOL
         return None
 
     # 逻辑
     if op in ('&&', '||'):
-        if can_assign(BOOL, ltype) and can_assign(BOOL, rtype):
+        if _can_assign_rules(BOOL, ltype) and _can_assign_rules(BOOL, rtype):
             return BOOL
         return None
 
     return None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# 规则表（标量类型之间的结果预先算好）
+# ──────────────────────────────────────────────────────────────────────────────
+#
+#   _ASSIGN_TABLE[dst._tid][src._tid]            -> bool
+#   _BINOP_TABLE[_OP_ID[op]][l._tid][r._tid]     -> GType | None
+#
+# 首次调用时由上面的规则链逐项求值生成；之后又登记了新的标量类型则作废重建。
+# 任一操作数不是标量（typedef / struct / array / function）时走规则链。
+
+BINARY_OPS = (
+    '+', '-', '*', '/', '%', '<<', '>>', '&', '|', '^',
+    '<', '>', '<=', '>=', '==', '!=', '&&', '||',
+)
+_OP_ID = {op: i for i, op in enumerate(BINARY_OPS)}
+
+
+def _build_tables():
+    global _ASSIGN_TABLE, _BINOP_TABLE
+    scalars = list(_SCALAR_TYPES)
+    _ASSIGN_TABLE = [[_can_assign_rules(d, s) for s in scalars] for d in scalars]
+    _BINOP_TABLE = [
+        [[_resolve_binary_op_rules(op, l, r) for r in scalars] for l in scalars]
+        for op in BINARY_OPS
+    ]
+
+
+def can_assign(dst: GType, src: GType) -> bool:
+    """
+    判断 src 能否赋值给 dst（隐式类型转换规则，见 _can_assign_rules）。
+    标量类型直接查表。
+    """
+    i, j = dst._tid, src._tid
+    if i >= 0 and j >= 0:
+        if _ASSIGN_TABLE is None:
+            _build_tables()
+        return _ASSIGN_TABLE[i][j]
+    return _can_assign_rules(dst, src)
+
+
+def resolve_binary_op(op: str, ltype: GType, rtype: GType):
+    """
+    给定二元运算符和两个操作数类型，返回结果类型（规则见 _resolve_binary_op_rules）。
+    无法推导时返回 None。标量类型直接查表。
+    """
+    i, j = ltype._tid, rtype._tid
+    k = _OP_ID.get(op)
+    if i >= 0 and j >= 0 and k is not None:
+        if _BINOP_TABLE is None:
+            _build_tables()
+        return _BINOP_TABLE[k][i][j]
+    return _resolve_binary_op_rules(op, ltype, rtype)
+
+
+def verify_tables() -> list:
+    """
+    穷举核对规则表与规则链：所有标量类型对 × 所有运算符。
+    返回不一致的条目列表（空列表表示完全一致）。
+    """
+    if _ASSIGN_TABLE is None:
+        _build_tables()
+    mismatches = []
+    for d in _SCALAR_TYPES:
+        for s in _SCALAR_TYPES:
+            if can_assign(d, s) != _can_assign_rules(d, s):
+                mismatches.append(('=', d, s))
+            for op in BINARY_OPS:
+                if resolve_binary_op(op, d, s) is not _resolve_binary_op_rules(op, d, s):
+                    mismatches.append((op, d, s))
+    return mismatches
@@ -27,13 +27,17 @@ class ASTNode:
 
     Attributes:
         line, col: 源码位置（由 Transformer 从 meta 填入）
+        offset:    源码中的字符偏移（Lark start_pos，0 起）
         gtype:     语义分析后填写的类型（GType 实例）
         symbol:    语义分析后填写的符号引用（Symbol 实例）
+        const_value: 编译期常量值（常量求值后填写；None 表示不是常量或未求值）
     """
     line: int = -1
     col:  int = -1
+    offset: int = -1
     gtype = None
     symbol = None
+    const_value = None
 
     def _pos(self):
         return f"{self.line}:{self.col}"
@@ -304,6 +308,36 @@ class Initializer(ASTNode):
     items: List[ASTNode] = field(default_factory=list)
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# 遍历辅助
+# ──────────────────────────────────────────────────────────────────────────────
+
+def iter_children(node: ASTNode):
+    """按字段顺序产出直接子节点（list 字段展开，嵌套 list 也展开）"""
+    for value in node.__dict__.values():
+        if isinstance(value, ASTNode):
+            yield value
+        elif isinstance(value, list):
+            stack = [iter(value)]
+            while stack:
+                item = next(stack[-1], None)
+                if item is None:
+                    stack.pop()
+                elif isinstance(item, ASTNode):
+                    yield item
+                elif isinstance(item, list):
+                    stack.append(iter(item))
+
+
+def walk(node: ASTNode):
+    """前序遍历整棵子树（显式栈，深层嵌套不会爆递归）"""
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        yield n
+        stack.extend(reversed(list(iter_children(n))))
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Transformer
 # ──────────────────────────────────────────────────────────────────────────────
@@ -329,9 +363,17 @@ class GalaxyTransformer(Transformer):
 
     @staticmethod
     def _set_pos(node: ASTNode, meta) -> ASTNode:
-        if meta:
-            node.line = getattr(meta, 'line', -1)
-            node.col  = getattr(meta, 'column', -1)
+        if meta and not getattr(meta, 'empty', False):
+            node.line   = getattr(meta, 'line', -1)
+            node.col    = getattr(meta, 'column', -1)
+            node.offset = getattr(meta, 'start_pos', -1)
+        return node
+
+    @staticmethod
+    def _set_tok_pos(node: ASTNode, tok) -> ASTNode:
+        node.line   = getattr(tok, 'line', -1)
+        node.col    = getattr(tok, 'column', -1)
+        node.offset = getattr(tok, 'start_pos', -1)
         return node
 
     # ── 顶层 ────────────────────────────────────────────────────────────────
@@ -765,10 +807,11 @@ class GalaxyTransformer(Transformer):
 
     @v_args(meta=True)
     def selection_statement(self, meta, items):
-        # IF "(" expr ")" stmt [ELSE stmt]
-        cond    = items[1]
-        then_br = items[2]
-        else_br = items[3] if len(items) > 3 else None
+        # IF "(" expr ")" stmt [ELSE stmt]（ELSE 是具名终结符，会出现在 items 里）
+        parts   = [i for i in items[1:] if not _is_tok(i, 'ELSE')]
+        cond    = parts[0]
+        then_br = parts[1]
+        else_br = parts[2] if len(parts) > 2 else None
         node = IfStmt(cond=cond, then_br=then_br, else_br=else_br)
         return self._set_pos(node, meta)
 
@@ -778,7 +821,9 @@ class GalaxyTransformer(Transformer):
         if kw == 'while':
             node = WhileStmt(cond=items[1], body=items[2])
         elif kw == 'do':
-            node = DoWhileStmt(body=items[1], cond=items[2])
+            # DO stmt WHILE "(" expr ")" ";"（WHILE 同样留在 items 里）
+            parts = [i for i in items[1:] if not _is_tok(i, 'WHILE')]
+            node = DoWhileStmt(body=parts[0], cond=parts[1])
         else:  # for
             # FOR "(" init_stmt cond_stmt [post_expr] ")" body
             init = items[1]
@@ -1037,10 +1082,7 @@ class GalaxyTransformer(Transformer):
         tok = items[0]
         # IDENTIFIER token → Identifier 节点（只在表达式位置转换）
         if isinstance(tok, Token) and tok.type == 'IDENTIFIER':
-            node = Identifier(name=str(tok))
-            node.line = getattr(tok, 'line', -1)
-            node.col  = getattr(tok, 'column', -1)
-            return node
+            return self._set_tok_pos(Identifier(name=str(tok)), tok)
         # 其他情况（常量、字符串、括号表达式）直接透传
         return tok
     
@@ -1061,34 +1103,23 @@ class GalaxyTransformer(Transformer):
             node = FixedLiteral(raw=raw)
         else:
             node = IntLiteral(raw=raw)
-        node.line = getattr(tok, 'line', -1)
-        node.col  = getattr(tok, 'column', -1)
-        return node
+        return self._set_tok_pos(node, tok)
 
     @v_args(meta=True)
     def STRING_LITERAL(self, tok):
-        node = StringLiteral(raw=_str(tok))
-        node.line = getattr(tok, 'line', -1)
-        node.col  = getattr(tok, 'column', -1)
-        return node
+        return self._set_tok_pos(StringLiteral(raw=_str(tok)), tok)
 
     @v_args(meta=True)
     def TRUE(self, tok):
-        node = BoolLiteral(value=True)
-        node.line = getattr(tok, 'line', -1)
-        return node
+        return self._set_tok_pos(BoolLiteral(value=True), tok)
 
     @v_args(meta=True)
     def FALSE(self, tok):
-        node = BoolLiteral(value=False)
-        node.line = getattr(tok, 'line', -1)
-        return node
+        return self._set_tok_pos(BoolLiteral(value=False), tok)
 
     @v_args(meta=True)
     def NULL(self, tok):
-        node = NullLiteral()
-        node.line = getattr(tok, 'line', -1)
-        return node
+        return self._set_tok_pos(NullLiteral(), tok)
 
     # ── 初始化列表 ───────────────────────────────────────────────────────────
 
@@ -0,0 +1,409 @@
+"""
+分层工作区
+==========
+SC2 的 mod / campaign 是一层层叠起来的：core → liberty → swarm → void，
+多人对战的 *multi、合作模式的 starcoop、突变因子 mutators、战役 campaigns 再叠在上面。
+上层的 base.sc2data 会遮盖下层同名的库（include "TriggerLibs/VoidMultiLib_h"
+在 balancemulti 里找到的是它自己那份，而不是 voidmulti 的）。
+
+Workspace 把这种分层建模出来：
+
+  Layer            一个 .sc2mod / .sc2campaign 目录：自己的 base.sc2data、
+                   base.sc2maps 里的地图脚本、依赖的下层
+  search_path      本层在前、依赖按"上层先于下层"排好的 base.sc2data 列表，
+                   include 按这个顺序查找，遮盖关系自然成立
+  analyze()        按依赖顺序逐层分析。一个库文件的函数体只在它所在的层检查一次，
+                   之后上层（以及同层后面的文件）include 它时只注册签名，不再重查；
+                   AST 由前端的 share_include_asts 缓存共享。
+                   全语料分析不再把 core.sc2mod 重复分析几十遍
+
+cascviewer 导出的目录里没有依赖声明，依赖关系来自 KNOWN_DEPENDENCIES，
+不认识的包按所在目录取 GROUP_DEPENDENCIES，再不行就只依赖 core；
+构造时给 dependencies={...} 可以覆盖。
+
+用法：
+    ws = Workspace('cascviewer_galaxy_scripts')
+    frontend = GalaxyFrontend(grammar_file=..., corpus=ws.corpus, share_include_asts=True)
+    report = ws.analyze(frontend, dedup_includes=True)
+    print(report.summary())
+"""
+
+from __future__ import annotations
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .batch import BatchRunner, BatchReport, FileReport
+from .corpus import Corpus
+from .includes import IncludeIndex
+from .prescan import scan_declarations
+from .pipeline import GalaxyFrontend
+
+PACKAGE_SUFFIXES = ('.sc2mod', '.sc2campaign')
+DATA_DIR = 'base.sc2data'
+MAPS_DIR = 'base.sc2maps'
+
+# 包名（目录名，小写）→ 直接依赖，上层在前
+KNOWN_DEPENDENCIES: dict[str, tuple[str, ...]] = {
+    'core.sc2mod':                           (),
+    'liberty.sc2mod':                        ('core.sc2mod',),
+    'swarm.sc2mod':                          ('liberty.sc2mod',),
+    'void.sc2mod':                           ('swarm.sc2mod',),
+    'voidprologue.sc2mod':                   ('swarm.sc2mod',),
+    'libertymulti.sc2mod':                   ('liberty.sc2mod',),
+    'swarmmulti.sc2mod':                     ('swarm.sc2mod', 'libertymulti.sc2mod'),
+    'voidmulti.sc2mod':                      ('void.sc2mod', 'swarmmulti.sc2mod'),
+    'balancemulti.sc2mod':                   ('voidmulti.sc2mod',),
+    'balancemultilanmethodcleanedup.sc2mod': ('voidmulti.sc2mod',),
+    'balancemultislowwarpprism.sc2mod':      ('voidmulti.sc2mod',),
+    'challenges.sc2mod':                     ('liberty.sc2mod',),
+    'frontiers.sc2mod':                      ('void.sc2mod',),
+    'starcoop.sc2mod':                       ('void.sc2mod',),
+    'warclassicsystem.sc2mod':               ('void.sc2mod',),
+    'warclassic.sc2mod':                     ('warclassicsystem.sc2mod',),
+    'warcoopdata.sc2mod':                    ('warclassic.sc2mod',),
+    'warmeleeai.sc2mod':                     ('warclassic.sc2mod',),
+    'campaigncommon.sc2mod':                 ('void.sc2mod',),
+    'novacampaign.sc2mod':                   ('campaigncommon.sc2mod',),
+    'libertystory.sc2campaign':              ('liberty.sc2mod',),
+    'liberty.sc2campaign':                   ('libertystory.sc2campaign',),
+    'swarmstory.sc2campaign':                ('swarm.sc2mod', 'libertystory.sc2campaign'),
+    'swarm.sc2campaign':                     ('swarmstory.sc2campaign',),
+    'swarmstoryutil.sc2mod':                 ('swarmstory.sc2campaign',),
+    'voidstory.sc2campaign':                 ('void.sc2mod', 'swarmstory.sc2campaign'),
+    'void.sc2campaign':                      ('voidstory.sc2campaign',),
+}
+
+# 不在上表里的包：按所在目录名取依赖
+GROUP_DEPENDENCIES: dict[str, tuple[str, ...]] = {
+    'mutators':    ('starcoop.sc2mod',),
+    'legends':     ('warcoopdata.sc2mod',),
+    'progression': ('warcoopdata.sc2mod',),
+    'warcoop':     ('warclassic.sc2mod',),
+    'starcoop':    ('void.sc2mod',),
+    'missionpacks': ('campaigncommon.sc2mod',),
+}
+
+DEFAULT_DEPENDENCIES = ('core.sc2mod',)
+
+
+@dataclass
+class Layer:
+    """工作区里的一个包（.sc2mod / .sc2campaign 目录）"""
+    name:     str                              # 目录名（小写），也是依赖表里的键
+    root:     Path
+    deps:     tuple[str, ...] = ()             # 直接依赖（工作区里不存在的已换成它的依赖）
+    data_dir: Optional[Path] = None            # base.sc2data（没有时为 None）
+    libraries: list[Path] = field(default_factory=list)   # base.sc2data 下的 .galaxy
+    maps:      list[Path] = field(default_factory=list)   # base.sc2maps 下的地图脚本
+
+    @property
+    def files(self) -> list[Path]:
+        return self.libraries + self.maps
+
+    def map_groups(self) -> dict[Path, list[Path]]:
+        """地图脚本按所在的 .sc2map 目录分组（地图目录里的 AI 脚本等由 mapscript include）"""
+        groups: dict[Path, list[Path]] = {}
+        for path in self.maps:
+            map_dir = next((p for p in path.parents if p.name.lower().endswith('.sc2map')),
+                           path.parent)
+            groups.setdefault(map_dir, []).append(path)
+        return groups
+
+    def __repr__(self):
+        return (f"Layer({self.name}, deps={list(self.deps)}, "
+                f"{len(self.libraries)} libs, {len(self.maps)} maps)")
+
+
+@dataclass
+class WorkspaceReport:
+    """
+    Workspace.analyze 的结果。每层的库文件一批、每个地图目录一批，
+    batches 的键是层名或 "层名:地图目录"
+    """
+    batches: dict[str, BatchReport] = field(default_factory=dict)
+    reused_bodies: int = 0        # 因已检查过而跳过的函数体（累计）
+    elapsed: float = 0.0
+
+    @property
+    def files(self) -> list[FileReport]:
+        return [f for r in self.batches.values() for f in r.files]
+
+    @property
+    def total_errors(self) -> int:
+        return sum(r.total_errors for r in self.batches.values())
+
+    @property
+    def total_warnings(self) -> int:
+        return sum(r.total_warnings for r in self.batches.values())
+
+    @property
+    def clean(self) -> bool:
+        return all(r.clean for r in self.batches.values())
+
+    def summary(self) -> str:
+        failed = sum(len(r.failed) for r in self.batches.values())
+        layers = len({k.split(':', 1)[0] for k in self.batches})
+        return (f"{layers} 层，{len(self.files)} 个文件："
+                f"{self.total_errors} 错误, {self.total_warnings} 警告，"
+                f"失败文件 {failed} 个（耗时 {self.elapsed:.1f}s）\n"
+                f"复用已检查的函数体 {self.reused_bodies} 个")
+
+
+class _CheckedIncludes:
+    """
+    GalaxyAnalyzer 的 checked_includes：include 路径按当前层的索引解析，
+    落在已分析过的文件上就算"已检查"
+    """
+
+    def __init__(self, resolve, key, done: set[str]):
+        self._resolve, self._key, self._done = resolve, key, done
+
+    def __contains__(self, include_path) -> bool:
+        target = self._resolve(include_path)
+        return target is not None and self._key(target) in self._done
+
+
+class Workspace:
+    """
+    cascviewer 导出目录（或任意含 .sc2mod / .sc2campaign 的目录树）的分层模型。
+
+    Args:
+        root: 工作区根目录，递归查找所有包
+        dependencies: 覆盖 / 补充依赖表 { 包名: (依赖, ...) }
+        corpus: 源文件缓存，不给时新建；分析用的前端应共用同一个
+    """
+
+    def __init__(self, root: str | Path, dependencies: dict[str, Iterable[str]] = None,
+                 corpus: Corpus = None):
+        self.root = Path(root)
+        self.corpus = corpus if corpus is not None else Corpus()
+        overrides = {k.lower(): tuple(v) for k, v in (dependencies or {}).items()}
+        self.layers: dict[str, Layer] = {}
+        self._dir_index: dict[str, IncludeIndex] = {}     # 包名 → 它的 base.sc2data 的索引
+        self._layer_index: dict[str, IncludeIndex] = {}   # 包名 → 整条搜索路径的索引
+        self._scans: dict = {}                            # 源码文本 → prescan 结果
+
+        for pkg in self._find_packages():
+            name = pkg.name.lower()
+            if name in self.layers:
+                continue                                  # 同名包只认第一个（按路径排序）
+            if name in overrides:
+                deps = overrides[name]
+            elif name in KNOWN_DEPENDENCIES:
+                deps = KNOWN_DEPENDENCIES[name]
+            else:
+                deps = GROUP_DEPENDENCIES.get(pkg.parent.name.lower(), DEFAULT_DEPENDENCIES)
+            layer = self.layers[name] = Layer(name, pkg, tuple(deps))
+            for child in pkg.iterdir():
+                lower = child.name.lower()
+                if lower == DATA_DIR and child.is_dir():
+                    layer.data_dir = child
+                    layer.libraries = sorted(child.rglob('*.galaxy'))
+                elif lower == MAPS_DIR and child.is_dir():
+                    layer.maps = sorted(child.rglob('*.galaxy'))
+
+        # 工作区里没有的依赖用它自己的依赖顶替（void 缺了 swarm 就直接接 liberty）
+        known = {**KNOWN_DEPENDENCIES, **overrides}
+        for layer in self.layers.values():
+            deps, seen, pending = [], {layer.name}, list(layer.deps)
+            while pending:
+                d = pending.pop(0)
+                if d in seen:
+                    continue
+                seen.add(d)
+                if d in self.layers:
+                    deps.append(d)
+                else:
+                    pending[:0] = known.get(d, ())
+            layer.deps = tuple(deps)
+
+    def _find_packages(self) -> list[Path]:
+        found = []
+        for dirpath, dirnames, _ in os.walk(self.root):
+            keep = []
+            for d in sorted(dirnames):
+                if d.lower().endswith(PACKAGE_SUFFIXES):
+                    found.append(Path(dirpath, d))      # 包里不会再嵌套包，不往下走
+                else:
+                    keep.append(d)
+            dirnames[:] = keep
+        return found
+
+    # ── 分层查询 ───────────────────────────────────────────────────────
+
+    def __getitem__(self, name: str) -> Layer:
+        return self.layers[name.lower()]
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self.layers
+
+    def __iter__(self):
+        return iter(self.layers.values())
+
+    def linearize(self, name: str) -> list[str]:
+        """name 及其全部依赖，上层在前（每层都排在它依赖的层前面）"""
+        post: list[str] = []
+        seen: set[str] = set()
+        stack = [(name.lower(), False)]
+        while stack:
+            n, expanded = stack.pop()
+            if expanded:
+                post.append(n)
+                continue
+            if n in seen:
+                continue
+            seen.add(n)
+            stack.append((n, True))
+            for dep in reversed(self.layers[n].deps):
+                stack.append((dep, False))
+        post.reverse()
+        return post
+
+    def order(self) -> list[str]:
+        """所有层的分析顺序：被依赖的层在前"""
+        done: list[str] = []
+        seen: set[str] = set()
+        for name in self.layers:
+            for n in reversed(self.linearize(name)):
+                if n not in seen:
+                    seen.add(n)
+                    done.append(n)
+        return done
+
+    def dependents(self, name: str) -> list[str]:
+        """直接或间接依赖 name 的层"""
+        name = name.lower()
+        return [n for n in self.layers if n != name and name in self.linearize(n)]
+
+    def search_path(self, name: str) -> list[Path]:
+        """name 这一层 include 查找用的 base.sc2data 列表，上层在前"""
+        return [self.layers[n].data_dir for n in self.linearize(name)
+                if self.layers[n].data_dir is not None]
+
+    def index(self, name: str) -> IncludeIndex:
+        """name 这一层的 include 索引；每个 base.sc2data 在整个工作区里只遍历一次"""
+        name = name.lower()
+        index = self._layer_index.get(name)
+        if index is None:
+            parts = [self._data_index(n) for n in self.linearize(name)]
+            index = self._layer_index[name] = IncludeIndex.chain(p for p in parts if p is not None)
+        return index
+
+    def _data_index(self, name: str) -> Optional[IncludeIndex]:
+        part = self._dir_index.get(name)
+        if part is None and self.layers[name].data_dir is not None:
+            part = self._dir_index[name] = IncludeIndex([self.layers[name].data_dir])
+        return part
+
+    def map_index(self, layer: str, map_dir: str | Path) -> tuple[IncludeIndex, list[str]]:
+        """
+        地图目录的 include 索引：地图目录自己 → 额外依赖的层 → 所在层的搜索路径。
+
+        有些地图还依赖所在包之外的 mod（挑战地图用 challenges.sc2mod、
+        虚空序章地图用 voidprologue.sc2mod）。地图里在所在层找不到的 include，
+        到其余各层自己的 base.sc2data 里找，找到的层作为额外依赖排在地图目录之后。
+        返回 (索引, 额外依赖的层名)
+        """
+        layer = layer.lower()
+        base = self.index(layer)
+        own = IncludeIndex([map_dir])
+        index = IncludeIndex.chain([own, base])
+        extra: list[str] = []
+        missing = set()
+        for path in sorted(Path(map_dir).rglob('*.galaxy')):
+            try:
+                text = self.corpus.load(path).text
+            except OSError:
+                continue
+            decls = self._scans.get(text)
+            if decls is None:
+                decls = self._scans[text] = scan_declarations(text)
+            missing.update(inc for inc in decls.includes if index.resolve(inc) is None)
+        if not missing:
+            return index, extra
+        in_path = set(self.linearize(layer))
+        for name in self.order():
+            if name in in_path or self._data_index(name) is None:
+                continue
+            found = {inc for inc in missing if self._dir_index[name].resolve(inc) is not None}
+            if found:
+                extra.append(name)
+                missing -= found
+                if not missing:
+                    break
+        parts = [own] + [self._dir_index[n] for n in extra] + [base]
+        return IncludeIndex.chain(parts), extra
+
+    def resolve(self, include_path: str, layer: str) -> Optional[str]:
+        """在 layer 这一层里 include_path 解析到的文件（考虑遮盖）"""
+        return self.index(layer).resolve(include_path)
+
+    def layer_of(self, path: str | Path) -> Optional[Layer]:
+        """文件所属的层"""
+        path = Path(os.path.abspath(path))
+        for layer in self.layers.values():
+            if path.is_relative_to(os.path.abspath(layer.root)):
+                return layer
+        return None
+
+    # ── 分析 ───────────────────────────────────────────────────────────
+
+    def analyze(self, frontend: GalaxyFrontend, layers: Iterable[str] = None,
+                on_result=None, **runner_options) -> WorkspaceReport:
+        """
+        按依赖顺序逐层分析。每层先分析库文件，再逐个地图目录分析地图脚本，
+        每批内部按 include 拓扑序；
+        一个文件分析完后，之后 include 它的文件都不再检查它的函数体。
+        因此报告只含诊断：各文件分析结果里的调用图 / natives_used 不含这些 include 的函数体。
+
+        Args:
+            frontend: 已加载 native 的前端，建议 share_include_asts=True、corpus=self.corpus；
+                      分析过程中会切换它的 include_index
+            layers: 只分析这些层（依赖的下层仍会先分析）；None 为全部
+            on_result: 每个文件分析完的回调 on_result(批次名, FileReport)，批次名见 WorkspaceReport
+            runner_options: 其余传给 BatchRunner 的参数（fail_fast、dedup_includes、writers…）
+        """
+        if layers is None:
+            names = self.order()
+        else:
+            wanted = {n for name in layers for n in self.linearize(name)}
+            names = [n for n in self.order() if n in wanted]
+
+        report = WorkspaceReport()
+        done: set[str] = set()
+        key = frontend.corpus.key
+
+        def run(label: str, index: IncludeIndex, paths: list[Path]) -> bool:
+            frontend.include_index = index
+
+            def finished(r: FileReport):
+                done.add(key(r.path))
+                if on_result is not None:
+                    on_result(label, r)
+
+            runner = BatchRunner(frontend, on_result=finished, order_includes=True,
+                                 checked_includes=_CheckedIncludes(index.resolve, key, done),
+                                 **runner_options)
+            batch = report.batches[label] = runner.run(paths)
+            report.reused_bodies += sum(f.reused_bodies for f in batch.files)
+            return not batch.stopped_early
+
+        def batches():
+            for name in names:
+                layer = self.layers[name]
+                index = self.index(name)
+                if layer.libraries:
+                    yield name, index, layer.libraries
+                for map_dir, paths in layer.map_groups().items():
+                    yield (f"{name}:{map_dir.relative_to(layer.root).as_posix()}",
+                           self.map_index(name, map_dir)[0], paths)
+
+        t0 = time.perf_counter()
+        for label, index, paths in batches():
+            if not run(label, index, paths):
+                break
+        report.elapsed = time.perf_counter() - t0
+        return report
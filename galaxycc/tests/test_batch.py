@@ -0,0 +1,90 @@
+"""批量引擎：include 诊断跨文件去重、内容去重"""
+
+import pytest
+
+from galaxycc.batch import BatchRunner, IncludeDeduper
+from galaxycc.error import DiagnosticBag
+from galaxycc.pipeline import GalaxyFrontend
+
+from conftest import GRAMMAR
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+@pytest.fixture
+def make_frontend():
+    def make(*search_dirs):
+        f = GalaxyFrontend(grammar_file=GRAMMAR, search_dirs=list(search_dirs))
+        f.load_natives_common()
+        return f
+    return make
+
+
+def test_include_spellings_dedup_to_one_file(make_frontend, tmp_path):
+    _write(tmp_path / 'Scripts' / 'Util.galaxy', 'void f() { missing = 1; }\n')
+    a = _write(tmp_path / 'a.galaxy', 'include "Scripts/Util"\n')
+    b = _write(tmp_path / 'b.galaxy', 'include "scripts/util"\n')
+    report = BatchRunner(make_frontend(tmp_path), dedup_includes=True).run([a, b])
+    (issue,) = report.shared
+    assert issue.includers == 2
+
+
+def test_same_spec_different_files_not_merged(tmp_path):
+    deduper = IncludeDeduper()
+    for lib in ('one', 'two'):
+        bag = DiagnosticBag()
+        bag.file, bag.include = str(tmp_path / lib / 'lib.galaxy'), 'lib'
+        bag.error('x', code='GS0401')
+        deduper.split(str(tmp_path / f'{lib}.galaxy'), bag)
+    assert len(deduper) == 2
+
+
+def test_dedup_key_is_normalized_path(tmp_path):
+    deduper = IncludeDeduper()
+    for i, file in enumerate((tmp_path / 'lib.galaxy', tmp_path / '.' / 'sub' / '..' / 'lib.galaxy')):
+        bag = DiagnosticBag()
+        bag.file = str(file)
+        bag.error('x', code='GS0401')
+        deduper.split(str(tmp_path / f'main{i}.galaxy'), bag)
+    (issue,) = deduper.issues()
+    assert issue.includers == 2
+
+
+MAIN = 'include "lib"\nvoid InitMap() { LibFunc(); }\n'
+
+
+def test_dedup_content_merges_identical_files(make_frontend, tmp_path):
+    _write(tmp_path / 'lib.galaxy', 'void LibFunc() { }\n')
+    a = _write(tmp_path / 'a' / 'main.galaxy', MAIN + 'void f() { x = 1; }\n')
+    b = _write(tmp_path / 'b' / 'main.galaxy', MAIN + 'void f() { x = 1; }\n')
+    report = BatchRunner(make_frontend(tmp_path), dedup_content=True).run([a, b])
+    assert report.duplicates == {a: [b]}
+    first, second = report.files
+    assert second.duplicate_of == a
+    assert [d.file for d in second.diags] == [str(b)]
+
+
+def test_dedup_content_keeps_files_with_different_libraries(make_frontend, tmp_path, monkeypatch):
+    # 同样的文本在不同搜索路径下 include 到不同的库：内容键里的 include 闭包不同
+    from galaxycc.includes import IncludeGraph, IncludeIndex
+
+    _write(tmp_path / 'one' / 'lib.galaxy', 'void LibFunc() { }\n')
+    _write(tmp_path / 'two' / 'lib.galaxy', 'void LibFunc() { int y; }\n')
+    a = _write(tmp_path / 'one' / 'main.galaxy', MAIN)
+    b = _write(tmp_path / 'two' / 'main.galaxy', MAIN)
+    frontend = make_frontend(tmp_path / 'one')
+    graph = IncludeGraph()
+    for main in (a, b):
+        part = IncludeGraph.build([main], corpus=frontend.corpus,
+                                  resolve=IncludeIndex([main.parent]).resolve)
+        graph.edges.update(part.edges)
+        graph.names.update(part.names)
+    monkeypatch.setattr(frontend, 'include_graph', lambda paths: graph)
+
+    report = BatchRunner(frontend, dedup_content=True).run([a, b])
+    assert report.duplicates == {}
+    assert all(f.duplicate_of is None for f in report.files)
@@ -0,0 +1,42 @@
+"""调用图：分析时记下的边、可达性、触发器入口"""
+
+from galaxycc.semantic.callgraph import CallGraph
+
+SOURCE = '''\
+void Helper() { }
+void Unused() { Helper(); }
+void OnTimer() { Helper(); Helper(); }
+void InitMap() {
+    TriggerCreate("OnTimer");
+}
+int g = 0;
+'''
+
+
+def test_edges_from_analysis(frontend):
+    graph = frontend.process_string(SOURCE, source_name='m').call_graph
+    assert set(graph.functions()) == {'Helper', 'Unused', 'OnTimer', 'InitMap'}
+    assert graph.file_of('Helper') == 'm'
+    assert graph.callees('OnTimer') == ['Helper']           # 重复边压缩时去掉
+    assert sorted(graph.callers('Helper')) == ['OnTimer', 'Unused']
+    assert graph.triggers == {'OnTimer'}
+    assert graph.entry_points() == [CallGraph.ROOT, 'InitMap', 'OnTimer']
+    assert graph.unreachable() == ['Unused']
+
+
+def test_merge_and_replace_calls():
+    a = CallGraph()
+    a.add_function('f', 'x')
+    a.add_call('f', 'g')
+    b = CallGraph()
+    b.add_function('g', 'y')
+    b.add_trigger(None, 'h')
+    a.merge(b)
+    assert a.file_of('g') == 'y' and a.is_defined('g')
+    assert not a.is_defined('h')
+    assert a.reachable() == {CallGraph.ROOT, 'h'}
+    assert a.reachable(['f']) == {'f', 'g'}
+
+    a.replace_calls({'f': [('h', False)]})
+    assert a.callees('f') == ['h']
+    assert a.callers('g') == []
@@ -0,0 +1,91 @@
+"""编译期常量求值"""
+
+import pytest
+
+from galaxycc import pipeline
+from galaxycc.includes import IncludeIndex
+
+from conftest import GRAMMAR
+
+
+@pytest.fixture(scope='module')
+def shared():
+    f = pipeline.GalaxyFrontend(grammar_file=GRAMMAR, share_include_asts=True)
+    f.load_natives_common()
+    return f
+
+
+def test_stale_node_symbols_are_not_trusted(shared, tmp_path, monkeypatch):
+    # 即使复用的 AST 没清注解，分析中的求值也按当前符号表查名字
+    monkeypatch.setattr(pipeline, '_clear_annotations', lambda ast: None)
+    (tmp_path / 'lib.galaxy').write_text('const int M = N;\nint[M] g_arr;\n')
+    shared.include_index = IncludeIndex([tmp_path])
+    for n in (1, 4):
+        result = shared.process_string(f'const int N = {n};\ninclude "lib"\n', source_name='m')
+        assert result.symbol_table.lookup_global('g_arr').gtype.size == n
+
+
+def _const(frontend, source, name='c'):
+    result = frontend.process_string(source, source_name='m')
+    assert result.diags.count == 0, [str(d) for d in result.diags]
+    return result.symbol_table.lookup_global(name).const_value
+
+
+@pytest.mark.parametrize('expr, value', [
+    ('0.1', 409 / 4096),                # 字面量向零截断到 1/4096
+    ('0.1 + 0.2', 1228 / 4096),
+    ('0.1 * 3.0', 1227 / 4096),         # 乘法结果截断
+    ('1.0 / 3.0', 1365 / 4096),
+    ('-0.1', -409 / 4096),
+    ('524287.0 + 1.0', -524288.0),      # 原始值按 32 位回绕
+])
+def test_fixed_point(frontend, expr, value):
+    assert _const(frontend, f'const fixed c = {expr};\n') == value
+
+
+def test_fixed_compare_matches_runtime(frontend):
+    assert _const(frontend, 'const bool c = 0.1 + 0.2 == 0.3;\n') is True
+
+
+@pytest.mark.parametrize('expr, value', [
+    ('2147483647 + 1', -2147483648),
+    ('-2147483647 - 2', 2147483647),
+    ('65536 * 65536', 0),
+    ('1 << 31', -2147483648),
+    ('-7 / 2', -3),                     # 向零截断
+    ('-7 % 2', -1),
+    ('~0', -1),
+])
+def test_int_wraps_at_32_bits(frontend, expr, value):
+    assert _const(frontend, f'const int c = {expr};\n') == value
+
+
+@pytest.mark.parametrize('expr', ['1 / 0', '1 % 0', '1.0 / 0.0', '5 % (3 - 3)'])
+def test_division_by_zero_is_not_constant(frontend, expr):
+    kind = 'fixed' if '.' in expr else 'int'
+    result = frontend.process_string(f'const {kind} c = {expr};\n', source_name='m')
+    assert result.symbol_table.lookup_global('c').const_value is None
+
+
+def test_const_chain_across_includes(shared, tmp_path):
+    (tmp_path / 'a.galaxy').write_text('const int A = 2;\n')
+    (tmp_path / 'b.galaxy').write_text('include "a"\nconst int B = A * 3;\n')
+    shared.include_index = IncludeIndex([tmp_path])
+    result = shared.process_string('include "b"\nconst int C = B + 1;\nint[C] arr;\n',
+                                   source_name='m')
+    assert result.diags.count == 0
+    table = result.symbol_table
+    assert [table.lookup_global(n).const_value for n in 'ABC'] == [2, 6, 7]
+    assert table.lookup_global('arr').gtype.size == 7
+
+
+def test_array_sizes_from_consts(frontend):
+    result = frontend.process_string(
+        'const int N = 3;\nconst int M = N * N - 1;\n'
+        'int[N][M] grid;\nint[M / 2 + N] flat;\nint v = 2;\nint[v] bad;\n',
+        source_name='m')
+    table = result.symbol_table
+    grid = table.lookup_global('grid').gtype
+    assert (grid.size, grid.element_type.size) == (3, 8)
+    assert table.lookup_global('flat').gtype.size == 7
+    assert [(d.code, d.line) for d in result.diags] == [('GS0519', 6)]   # v 不是 const
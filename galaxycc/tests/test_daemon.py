@@ -0,0 +1,47 @@
+"""常驻分析进程：请求分派与错误响应"""
+
+import pytest
+
+from galaxycc.daemon import (AnalysisService, INTERNAL_ERROR, INVALID_PARAMS, INVALID_REQUEST,
+                             METHOD_NOT_FOUND)
+
+
+@pytest.fixture
+def service(frontend):
+    return AnalysisService(frontend)
+
+
+@pytest.mark.parametrize('request_', [[{'jsonrpc': '2.0', 'id': 1, 'method': 'ping'}], 3, 'ping', None])
+def test_non_object_request_is_invalid(service, request_):
+    response = service.handle(request_)
+    assert response['id'] is None
+    assert response['error']['code'] == INVALID_REQUEST
+
+
+def test_missing_method_keeps_id(service):
+    response = service.handle({'jsonrpc': '2.0', 'id': 7})
+    assert response['id'] == 7
+    assert response['error']['code'] == INVALID_REQUEST
+
+
+def test_unknown_method(service):
+    assert service.handle({'id': 1, 'method': 'bogus'})['error']['code'] == METHOD_NOT_FOUND
+    assert service.handle({'method': 'bogus'}) is None         # 通知不回复
+
+
+def test_analyze_text(service):
+    result = service.handle({'id': 1, 'method': 'analyze',
+                             'params': {'text': 'void f() { int x; x = "a"; }'}})['result']
+    assert result['errors'] == 1
+    assert result['diagnostics'][0]['code'] == 'GS0508'
+
+
+def test_bad_params_vs_internal_type_error(service, monkeypatch):
+    response = service.handle({'id': 1, 'method': 'analyze', 'params': {'bogus': 1}})
+    assert response['error']['code'] == INVALID_PARAMS
+
+    def broken(*args, **kwargs):
+        raise TypeError('frontend bug')
+    monkeypatch.setattr(service.frontend, 'process_string', broken)
+    response = service.handle({'id': 2, 'method': 'analyze', 'params': {'text': 'int x;'}})
+    assert response['error']['code'] == INTERNAL_ERROR
@@ -0,0 +1,23 @@
+"""常量折叠 & 死分支消除"""
+
+from galaxycc.tree.transformer import IntLiteral, walk
+
+
+def _kept(frontend, cond):
+    """if (cond) { g = 1; } else { g = 2; } 折叠后留下的赋值"""
+    source = f'int g;\nvoid h() {{ if ({cond}) {{ g = 1; }} else {{ g = 2; }} }}\n'
+    result = frontend.process_string(source, source_name='m', optimize=True)
+    assert result.fold_stats.pruned_branches == 1
+    return [n.value for n in walk(result.ast) if isinstance(n, IntLiteral)]
+
+
+def test_fixed_branch_follows_fixed_point(frontend):
+    assert _kept(frontend, '0.1 + 0.2 == 0.3') == [1]
+    assert _kept(frontend, '0.1 * 3.0 == 0.3') == [2]
+
+
+def test_folded_fixed_literal_is_exact(frontend):
+    result = frontend.process_string('fixed g = 0.1 + 0.2;\n', source_name='m', optimize=True)
+    (lit,) = [n for n in walk(result.ast) if n.const_value is not None]
+    assert lit.raw == '0.2998046875'
+    assert lit.value * 4096 == 1228
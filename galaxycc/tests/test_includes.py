@@ -0,0 +1,30 @@
+"""include 目录索引与依赖图"""
+
+from galaxycc.includes import IncludeGraph, IncludeIndex
+
+
+def _write(path, text=''):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def test_resolve_case_insensitive_and_ordered(tmp_path):
+    first = _write(tmp_path / 'a' / 'TriggerLibs' / 'natives.galaxy')
+    _write(tmp_path / 'b' / 'triggerlibs' / 'natives.galaxy')
+    only_b = _write(tmp_path / 'b' / 'lib' / 'util.galaxy')
+    index = IncludeIndex([tmp_path / 'a', tmp_path / 'b'])
+    assert index.resolve('triggerlibs/NATIVES') == str(first)      # 排前面的目录优先
+    assert index.resolve('lib\\util') == str(only_b)
+    assert index.resolve('lib/missing') is None
+
+
+def test_graph_order_and_cycles(tmp_path):
+    _write(tmp_path / 'base.galaxy', 'include "mid"\n')
+    _write(tmp_path / 'mid.galaxy', 'include "leaf"\ninclude "base"\n')
+    _write(tmp_path / 'leaf.galaxy', 'include "nowhere"\n')
+    graph = IncludeGraph.build([tmp_path / 'base.galaxy'], [tmp_path])
+    order = [p.rsplit('/', 1)[-1] for p in graph.order()]
+    assert order.index('leaf.galaxy') < order.index('mid.galaxy')
+    assert len(graph.cycles()) == 1
+    assert sum(len(v) for v in graph.missing.values()) == 1
@@ -0,0 +1,73 @@
+"""语言服务：编辑之后 hover / definition 不能还用上一版的分析结果"""
+
+import pytest
+
+from galaxycc.lsp import LspClient
+
+from conftest import GRAMMAR
+
+SOURCE = 'int g = 1;\nvoid f() {\n    g = 2;\n}\n'
+
+
+@pytest.fixture(scope='module')
+def client():
+    with LspClient.spawn(['--grammar', str(GRAMMAR)]) as c:
+        c.initialize()
+        yield c
+
+
+def test_removed_global_no_longer_resolves(client, tmp_path):
+    path = tmp_path / 'edit.galaxy'
+    assert client.open(path, SOURCE) == []
+    assert 'int g' in client.hover(path, 2, 4)['contents']['value']
+    assert client.definition(path, 2, 4)['range']['start'] == {'line': 0, 'character': 4}
+
+    # 删掉第一行的声明：块缓存里的 f 被复用，但 g 已经不存在了
+    diags = client.change(path, [{'range': {'start': {'line': 0, 'character': 0},
+                                            'end': {'line': 1, 'character': 0}}, 'text': ''}])
+    assert [d['code'] for d in diags] == ['GS0401']
+    assert client.hover(path, 1, 4) is None
+    assert client.definition(path, 1, 4) is None
+
+    # 加回来又能找到，位置按新的行号
+    client.change(path, [{'range': {'start': {'line': 0, 'character': 0},
+                                    'end': {'line': 0, 'character': 0}}, 'text': 'int g = 1;\n'}])
+    assert client.definition(path, 2, 4)['range']['start'] == {'line': 0, 'character': 4}
+
+
+def test_chunked_parse_matches_full_parse(frontend):
+    cache = {}
+    first = frontend.process_string(SOURCE, source_name='m', chunk_cache=cache)
+    assert first.diags.count == 0
+    edited = SOURCE.split('\n', 1)[1]
+    chunked = frontend.process_string(edited, source_name='m', chunk_cache=cache)
+    full = frontend.process_string(edited, source_name='m')
+    assert [str(d) for d in chunked.diags] == [str(d) for d in full.diags]
+
+
+def test_bad_message_does_not_end_session(frontend):
+    import io
+    import json
+
+    from galaxycc.lsp import GalaxyLanguageServer, read_message
+
+    def frame(body: bytes) -> bytes:
+        return b'Content-Length: %d\r\n\r\n' % len(body) + body
+
+    stream = io.BytesIO(b''.join([
+        frame(b'{"jsonrpc": "2.0", "id": 1, "method": '),          # 坏 JSON
+        frame(b'[1, 2]'),                                           # 不是对象
+        frame(b'{"jsonrpc": "2.0", "id": 2, "method": 3}'),         # method 不是字符串
+        frame(json.dumps({'jsonrpc': '2.0', 'id': 3, 'method': 'initialize',
+                          'params': {'capabilities': {}}}).encode()),
+        frame(b'{"jsonrpc": "2.0", "id": 4, "method": "textDocument/hover", "params": {}}'),
+    ]))
+    out = io.BytesIO()
+    GalaxyLanguageServer(frontend, stream, out).serve()
+    out.seek(0)
+    replies = []
+    while (message := read_message(out)) is not None:
+        replies.append(message)
+    assert [(r['id'], r.get('error', {}).get('code')) for r in replies] == \
+        [(None, -32700), (None, -32600), (2, -32600), (3, None), (4, -32602)]
+    assert 'capabilities' in replies[3]['result']
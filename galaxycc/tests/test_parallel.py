@@ -0,0 +1,69 @@
+"""并行分析函数体：结果必须与 jobs=1 的顺序分析一致"""
+
+import pytest
+
+from galaxycc.semantic import parallel
+from galaxycc.tree.transformer import walk
+
+_SYMBOL_FIELDS = ('name', 'gtype', 'kind', 'is_static', 'is_native', 'is_const',
+                  'defined', 'file', 'const_value')
+
+HEADER = '''\
+const int N = 4;
+struct P { int x; fixed y; };
+int g = 1;
+'''
+
+BODY = '''\
+int f{i}(int a) {{
+    const int k = N * {i};
+    static int s = 0;
+    P p;
+    p.x = a + k;
+    s += g;
+    if (k > 8) {{ return f{prev}(p.x); }}
+    return undefined{i} + IntToString(k);
+}}
+'''
+
+
+def _source(n: int) -> str:
+    return HEADER + ''.join(BODY.format(i=i, prev=max(i - 1, 0)) for i in range(n))
+
+
+def _snapshot(result):
+    """诊断、调用图、以及每个节点的 gtype / const_value / symbol 字段"""
+    nodes = []
+    for n in walk(result.ast):
+        sym = n.symbol
+        fields = None
+        if sym is not None:
+            fields = tuple(str(getattr(sym, f)) for f in _SYMBOL_FIELDS)
+            decl = sym.node
+            fields += (None if decl is None else (type(decl).__name__, decl.line, decl.col),)
+        nodes.append((type(n).__name__, str(n.gtype), n.const_value, fields))
+    graph = result.call_graph
+    calls = {name: graph.callees(name) for name in graph.functions()}
+    return [str(d) for d in result.diags], calls, result.natives_used, nodes
+
+
+@pytest.mark.skipif(not parallel.can_fork(), reason='平台不支持 fork')
+def test_parallel_matches_sequential(frontend, monkeypatch):
+    # 单核机器上 effective_jobs 会退回 1，这里强制走进程池
+    monkeypatch.setattr(parallel, 'effective_jobs', lambda jobs: jobs)
+    source = _source(parallel.PARALLEL_MIN_BODIES + 3)
+
+    sequential = frontend.process_string(source, source_name='m', jobs=1)
+    parallel_ = frontend.process_string(source, source_name='m', jobs=3)
+
+    assert sequential.diags.count > 0
+    assert _snapshot(parallel_) == _snapshot(sequential)
+
+    # 局部符号：同一声明的引用共用一个 Symbol，const 局部带着常量值
+    locals_ = {}
+    for n in walk(parallel_.ast):
+        if n.symbol is not None and n.symbol.name == 'k':
+            locals_.setdefault(id(n.symbol.node), set()).add(id(n.symbol))
+            assert n.symbol.const_value is not None
+    assert len(locals_) == parallel.PARALLEL_MIN_BODIES + 3
+    assert all(len(ids) == 1 for ids in locals_.values())
@@ -0,0 +1,30 @@
+"""前端流水线：共享的 include AST 在多次分析之间复用"""
+
+import pytest
+
+from galaxycc.includes import IncludeIndex
+from galaxycc.pipeline import GalaxyFrontend
+
+from conftest import GRAMMAR
+
+
+@pytest.fixture(scope='module')
+def shared():
+    f = GalaxyFrontend(grammar_file=GRAMMAR, share_include_asts=True)
+    f.load_natives_common()
+    return f
+
+
+def test_shared_include_ast_sees_current_consts(shared, tmp_path):
+    (tmp_path / 'lib.galaxy').write_text('const int M = N;\nint[M] g_arr;\n')
+    shared.include_index = IncludeIndex([tmp_path])
+
+    def arr_size(n):
+        result = shared.process_string(f'const int N = {n};\ninclude "lib"\n', source_name='m')
+        assert result.diags.count == 0
+        return result.symbol_table.lookup_global('g_arr').gtype.size
+
+    assert arr_size(1) == 1
+    assert shared.cached_include_asts == 1
+    assert arr_size(4) == 4
+    assert arr_size(1) == 1
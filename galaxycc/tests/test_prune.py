@@ -0,0 +1,24 @@
+"""剪枝模式：只检查从主文件可达的函数体"""
+
+from galaxycc.includes import IncludeIndex
+
+LIB = '''\
+void Dead() { int x; x = "dead"; }
+void OnTimer() { int y; y = "timer"; }
+void Setup() { TriggerCreate("OnTimer"); }
+'''
+
+
+def _diags(frontend, **options):
+    result = frontend.process_string('include "lib"\nvoid InitMap() { Setup(); }\n',
+                                     source_name='m', **options)
+    return sorted((d.code, d.line) for d in result.diags)
+
+
+def test_prune_keeps_bodies_reached_through_trigger_create(frontend, tmp_path, monkeypatch):
+    (tmp_path / 'lib.galaxy').write_text(LIB)
+    monkeypatch.setattr(frontend, 'include_index', IncludeIndex([tmp_path]))
+    full = _diags(frontend)
+    pruned = _diags(frontend, prune_unreachable=True)
+    assert full == [('GS0508', 1), ('GS0508', 2)]
+    assert pruned == [('GS0508', 2)]          # OnTimer 只经 TriggerCreate("OnTimer") 可达
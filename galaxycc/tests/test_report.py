@@ -0,0 +1,63 @@
+"""机器可读输出：include 里的诊断指向解析出的文件"""
+
+import io
+import json
+
+import pytest
+
+from galaxycc.pipeline import GalaxyFrontend
+from galaxycc.report import JsonlWriter, SarifWriter
+
+from conftest import GRAMMAR
+
+
+@pytest.fixture
+def analyzed(tmp_path):
+    lib = tmp_path / 'TriggerLibs' / 'NativeLib.galaxy'
+    lib.parent.mkdir()
+    lib.write_text('void f() { undefined_name = 1; }\n')
+    main = tmp_path / 'map.galaxy'
+    main.write_text('include "triggerlibs/nativelib"\n')
+    frontend = GalaxyFrontend(grammar_file=GRAMMAR, search_dirs=[tmp_path])
+    frontend.load_natives_common()
+    return main, lib, frontend.process_file(main).diags
+
+
+def test_include_diag_file_is_resolved(analyzed):
+    main, lib, diags = analyzed
+    (d,) = diags
+    assert d.code == 'GS0401'
+    assert d.file == str(lib)
+    assert d.include == 'triggerlibs/nativelib'
+
+    out = io.StringIO()
+    with JsonlWriter(out) as w:
+        w.write_file(main, diags)
+    record = json.loads(out.getvalue())
+    assert (record['file'], record['include']) == (str(lib), 'triggerlibs/nativelib')
+
+
+def test_sarif_uri_points_at_file(analyzed):
+    main, lib, diags = analyzed
+    out = io.StringIO()
+    with SarifWriter(out) as w:
+        w.write_file(main, diags)
+    (result,) = json.loads(out.getvalue())['runs'][0]['results']
+    location = result['locations'][0]['physicalLocation']['artifactLocation']
+    assert location['uri'] == lib.as_posix()
+    assert result['properties'] == {'analyzedFile': main.as_posix(),
+                                    'include': 'triggerlibs/nativelib'}
+
+
+def test_byte_offsets_follow_file_encoding(frontend, tmp_path):
+    from galaxycc.batch import BatchRunner
+
+    path = tmp_path / 'gbk.galaxy'
+    text = '// 中文注释\nvoid f() { x = 1; }\n'
+    path.write_bytes(text.encode('gb18030'))
+    out = io.StringIO()
+    BatchRunner(frontend, writers=[JsonlWriter(out)]).run([path])
+    (record,) = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert record['char_offset'] == text.index('x = 1')
+    assert record['byte_offset'] == text.encode('gb18030').index(b'x = 1')
+    assert record['byte_offset'] != record['char_offset']
@@ -0,0 +1,51 @@
+"""FlatSymbolTable 与 SymbolTable 行为一致"""
+
+import pytest
+
+from galaxycc.semantic.symbol import FlatSymbolTable, Symbol, SymbolKind, SymbolTable
+from galaxycc.semantic.type import INT, FIXED
+
+SOURCE = '''\
+int g = 1;
+int f(int a, int a) {
+    int g = 2;
+    int g;
+    {
+        fixed g = 1.0;
+        int a = 3;
+        g = "shadow";
+    }
+    g = "outer";
+    while (a > 0) { int i; i = missing; a -= 1; }
+    return g;
+}
+void h() { static int s; g = "global"; s = a; }
+'''
+
+
+def test_flat_scopes_same_diagnostics(frontend):
+    nested = frontend.process_string(SOURCE, source_name='m')
+    flat = frontend.process_string(SOURCE, source_name='m', flat_scopes=True)
+    assert isinstance(flat.symbol_table, FlatSymbolTable)
+    assert nested.diags.count >= 5
+    assert [str(d) for d in flat.diags] == [str(d) for d in nested.diags]
+
+
+@pytest.mark.parametrize('table_cls', [SymbolTable, FlatSymbolTable])
+def test_shadowing_and_scope_exit(table_cls):
+    table = table_cls()
+    outer = Symbol('x', INT, SymbolKind.VAR)
+    inner = Symbol('x', FIXED, SymbolKind.VAR)
+    assert table.define(outer)
+    table.enter_function('f')
+    assert table.define(inner)
+    assert not table.define(Symbol('x', INT, SymbolKind.VAR))   # 同一作用域重复定义
+    assert table.lookup('x') is inner
+    assert table.lookup_local('x') is inner
+    assert table.lookup_global('x') is outer
+    table.enter_block()
+    assert table.lookup('x') is inner and table.lookup_local('x') is None
+    table.leave_scope()
+    table.leave_scope()
+    assert table.lookup('x') is outer
+    assert table.is_global
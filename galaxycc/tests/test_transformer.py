@@ -0,0 +1,20 @@
+"""AST 转换：带关键字终结符的语句"""
+
+from galaxycc.tree.transformer import CompoundStmt, DoWhileStmt, Identifier, IfStmt, walk
+
+
+def test_else_branch_kept(frontend):
+    ast = frontend.transform_only('void f() { int x; if (true) { x = 1; } else { x = 2; } }')
+    node = next(n for n in walk(ast) if isinstance(n, IfStmt))
+    assert isinstance(node.else_br, CompoundStmt)
+
+
+def test_do_while_condition(frontend):
+    ast = frontend.transform_only('void f() { bool b; do { b = false; } while (b); }')
+    node = next(n for n in walk(ast) if isinstance(n, DoWhileStmt))
+    assert isinstance(node.cond, Identifier) and node.cond.name == 'b'
+
+
+def test_else_branch_analyzed(frontend):
+    result = frontend.process_string('void f() { int x; if (true) { x = 1; } else { x = "a"; } }')
+    assert [d.code for d in result.diags.errors] == ['GS0508']
@@ -0,0 +1,41 @@
+"""类型驻留：结构相同的类型是同一个对象"""
+
+import pickle
+
+from galaxycc.semantic.type import (ArrayType, BasicType, FunctionType, HandleType, StructType,
+                                    FIXED, INT, STRING)
+
+
+def test_interned_types_are_identical():
+    assert BasicType('int') is INT
+    assert HandleType('unit') is HandleType('unit')
+    assert ArrayType(INT, 4) is ArrayType(INT, 4)
+    assert ArrayType(ArrayType(FIXED, 2), 3) is ArrayType(ArrayType(FIXED, 2), 3)
+    assert FunctionType(INT, [STRING, INT]) is FunctionType(INT, [STRING, INT])
+    assert FunctionType(INT, [STRING]) is not FunctionType(INT, [INT])
+
+
+def test_array_equality_ignores_size():
+    a, b = ArrayType(INT, 4), ArrayType(INT, 8)
+    assert a is not b and a == b and hash(a) == hash(b)
+    assert a._shape is b._shape is ArrayType(INT)
+
+
+def test_pickle_returns_interned_object():
+    f = FunctionType(INT, [ArrayType(INT, 3)])
+    assert pickle.loads(pickle.dumps(f)) is f
+
+
+def test_struct_types_stay_nominal():
+    s1, s2 = StructType('P', {}), StructType('P', {})
+    assert s1 is not s2 and s1 == s2
+    assert ArrayType(s1, 2) is not ArrayType(s2, 2)
+
+
+def test_analyzer_shares_type_objects(frontend):
+    result = frontend.process_string(
+        'int[4] a;\nint[4] b;\nint f(string s) { return 0; }\nint g(string t) { return 1; }\n',
+        source_name='m')
+    table = result.symbol_table
+    assert table.lookup_global('a').gtype is table.lookup_global('b').gtype
+    assert table.lookup_global('f').gtype is table.lookup_global('g').gtype
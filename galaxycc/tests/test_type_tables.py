@@ -0,0 +1,8 @@
+"""类型规则：查表结果必须与规则链逐条一致"""
+
+from galaxycc.semantic import type as gtypes
+
+
+def test_tables_match_rule_chain():
+    mismatches = gtypes.verify_tables()
+    assert not mismatches, f"规则表与规则链不一致：{mismatches[:5]}"
@@ -86,9 +86,60 @@ class ScopeStack:
 
 # ── 分析器 ────────────────────────────────────────────────────────────────────
 
+_POP_SCOPE = object()     # 工作栈里的标记：处理到这里时弹出一层作用域
+
+
+def _is_call_suffix(node) -> bool:
+    """postfix_suffix 是否是调用后缀：'(' ')' 或 '(' argument_expression_list ')'"""
+    if not node.children:
+        return True
+    first = node.children[0]
+    return isinstance(first, Tree) and first.data == 'argument_expression_list'
+
+
+def _count_args(arg_list) -> int:
+    """
+    argument_expression_list 的参数个数。
+    V2 语法是扁平的 (assignment_expression ("," assignment_expression)*)，直接数子节点；
+    旧语法是左递归的，沿最左一支往下数层数。
+    """
+    if arg_list is None:
+        return 0
+    count = 0
+    node = arg_list
+    while True:
+        nested = None
+        for child in node.children:
+            if isinstance(child, Tree):
+                if child.data == 'argument_expression_list':
+                    nested = child
+                else:
+                    count += 1
+        if nested is None:
+            return count
+        node = nested
+
+
+def _callee_token(primary) -> Optional[Token]:
+    """primary_expression 是单个 IDENTIFIER 时返回它"""
+    if isinstance(primary, Tree) and primary.data == 'primary_expression':
+        first = primary.children[0] if primary.children else None
+        if isinstance(first, Token) and first.type == 'IDENTIFIER':
+            return first
+    return None
+
+
 class ScopeAnalyzer(Interpreter):
     """
     第二遍遍历：进入每个函数体，做作用域和调用检查。
+
+    函数体用一个显式工作栈单遍遍历，每个 CST 节点只访问一次：
+      - compound_statement 进栈时压一层作用域，并在子节点之后放一个弹栈标记
+      - 局部声明先检查初始化表达式，再登记变量
+      - 调用由 postfix_suffix（V2 语法）或 postfix_expression 的形状（旧语法）识别，
+        参数个数直接数 argument_expression_list 的子节点；被调函数名按函数检查，
+        参数和其余后缀照常遍历
+    不再对子树做 str() 或 iter_subtrees()，嵌套再深也是线性时间，也不受递归深度限制。
     """
 
     def __init__(self, global_table: SymbolTable):
@@ -96,6 +147,12 @@ class ScopeAnalyzer(Interpreter):
         self.scope         = ScopeStack(global_table)
         self.errors: list[ScopeError] = []
         self._current_func = ""   # 当前所在函数名，用于错误上下文
+        self._handlers = {
+            'compound_statement': self._enter_compound,
+            'declaration':        self._handle_local_declaration,
+            'postfix_expression': self._handle_postfix,
+            'primary_expression': self._handle_primary,
+        }
 
     # ── 顶层路由 ──────────────────────────────────────────────────────────────
 
@@ -117,7 +174,7 @@ class ScopeAnalyzer(Interpreter):
     def declaration(self, tree):
         """
         顶层全局声明：不做作用域检查（已由 SymbolCollector 处理）。
-        如果在函数体内被调用，由 _handle_local_declaration 处理。
+        函数体内的声明由 _handle_local_declaration 处理。
         """
         pass
 
@@ -130,15 +187,14 @@ class ScopeAnalyzer(Interpreter):
 
         # 提取函数名和参数
         for child in tree.children:
-            if isinstance(child, Tree):
-                if child.data == 'declarator':
-                    result = _extract_name_from_declarator(child)
-                    if result:
-                        func_name = result[0]
-                    for node in child.iter_subtrees():
-                        if node.data == 'parameter_type_list':
-                            params = _extract_params(node)
-                            break
+            if isinstance(child, Tree) and child.data == 'declarator':
+                result = _extract_name_from_declarator(child)
+                if result:
+                    func_name = result[0]
+                for node in child.iter_subtrees():
+                    if node.data == 'parameter_type_list':
+                        params = _extract_params(node)
+                        break
 
         self._current_func = func_name
         self.scope.push()
@@ -150,140 +206,150 @@ class ScopeAnalyzer(Interpreter):
         # 进入函数体
         for child in tree.children:
             if isinstance(child, Tree) and child.data == 'compound_statement':
-                self._visit_compound(child)
+                self._walk(child)
 
         self.scope.pop()
         self._current_func = ""
 
-    # ── 复合语句（块）：推入新作用域 ─────────────────────────────────────────
-
-    def _visit_compound(self, tree):
-        """手动处理 compound_statement，确保正确推栈/弹栈。"""
-        self.scope.push()
-        for child in tree.children:
-            if isinstance(child, Tree):
-                self._visit_block_item(child)
-        self.scope.pop()
+    # ── 单遍遍历 ──────────────────────────────────────────────────────────────
 
-    def _visit_block_item(self, tree):
-        """分发函数体内的各种语句和声明。"""
-        if not isinstance(tree, Tree):
-            return
-
-        if tree.data == 'declaration':
-            self._handle_local_declaration(tree)
-        elif tree.data == 'declaration_list':
-            for child in tree.children:
-                if isinstance(child, Tree):
-                    self._visit_block_item(child)
-        elif tree.data == 'statement_list':
-            for child in tree.children:
-                if isinstance(child, Tree):
-                    self._visit_block_item(child)
-        elif tree.data == 'statement':
-            self._visit_statement(tree)
-        elif tree.data == 'compound_statement':
-            self._visit_compound(tree)
-        else:
-            # 其他情况直接递归
-            for child in tree.children:
+    def _walk(self, root):
+        """
+        遍历函数体。工作栈里放 Tree、_POP_SCOPE 标记或待登记的局部变量 (SymbolInfo)；
+        子节点逆序入栈，保证按源码顺序处理、按源码顺序报错。
+        """
+        stack = [root]
+        handlers = self._handlers
+        pop = stack.pop
+        while stack:
+            node = pop()
+            if node is _POP_SCOPE:
+                self.scope.pop()
+                continue
+            if isinstance(node, SymbolInfo):
+                self._declare_local(node)
+                continue
+            handler = handlers.get(node.data)
+            if handler is not None:
+                handler(node, stack)
+                continue
+            children = node.children
+            for i in range(len(children) - 1, -1, -1):
+                child = children[i]
                 if isinstance(child, Tree):
-                    self._visit_block_item(child)
+                    stack.append(child)
 
-    def _visit_statement(self, tree):
-        """处理各种语句，重点是含表达式的部分。"""
-        if not isinstance(tree, Tree):
-            return
-
-        for child in tree.children:
+    @staticmethod
+    def _push_children(children, stack):
+        for i in range(len(children) - 1, -1, -1):
+            child = children[i]
             if isinstance(child, Tree):
-                if child.data == 'compound_statement':
-                    self._visit_compound(child)
-                elif child.data in ('expression_statement', 'expression',
-                                    'assignment_expression', 'selection_statement',
-                                    'iteration_statement', 'jump_statement'):
-                    self._visit_statement(child)
-                else:
-                    self._check_expression(child)
+                stack.append(child)
+
+    # ── 复合语句（块）：推入新作用域 ─────────────────────────────────────────
+
+    def _enter_compound(self, tree, stack):
+        self.scope.push()
+        stack.append(_POP_SCOPE)
+        self._push_children(tree.children, stack)
 
     # ── 局部变量声明 ──────────────────────────────────────────────────────────
 
-    def _handle_local_declaration(self, tree):
-        """处理函数体内的局部变量声明。"""
+    def _handle_local_declaration(self, tree, stack):
+        """
+        函数体内的局部变量声明：每个 init_declarator 先检查初始化表达式，再登记变量名
+        （登记动作作为 SymbolInfo 放进工作栈，排在初始化表达式之后）。
+        """
         type_str = "unknown"
+        declarators = []
         for child in tree.children:
-            if isinstance(child, Tree) and child.data == 'declaration_specifiers':
+            if not isinstance(child, Tree):
+                continue
+            if child.data == 'declaration_specifiers':
                 type_str = _extract_type_str(child)
-                break
-
-        for node in tree.iter_subtrees():
-            if node.data == 'init_declarator':
-                # 先检查初始化表达式中的引用
-                for child in node.children:
-                    if isinstance(child, Tree) and child.data == 'initializer':
-                        self._check_expression(child)
-
-                # 再注册变量名
-                for child in node.children:
-                    if isinstance(child, Tree) and child.data == 'declarator':
-                        result = _extract_name_from_declarator(child)
-                        if result:
-                            name, line, col = result
-                            info = SymbolInfo(name=name, kind='variable',
-                                              type_=type_str, line=line, col=col)
-                            existing = self.scope.declare_local(info)
-                            if existing:
-                                self.errors.append(ScopeError(
-                                    kind='duplicate_local',
-                                    message=(
-                                        f"局部变量 '{name}' 重复声明，"
-                                        f"已在第 {existing.line} 行声明过"
-                                    ),
-                                    line=line, col=col,
-                                    context=self._current_func
-                                ))
-
-    # ── 表达式检查：变量引用 + 函数调用 ──────────────────────────────────────
-
-    def _check_expression(self, tree):
-        """递归检查表达式树中的 IDENTIFIER 引用和函数调用。"""
-        if not isinstance(tree, Tree):
-            return
+            elif child.data == 'init_declarator_list':
+                declarators.extend(c for c in child.children
+                                   if isinstance(c, Tree) and c.data == 'init_declarator')
+            elif child.data == 'init_declarator':
+                declarators.append(child)
+
+        for init_decl in reversed(declarators):
+            initializer = None
+            info = None
+            for child in init_decl.children:
+                if not isinstance(child, Tree):
+                    continue
+                if child.data == 'initializer':
+                    initializer = child
+                elif child.data == 'declarator':
+                    result = _extract_name_from_declarator(child)
+                    if result:
+                        name, line, col = result
+                        info = SymbolInfo(name=name, kind='variable',
+                                          type_=type_str, line=line, col=col)
+            if info is not None:
+                stack.append(info)
+            if initializer is not None:
+                stack.append(initializer)
+
+    def _declare_local(self, info: SymbolInfo):
+        existing = self.scope.declare_local(info)
+        if existing:
+            self.errors.append(ScopeError(
+                kind='duplicate_local',
+                message=(
+                    f"局部变量 '{info.name}' 重复声明，"
+                    f"已在第 {existing.line} 行声明过"
+                ),
+                line=info.line, col=info.col,
+                context=self._current_func
+            ))
 
-        # 函数调用：postfix_expression "(" args ")"
-        if tree.data == 'postfix_expression' and len(tree.children) >= 2:
-            first = tree.children[0]
-            # 检查是否是函数调用形式
-            has_arg_list = any(
-                isinstance(c, Tree) and c.data == 'argument_expression_list'
-                for c in tree.children
-            )
-            is_empty_call = (
-                len(tree.children) == 1 and
-                isinstance(first, Tree) and
-                first.data == 'primary_expression'
-            )
-            # 判断有括号的调用
-            children_types = [
-                c.type if isinstance(c, Token) else (c.data if isinstance(c, Tree) else '')
-                for c in tree.children
-            ]
-
-            if has_arg_list or 'LPAR' in str(tree):
-                self._check_function_call(tree)
-                return
-
-        # primary_expression 中的 IDENTIFIER：变量引用
-        if tree.data == 'primary_expression':
-            for child in tree.children:
-                if isinstance(child, Token) and child.type == 'IDENTIFIER':
-                    self._check_identifier(child)
-            return
+    # ── 表达式：变量引用 + 函数调用 ──────────────────────────────────────────
 
-        # 递归检查子节点
+    def _handle_primary(self, tree, stack):
+        """primary_expression 中的 IDENTIFIER：变量引用；括号表达式继续遍历"""
         for child in tree.children:
-            if isinstance(child, Tree):
-                self._check_expression(child)
+            if isinstance(child, Token) and child.type == 'IDENTIFIER':
+                self._check_identifier(child)
+        self._push_children(tree.children, stack)
+
+    def _handle_postfix(self, tree, stack):
+        """
+        识别调用 f(...)：
+          V2 语法   postfix_expression: primary_expression postfix_suffix*
+                    第一个后缀是调用后缀、primary 是单个标识符
+          旧语法    postfix_expression: postfix_expression "(" [argument_expression_list] ")"
+                    （匿名括号已被过滤，只剩内层 postfix_expression 和可选的参数表）
+        被调函数名不再当作变量检查；参数、下标等其余子节点照常遍历。
+        """
+        children = tree.children
+        if not children:
+            return
+        first = children[0]
+        callee = None
+        args = None
+        rest = children
+
+        if len(children) >= 2 and isinstance(children[1], Tree) \
+                and children[1].data == 'postfix_suffix':
+            suffix = children[1]
+            callee = _callee_token(first) if _is_call_suffix(suffix) else None
+            if callee is not None:
+                args = suffix.children[0] if suffix.children else None
+                rest = children[1:]
+        elif isinstance(first, Tree) and first.data == 'postfix_expression' \
+                and len(first.children) == 1 \
+                and all(isinstance(c, Tree) and c.data == 'argument_expression_list'
+                        for c in children[1:]):
+            callee = _callee_token(first.children[0])
+            if callee is not None:
+                args = children[1] if len(children) > 1 else None
+                rest = children[1:]
+
+        if callee is not None:
+            self._check_function_call(callee, _count_args(args))
+        self._push_children(rest, stack)
 
     def _check_identifier(self, token: Token):
         """检查标识符是否已声明。"""
@@ -303,33 +369,13 @@ class ScopeAnalyzer(Interpreter):
                 context=self._current_func
             ))
 
-    def _check_function_call(self, tree):
+    def _check_function_call(self, func_token: Token, arg_count: int):
         """
         检查函数调用：
         - 函数是否存在
         - 参数个数是否匹配
         """
-        # 提取被调用的函数名
-        func_name = None
-        func_token = None
-        arg_count = 0
-
-        for child in tree.children:
-            if isinstance(child, Tree):
-                if child.data == 'primary_expression':
-                    for sub in child.children:
-                        if isinstance(sub, Token) and sub.type == 'IDENTIFIER':
-                            func_name = str(sub)
-                            func_token = sub
-                elif child.data == 'argument_expression_list':
-                    arg_count = self._count_args(child)
-            elif isinstance(child, Tree) and child.data == 'postfix_expression':
-                # 递归情况，先检查子调用
-                self._check_expression(child)
-
-        if not func_name or not func_token:
-            return
-
+        func_name = str(func_token)
         line = func_token.line or 0
         col  = func_token.column or 0
 
@@ -360,28 +406,3 @@ class ScopeAnalyzer(Interpreter):
                     line=line, col=col,
                     context=self._current_func
                 ))
-
-    def _count_args(self, arg_list_tree) -> int:
-        """统计 argument_expression_list 中的参数个数。"""
-        if not isinstance(arg_list_tree, Tree):
-            return 0
-        count = 0
-        for node in arg_list_tree.iter_subtrees():
-            if node.data == 'assignment_expression':
-                # 只计算直接子级的 assignment_expression
-                parent_data = getattr(node, '_parent_data', None)
-                count += 1
-        # 更简单的方法：数逗号数+1
-        # argument_expression_list 的左递归结构意味着层数 = 参数数
-        return self._count_args_recursive(arg_list_tree)
-
-    def _count_args_recursive(self, tree) -> int:
-        """通过左递归结构计算参数个数。"""
-        if not isinstance(tree, Tree) or tree.data != 'argument_expression_list':
-            return 0
-        count = 1  # 当前节点代表一个参数
-        for child in tree.children:
-            if isinstance(child, Tree) and child.data == 'argument_expression_list':
-                count += self._count_args_recursive(child)
-                break
-        return count
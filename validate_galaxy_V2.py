@@ -10,13 +10,17 @@ from datetime import datetime
 from typing import Optional
 from lark import Lark, exceptions
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "galaxycc"))
+from galaxycc.corpus import Corpus
+from galaxycc.prescan import TypeNameIndex, scan_declarations
+
 # ── 路径配置 ──────────────────────────────────────────────────────────────────
 GRAMMAR_FILE = r"D:\galaxyscript\ANSI C95_V2.lark"
 SCRIPTS_DIR  = r"D:\galaxyscript\galaxy_scripts"
 LOG_FILE     = r"D:\galaxyscript\validation_errors.log"
 # ─────────────────────────────────────────────────────────────────────────────
 
-# 已知内置类型，预处理时不替换这些
+# 已知内置类型，不当作用户类型名
 BUILTIN_TYPES = {
     'void', 'int', 'fixed', 'bool', 'string',
     'unitfilter', 'unitgroup', 'unit', 'point', 'timer',
@@ -32,12 +36,114 @@ BUILTIN_TYPES = {
 
 # ── 语法解析相关 ──────────────────────────────────────────────────────────────
 
-def load_grammar(grammar_path: str) -> Lark:
-    """加载 lark 语法文件，返回解析器（开启行列号记录）"""
+# 追加到语法文件末尾：
+#   TYPE_NAME  用户类型名，由 TypeNameHook 从 IDENTIFIER 改标而来，不对应任何正则
+#   IDENTIFIER 提到与关键字相同的优先级，basic 词法器才会把 unitGroup / structref
+#              整个识别为标识符，完全等于关键字时再归为关键字
+GRAMMAR_SUFFIX = r"""
+%declare TYPE_NAME
+%extend base_type_specifier: TYPE_NAME
+%override IDENTIFIER.2: /[a-zA-Z_][a-zA-Z0-9_]*/
+"""
+
+
+class TypeNameHook:
+    """
+    词法后处理（lark postlex）：把已知的用户类型名标成 TYPE_NAME。
+
+    代替原先的源码预处理（巨型正则把类型名和 structref<T> 全部替换成 int），
+    源码不做任何改写，token 的行列号就是原文件里的行列号。
+
+      - IDENTIFIER 在 names 中 → TYPE_NAME（集合查找，与类型名数量无关）
+      - struct 后面的名字、typedef 声明的新名字保持 IDENTIFIER
+      - structref < T > 四个 token 合并成一个 TYPE_NAME，位置取 structref 的位置
+
+    names 只保存引用，调用方之后往集合里添加的名字同样生效。
+    """
+    always_accept = ()
+
+    def __init__(self, names: set = None):
+        self.names = names if names is not None else set()
+
+    def process(self, stream):
+        names = self.names
+        it = iter(stream)
+        pending = []            # 向前看时多取出的 token（逆序，pop 取下一个）
+        prev = None             # 上一个 token 的类型
+        typedef = None          # typedef 声明里还没交给解析器的 token
+        declared = None         # typedef 中最后一个原本是 IDENTIFIER 的 token
+
+        def take():
+            return pending.pop() if pending else next(it, None)
+
+        while True:
+            tok = take()
+            if tok is None:
+                break
+            if tok.type == 'IDENTIFIER' and prev != 'STRUCT':
+                look = [take(), take(), take()] if tok.value == 'structref' else None
+                if (look and look[2] is not None and look[0].type == 'LT_OP'
+                        and look[1].type == 'IDENTIFIER' and look[2].type == 'GT_OP'):
+                    tok = self._merge(tok, look[1], look[2])
+                else:
+                    if look:
+                        pending.extend(t for t in reversed(look) if t is not None)
+                    if tok.value in names:
+                        tok.type = 'TYPE_NAME'
+                    declared = tok
+            prev = tok.type
+
+            if tok.type == 'TYPEDEF':
+                typedef, declared = [], None
+            if typedef is None:
+                yield tok
+                continue
+            typedef.append(tok)
+            if tok.type == 'SEMICOLON':
+                # typedef T Name; —— Name 是正在声明的名字，不能当类型
+                if declared is not None and declared.type == 'TYPE_NAME':
+                    declared.type = 'IDENTIFIER'
+                yield from typedef
+                typedef = None
+
+    @staticmethod
+    def _merge(first, name, last):
+        """structref < T > → 一个 TYPE_NAME token，起点取 first，终点取 last"""
+        tok = first.new_borrow_pos('TYPE_NAME', f"structref<{name.value}>", first)
+        tok.end_line, tok.end_column, tok.end_pos = last.end_line, last.end_column, last.end_pos
+        return tok
+
+
+def _drop_identifier_type(grammar: str) -> str:
+    """
+    去掉 base_type_specifier 的 "| IDENTIFIER" 分支。
+    类型名都由 TypeNameHook 标成 TYPE_NAME 之后这一支就多余了，
+    留着会与 primary_expression / direct_declarator 产生归约冲突，LALR 建不起来。
+    """
+    start = grammar.index("\nbase_type_specifier:")
+    end = grammar.find("\n\n", start + 1)
+    end = len(grammar) if end < 0 else end
+    body = re.sub(r"\n\s*\|\s*IDENTIFIER[ \t]*(?=\n|$)", "", grammar[start:end])
+    return grammar[:start] + body + grammar[end:]
+
+
+def load_grammar(grammar_path: str, type_names: set = None, parser: str = "earley") -> Lark:
+    """
+    加载 lark 语法文件，返回解析器（开启行列号记录）。
+    type_names 交给 TypeNameHook 引用（不复制），之后再往集合里添加名字也会生效；
+    也可以逐个文件替换 parser.options.postlex.names。
+
+    parser="lalr" 时类型名只能通过 TYPE_NAME 出现，解析前必须给全这个文件
+    可见的类型名（见 galaxycc.prescan），否则在用到未知类型名的地方报错。
+    """
     with open(grammar_path, "r", encoding="utf-8") as f:
         grammar = f.read()
-    # return Lark(grammar, parser="lalr", propagate_positions=True)
-    return Lark(grammar, parser="earley", ambiguity="resolve", propagate_positions=True)
+    if parser == "lalr":
+        return Lark(_drop_identifier_type(grammar) + GRAMMAR_SUFFIX, parser="lalr",
+                    propagate_positions=True, postlex=TypeNameHook(type_names))
+    return Lark(grammar + GRAMMAR_SUFFIX, parser="earley", lexer="basic",
+                ambiguity="resolve", propagate_positions=True,
+                postlex=TypeNameHook(type_names))
 
 
 def collect_scripts(scripts_dir: str) -> list:
@@ -50,32 +156,29 @@ def collect_scripts(scripts_dir: str) -> list:
     return sorted(results)
 
 
-def collect_all_type_names(scripts: list) -> set:
-    """第一遍扫描所有文件，用正则收集用户自定义类型名。"""
+def collect_all_type_names(sources: list) -> set:
+    """扫描所有文件（Corpus 里已读入的 SourceFile），收集用户自定义类型名（全语料合并）。"""
     type_names = set()
-    for filepath in scripts:
-        try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                source = f.read()
-        except Exception:
-            continue
-        for m in re.finditer(r'\bstruct\s+([a-zA-Z_][a-zA-Z0-9_]*)', source):
-            type_names.add(m.group(1))
-        for m in re.finditer(r'\btypedef\s+\S+\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*;', source):
-            type_names.add(m.group(1))
+    for src in sources:
+        type_names |= scan_declarations(src.text).type_names
     type_names -= BUILTIN_TYPES
     return type_names
 
 
-def preprocess(source: str, type_names: set) -> str:
-    """预处理：替换自定义类型名和 structref<T>"""
-    if type_names:
-        pattern = r'\b(' + '|'.join(
-            re.escape(n) for n in sorted(type_names, key=len, reverse=True)
-        ) + r')\b'
-        source = re.sub(pattern, 'int', source)
-    source = re.sub(r'\bstructref\s*<[^>]+>', 'int', source)
-    return source
+def make_include_resolver(scripts: list):
+    """
+    脚本目录是平铺的（TriggerLibs/natives → natives.galaxy），
+    include 按文件名（不区分大小写、可省略 .galaxy）在脚本列表里查找。
+    """
+    by_name = {}
+    for path in scripts:
+        name = os.path.basename(path).lower()
+        by_name.setdefault(name, path)
+        by_name.setdefault(name[:-len(".galaxy")], path)
+
+    def resolve(include_path: str, src=None):
+        return by_name.get(include_path.replace("\\", "/").rsplit("/", 1)[-1].lower())
+    return resolve
 
 
 def classify_syntax_error(e: exceptions.UnexpectedToken) -> str:
@@ -157,15 +260,16 @@ class FileResult:
         return "OK      "
 
 
-def parse_file(parser: Lark, filepath: str, type_names: set):
+def parse_file(parser: Lark, filepath: str, source: str = None):
     """
     语法解析单个文件，返回 (tree, syntax_error_str, is_truncated)。
     tree 为 None 表示解析失败。
+    source 是已读入的文本（Corpus 的缓冲）；不给时自己读文件。
     """
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            source = f.read()
-        source = preprocess(source, type_names)
+        if source is None:
+            with open(filepath, "r", encoding="utf-8") as f:
+                source = f.read()
         tree = parser.parse(source)
         return tree, None, False
 
@@ -189,13 +293,27 @@ def parse_file(parser: Lark, filepath: str, type_names: set):
         return None, f"{type(e).__name__}: {e}", False
 
 
+def parse_file_fast(lalr: Lark, earley: Lark, filepath: str, source: str, type_names):
+    """
+    先走 LALR（type_names 是这个文件 include 闭包里的类型名），失败再交给 Earley。
+    返回 (tree, syntax_error_str, is_truncated, used_lalr)；报告的语法错误以 Earley 为准。
+    """
+    lalr.options.postlex.names = type_names
+    tree, _, _ = parse_file(lalr, filepath, source)
+    if tree is not None:
+        return tree, None, False, True
+    return (*parse_file(earley, filepath, source), False)
+
+
 # ── 主流程 ────────────────────────────────────────────────────────────────────
 
 def main():
     # 1. 加载语法
     print(f"正在加载语法文件: {GRAMMAR_FILE}")
     try:
-        parser = load_grammar(GRAMMAR_FILE)
+        type_names = set()             # 第 3 步填充，Earley 的词法钩子直接引用这个集合
+        parser = load_grammar(GRAMMAR_FILE, type_names)
+        lalr   = load_grammar(GRAMMAR_FILE, parser="lalr")
     except Exception as e:
         print(f"[ERROR] 语法文件加载失败: {e}")
         sys.exit(1)
@@ -208,20 +326,36 @@ def main():
         sys.exit(0)
     print(f"共找到 {len(scripts)} 个文件\n")
 
-    # 3. 全局收集自定义类型名（预处理用）
+    # 每个文件只读这一次，类型名扫描和语法解析共用同一份文本
+    corpus = Corpus()
+    sources, read_errors = corpus.load_all(scripts)
+    print(f"读入 {corpus.reads} 个文件，共 {corpus.bytes_read / 1e6:.1f} MB"
+          + (f"，{len(read_errors)} 个读取失败" if read_errors else "") + "\n")
+
+    # 3. 预扫描声明：每个文件 include 闭包里的类型名供 LALR 使用，
+    #    全语料合并的类型名供 Earley 回退使用（词法阶段都标成 TYPE_NAME）
     print("正在收集自定义类型名...")
-    type_names = collect_all_type_names(scripts)
+    type_names.update(collect_all_type_names(sources))
+    type_index = TypeNameIndex(corpus, make_include_resolver(scripts))
     print(f"收集到 {len(type_names)} 个自定义类型名\n")
 
     # 4. 第一遍：语法解析，收集所有 AST
     print("第一遍：语法解析...")
     results = {}
     valid_trees = []   # [(filepath, tree), ...]
+    lalr_count  = 0    # 直接走 LALR 成功的文件数
 
     for i, filepath in enumerate(scripts, 1):
         rel = os.path.relpath(filepath, SCRIPTS_DIR)
         result = FileResult(filepath)
-        tree, syntax_err, truncated = parse_file(parser, filepath, type_names)
+        src = corpus.get(filepath)
+        if src is None:
+            tree, syntax_err, truncated = parse_file(parser, filepath)
+        else:
+            closure = type_index.closure_names(filepath) - BUILTIN_TYPES
+            tree, syntax_err, truncated, used_lalr = parse_file_fast(
+                lalr, parser, filepath, src.text, closure)
+            lalr_count += used_lalr
 
         if syntax_err:
             result.syntax_error = syntax_err
@@ -234,7 +368,8 @@ def main():
         results[filepath] = result
 
     syntax_fail = sum(1 for r in results.values() if r.syntax_error)
-    print(f"\n语法解析完成: {len(scripts) - syntax_fail} 通过 / {syntax_fail} 失败\n")
+    print(f"\n语法解析完成: {len(scripts) - syntax_fail} 通过 / {syntax_fail} 失败"
+          f"（LALR {lalr_count} 个，其余回退 Earley）\n")
 
     # 5. 第二遍：建立全局符号表
     print("第二遍：建立全局符号表...")